@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
+from models.audit import AuditAction, AuditRecord
+from repositories.audit_repository import AUDIT_COLLECTION, AuditRepository
+from core.database import db
+from utils.authorization import Permission, require_permission
+
+router = APIRouter()
+
+
+def get_audit_repository() -> AuditRepository:
+    return AuditRepository(db.mongo.db[AUDIT_COLLECTION])
+
+
+@router.get(
+    "/audit",
+    response_model=List[AuditRecord],
+    summary="Consultar audit trail",
+    description="Registros de auditoría, más recientes primero (admin, calidad y auditores)",
+    dependencies=[Depends(require_permission(Permission.AUDIT_READ))],
+)
+async def get_audit_records(
+    target_id: Optional[str] = Query(None, description="Usuario afectado"),
+    actor_id: Optional[str] = Query(None, description="Usuario que hizo la acción"),
+    action: Optional[AuditAction] = Query(None, description="Tipo de acción"),
+    since: Optional[datetime] = Query(None, description="Desde (incluido, UTC)"),
+    until: Optional[datetime] = Query(None, description="Hasta (excluido, UTC)"),
+    skip: int = Query(0, ge=0, description="Número de registros a saltar"),
+    limit: int = Query(100, ge=1, le=1000, description="Máximo de registros"),
+    repo: AuditRepository = Depends(get_audit_repository),
+):
+    """
+    Los registros se escriben en lote cada pocos segundos, así que las
+    acciones más recientes pueden tardar un momento en aparecer.
+    """
+    return await repo.query(
+        target_id=target_id,
+        actor_id=actor_id,
+        action=action.value if action else None,
+        since=since,
+        until=until,
+        skip=skip,
+        limit=limit,
+    )
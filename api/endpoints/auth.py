@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, status
+from typing import Optional
+from fastapi import APIRouter, Depends, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from models.user import UserLogin, Token
+from models.user import UserLogin, Token, RefreshRequest, TokenData
 from services.user_service import UserService
 from repositories.user_repository import UserRepository
 from core.database import db
+from utils.rate_limiter import login_rate_limiter
+from utils.authorization import get_current_principal
 from exceptions import ErrorResponse
 
 router = APIRouter()
@@ -30,10 +33,16 @@ def get_user_service() -> UserService:
             "model": ErrorResponse,
             "description": "Credenciales incorrectas o usuario desactivado",
         },
+        429: {
+            "model": ErrorResponse,
+            "description": "Demasiados intentos desde esta IP o para esta cuenta",
+        },
     },
 )
 async def login(
-    login_data: UserLogin, service: UserService = Depends(get_user_service)
+    login_data: UserLogin,
+    request: Request,
+    service: UserService = Depends(get_user_service),
 ):
     """
     Autentica un usuario con email y contraseña.
@@ -44,11 +53,12 @@ async def login(
     - **email**: Email del usuario
     - **password**: Contraseña del usuario
     """
-    return await service.authenticate_user(login_data)
+    return await _authenticate(login_data, request, service)
 
 
 @router.post("/auth/token", response_model=Token, include_in_schema=False)
 async def login_oauth(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     service: UserService = Depends(get_user_service),
 ):
@@ -59,4 +69,55 @@ async def login_oauth(
     login_data = UserLogin(
         username_or_email=form_data.username, password=form_data.password
     )
-    return await service.authenticate_user(login_data)
+    return await _authenticate(login_data, request, service)
+
+
+async def _authenticate(login_data: UserLogin, request: Request, service: UserService):
+    """
+    Aplica el límite de intentos antes de tocar la base de datos o bcrypt.
+    """
+    ip = request.client.host if request.client else None
+    await login_rate_limiter.check(ip, login_data.username_or_email)
+    token = await service.authenticate_user(login_data)
+    await login_rate_limiter.reset_account(login_data.username_or_email)
+    return token
+
+
+@router.post(
+    "/auth/refresh",
+    response_model=Token,
+    summary="Renovar tokens",
+    description="Cambia un refresh token por un nuevo access token y un nuevo refresh token",
+    responses={
+        401: {
+            "model": ErrorResponse,
+            "description": "Refresh token inválido, revocado o usuario desactivado",
+        },
+    },
+)
+async def refresh(
+    body: RefreshRequest, service: UserService = Depends(get_user_service)
+):
+    """
+    El refresh token usado queda revocado: cada refresh token sirve una sola vez.
+    """
+    return await service.refresh_tokens(body.refresh_token)
+
+
+@router.post(
+    "/auth/logout",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Cerrar sesión",
+    description="Revoca el access token actual y, opcionalmente, el refresh token",
+)
+async def logout(
+    body: Optional[RefreshRequest] = None,
+    principal: TokenData = Depends(get_current_principal),
+    service: UserService = Depends(get_user_service),
+):
+    """
+    Tras el logout los tokens revocados se rechazan en todos los workers
+    (como mucho REVOCATION_SYNC_SECONDS después en los demás).
+    """
+    await service.logout(principal, body.refresh_token if body else None)
+    return None  # 204 No Content
@@ -0,0 +1,116 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from core.config import settings
+from core.tenancy import current_tenant
+from exceptions import ErrorResponse, NotFoundException, ServiceUnavailableException
+from models.job import JobCreate, JobRecord, JobStatus
+from models.user import TokenData
+from repositories.job_repository import JobRepository
+from services.job_runner import job_runner
+from utils.authorization import Permission, get_current_principal, has_permission
+
+router = APIRouter()
+
+
+def get_job_repository() -> JobRepository:
+    # El repo del ejecutor: la colección `jobs` es común a todos los laboratorios
+    if job_runner.repo is None:
+        raise ServiceUnavailableException("El ejecutor de tareas no está iniciado")
+    return job_runner.repo
+
+
+def _can_see(principal: TokenData, job: dict) -> bool:
+    return job.get("created_by") == principal.user_id or has_permission(
+        principal.role, Permission.USERS_MANAGE
+    )
+
+
+@router.post(
+    "/jobs",
+    response_model=JobRecord,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Lanzar tarea en segundo plano",
+    description="Encola una operación larga y devuelve la tarea para consultar su progreso",
+    responses={
+        202: {"description": "Tarea encolada; su estado está en la cabecera Location"},
+        403: {"model": ErrorResponse, "description": "Sin permiso para este tipo de tarea"},
+        409: {"model": ErrorResponse, "description": "Ya hay una tarea igual en curso"},
+        429: {"model": ErrorResponse, "description": "Demasiadas tareas pendientes"},
+    },
+)
+async def create_job(
+    job_data: JobCreate,
+    response: Response,
+    principal: TokenData = Depends(get_current_principal),
+    repo: JobRepository = Depends(get_job_repository),
+):
+    permission = job_runner.permissions[job_data.kind.value]
+    if not has_permission(principal.role, permission):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Se requiere el permiso: {permission.value}",
+        )
+    job = await job_runner.submit(job_data.kind, job_data.params, principal.user_id)
+    response.headers["Location"] = f"{settings.API_PREFIX}/jobs/{job['_id']}"
+    return job
+
+
+@router.get(
+    "/jobs",
+    response_model=List[JobRecord],
+    summary="Listar tareas",
+    description="Tareas propias, más recientes primero (todas con users:manage)",
+)
+async def list_jobs(
+    job_status: Optional[JobStatus] = Query(None, alias="status", description="Filtrar por estado"),
+    limit: int = Query(50, ge=1, le=200, description="Máximo de tareas"),
+    principal: TokenData = Depends(get_current_principal),
+    repo: JobRepository = Depends(get_job_repository),
+):
+    mine = None if has_permission(principal.role, Permission.USERS_MANAGE) else principal.user_id
+    return await repo.list(
+        tenant=current_tenant(),
+        created_by=mine,
+        status=job_status.value if job_status else None,
+        limit=limit,
+    )
+
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobRecord,
+    summary="Estado de una tarea",
+    description="Estado, progreso y resultado de una tarea (para consultar periódicamente)",
+    responses={404: {"model": ErrorResponse, "description": "Tarea no encontrada"}},
+)
+async def get_job(
+    job_id: str,
+    principal: TokenData = Depends(get_current_principal),
+    repo: JobRepository = Depends(get_job_repository),
+):
+    job = await repo.get(job_id, current_tenant())
+    if job is None or not _can_see(principal, job):
+        raise NotFoundException("Tarea no encontrada")
+    return job
+
+
+@router.post(
+    "/jobs/{job_id}/cancel",
+    response_model=JobRecord,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Cancelar una tarea",
+    description=(
+        "Una tarea encolada se cancela al momento; una en curso se detiene en su "
+        "siguiente reporte de progreso"
+    ),
+    responses={404: {"model": ErrorResponse, "description": "Tarea no encontrada"}},
+)
+async def cancel_job(
+    job_id: str,
+    principal: TokenData = Depends(get_current_principal),
+    repo: JobRepository = Depends(get_job_repository),
+):
+    job = await repo.get(job_id, current_tenant())
+    if job is None or not _can_see(principal, job):
+        raise NotFoundException("Tarea no encontrada")
+    return await job_runner.cancel(job_id)
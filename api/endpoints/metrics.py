@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends
+from utils.authorization import Permission, require_permission
+from utils.metrics import collect_metrics
+
+router = APIRouter()
+
+
+@router.get(
+    "/metrics",
+    summary="Métricas internas",
+    description="Contadores en memoria de este proceso (solo administradores)",
+    dependencies=[Depends(require_permission(Permission.METRICS_READ))],
+)
+async def get_metrics():
+    """
+    Devuelve las métricas registradas por los distintos subsistemas.
+    Los valores son por worker y se reinician al reiniciar el proceso.
+    """
+    return collect_metrics()
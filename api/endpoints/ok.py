@@ -1,7 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response, status
 from sqlalchemy import text
 from core.config import settings
 from core.database import db
+from core.resilience import OPEN, breakers
 
 router = APIRouter()
 
@@ -12,10 +13,14 @@ router = APIRouter()
     summary="Verificación de salud del sistema",
     description="Proporciona el estado actual del servicio y sus dependencias"
 )
-async def health_check():
+async def health_check(response: Response):
     """
     Comprueba el estado de la aplicación y la base de datos.
     Funciona con DB_ENGINE=mongodb o DB_ENGINE=postgresql.
+
+    Si el circuit breaker de la base de datos está abierto, el servicio no
+    está listo (`ready: false`) y se responde 503 para que el balanceador
+    deje de enviarle tráfico hasta que se recupere.
     """
     service_status = {
         "status": "running",
@@ -54,4 +59,11 @@ async def health_check():
     else:
         service_status["dependencies"]["database"] = f"unknown DB_ENGINE: {settings.DB_ENGINE}"
 
+    breaker = breakers["postgresql" if engine in ("postgres", "postgresql") else "mongodb"]
+    service_status["circuit_breaker"] = breaker.state
+    service_status["ready"] = breaker.state != OPEN
+    if not service_status["ready"]:
+        service_status["status"] = "degraded"
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
     return service_status
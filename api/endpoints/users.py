@@ -1,14 +1,47 @@
-from fastapi import APIRouter, Depends, status, Query, HTTPException
-from typing import List
-from models.user import UserCreate, UserUpdate, UserResponse
+from fastapi import APIRouter, Depends, status, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from models.user import (
+    UserCreate,
+    UserUpdate,
+    UserResponse,
+    UserBatchGetRequest,
+    UserBatchGetResponse,
+    UserStats,
+    UserChangesResponse,
+    TokenData,
+)
 from services.user_service import UserService
 from repositories.user_repository import UserRepository
 from core.database import db
+from core.config import settings
+from services.user_events import user_events, format_sse
 from utils.auth_manager import get_current_user_id, require_role
+from utils.authorization import (
+    Permission,
+    get_current_principal,
+    has_permission,
+    require_permission,
+)
+from utils.fieldsets import parse_fields, sparse_json_response
+from utils.http_cache import (
+    collection_etag,
+    has_conditional_headers,
+    is_not_modified,
+    last_modified,
+    not_modified,
+    resource_etag,
+    set_validators,
+)
 from exceptions import ErrorResponse
 
 router = APIRouter()
 
+FIELDS_DESCRIPTION = (
+    "Campos a devolver separados por comas, p. ej. `_id,username,role` "
+    "(por defecto, todos)"
+)
+
 
 def get_user_service() -> UserService:
     """
@@ -52,18 +85,188 @@ async def create_user(
     summary="Listar usuarios",
     description="Obtiene la lista de todos los usuarios (requiere autenticación)",
     dependencies=[Depends(get_current_user_id)],
+    responses={304: {"description": "La página no cambió desde la última petición"}},
 )
 async def get_users(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0, description="Número de registros a saltar"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     service: UserService = Depends(get_user_service),
     current_user_id: str = Depends(get_current_user_id),
 ):
     """
     Lista todos los usuarios del sistema con paginación.
     Requiere estar autenticado.
+
+    El header `X-Total-Count` trae el total aproximado (cacheado) de usuarios.
+    Soporta `If-None-Match` / `If-Modified-Since` (responde 304 si no hubo cambios).
+    Con `fields` solo se leen y devuelven esos campos.
+    """
+    field_list = parse_fields(fields, UserResponse)
+    scope = (",".join(field_list),) if field_list else ()
+
+    if has_conditional_headers(request):
+        etag, modified = await service.get_users_page_version(skip, limit, *scope)
+        if is_not_modified(request, etag, modified):
+            return not_modified(etag, modified)
+
+    response.headers["X-Total-Count"] = str(await service.count_users())
+
+    if field_list:
+        docs = await service.get_users_fields(field_list, skip, limit)
+        versions = [(d["_id"], d.get("updated_at"), d.get("created_at")) for d in docs]
+    else:
+        users = await service.get_all_users(skip, limit)
+        versions = [(u.id, u.updated_at, u.created_at) for u in users]
+
+    set_validators(
+        response,
+        collection_etag(versions, skip, limit, *scope),
+        last_modified((u, c) for _, u, c in versions),
+    )
+    if field_list:
+        return sparse_json_response(docs, field_list, response)
+    return users
+
+
+@router.get(
+    "/users/changes",
+    response_model=UserChangesResponse,
+    summary="Cambios de usuarios desde un cursor",
+    description="Altas, modificaciones y bajas posteriores a `since` (requiere autenticación)",
+)
+async def get_user_changes(
+    since: Optional[str] = Query(
+        None, description="Cursor devuelto por la llamada anterior; vacío para obtener el actual"
+    ),
+    limit: int = Query(100, ge=1, le=1000, description="Número máximo de cambios"),
+    service: UserService = Depends(get_user_service),
+    current_user_id: str = Depends(get_current_user_id),
+):
+    """
+    Sincronización delta del directorio de usuarios.
+
+    1. Sin `since`: devuelve el cursor actual; luego se hace un `GET /users` completo.
+    2. Con `since`: devuelve solo los cambios posteriores y el nuevo cursor.
+       Si `has_more` es true, se repite la llamada con el nuevo cursor.
+    """
+    return await service.get_user_changes(since, limit)
+
+
+@router.get(
+    "/users/events",
+    summary="Stream de eventos de usuarios (SSE)",
+    description="Emite user.created / user.updated / user.deleted en tiempo real (requiere autenticación)",
+    response_class=StreamingResponse,
+)
+async def stream_user_events(
+    request: Request,
+    current_user_id: str = Depends(get_current_user_id),
+):
+    """
+    Server-Sent Events con los cambios de usuarios.
+
+    Envía un comentario `: ping` cada pocos segundos para mantener viva la conexión.
+    Si el cliente no consume a tiempo se le desconecta; al reconectar puede
+    recuperar lo perdido con `GET /users/changes?since=<último id recibido>`.
+    """
+
+    async def event_stream():
+        subscription = user_events.subscribe()
+        try:
+            # Tiempo de reconexión sugerido al EventSource del navegador
+            yield "retry: 3000\n\n"
+            while not subscription.dropped:
+                event = await subscription.get(settings.USER_EVENTS_HEARTBEAT_SECONDS)
+                if await request.is_disconnected():
+                    break
+                if event is None:
+                    yield ": ping\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            user_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get(
+    "/users/stats",
+    response_model=UserStats,
+    summary="Estadísticas de usuarios",
+    description="Conteos por rol y por estado activo/inactivo (requiere autenticación)",
+)
+async def get_user_stats(
+    service: UserService = Depends(get_user_service),
+    current_user_id: str = Depends(get_current_user_id),
+):
+    """
+    Devuelve los contadores materializados; no recorre la colección.
+    """
+    return await service.get_user_stats()
+
+
+async def _get_user_conditional(
+    user_id: str,
+    request: Request,
+    response: Response,
+    service: UserService,
+    fields: Optional[str] = None,
+):
+    """
+    Lectura de un usuario con validadores HTTP. Si el cliente envía
+    If-None-Match / If-Modified-Since, primero se consulta solo la versión.
+    Con `fields` se proyectan y devuelven solo esos campos.
+    """
+    field_list = parse_fields(fields, UserResponse)
+    scope = (",".join(field_list),) if field_list else ()
+
+    if has_conditional_headers(request):
+        etag, modified = await service.get_user_version(user_id, *scope)
+        if is_not_modified(request, etag, modified):
+            return not_modified(etag, modified)
+
+    if field_list:
+        doc = await service.get_user_fields(user_id, field_list)
+        modified = doc.get("updated_at") or doc.get("created_at")
+        set_validators(
+            response,
+            resource_etag(doc["_id"], doc.get("updated_at"), doc.get("created_at"), *scope),
+            modified,
+        )
+        return sparse_json_response(doc, field_list, response)
+
+    user = await service.get_user_by_id(user_id)
+    set_validators(
+        response,
+        resource_etag(user.id, user.updated_at, user.created_at),
+        user.updated_at or user.created_at,
+    )
+    return user
+
+
+@router.post(
+    "/users:batchGet",
+    response_model=UserBatchGetResponse,
+    summary="Obtener varios usuarios por ID",
+    description="Obtiene hasta 1000 usuarios en una sola consulta (requiere autenticación)",
+)
+async def batch_get_users(
+    batch: UserBatchGetRequest,
+    service: UserService = Depends(get_user_service),
+    current_user_id: str = Depends(get_current_user_id),
+):
+    """
+    Devuelve los usuarios pedidos en el mismo orden de `ids`.
+    Los ids inexistentes o inválidos se listan en `missing`.
     """
-    return await service.get_all_users(skip, limit)
+    return await service.get_users_by_ids(batch.ids)
 
 
 @router.get(
@@ -71,15 +274,21 @@ async def get_users(
     response_model=UserResponse,
     summary="Obtener usuario actual",
     description="Obtiene la información del usuario autenticado actualmente",
+    responses={304: {"description": "El usuario no cambió desde la última petición"}},
 )
 async def get_current_user(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     current_user_id: str = Depends(get_current_user_id),
     service: UserService = Depends(get_user_service),
 ):
     """
     Devuelve la información del usuario que está actualmente autenticado.
     """
-    return await service.get_user_by_id(current_user_id)
+    return await _get_user_conditional(
+        current_user_id, request, response, service, fields
+    )
 
 
 @router.get(
@@ -87,17 +296,22 @@ async def get_current_user(
     response_model=UserResponse,
     summary="Obtener usuario por ID",
     description="Obtiene un usuario específico por su ID (requiere autenticación)",
+    responses={304: {"description": "El usuario no cambió desde la última petición"}},
 )
 async def get_user_by_id(
     user_id: str,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     service: UserService = Depends(get_user_service),
     current_user_id: str = Depends(get_current_user_id),
 ):
     """
     Obtiene un usuario por su ID.
     Requiere estar autenticado.
+    Soporta `If-None-Match` / `If-Modified-Since` (responde 304 si no hubo cambios).
     """
-    return await service.get_user_by_id(user_id)
+    return await _get_user_conditional(user_id, request, response, service, fields)
 
 
 @router.put(
@@ -107,7 +321,7 @@ async def get_user_by_id(
     description="Actualiza los datos de un usuario existente (requiere autenticación)",
     responses={
         200: {"description": "Usuario actualizado exitosamente"},
-        403: {"description": "No tienes permisos para actualizar este usuario"},
+        403: {"description": "No tienes permisos para actualizar este usuario o su rol"},
         404: {"model": ErrorResponse, "description": "Usuario no encontrado"},
         409: {"model": ErrorResponse, "description": "Email o username ya en uso"},
     },
@@ -116,7 +330,7 @@ async def update_user(
     user_id: str,
     update_data: UserUpdate,
     service: UserService = Depends(get_user_service),
-    current_user_id: str = Depends(get_current_user_id),
+    principal: TokenData = Depends(get_current_principal),
 ):
     """
     Actualiza un usuario existente.
@@ -130,17 +344,24 @@ async def update_user(
     - **role**: Nuevo rol (opcional, solo admins)
     - **is_active**: Estado activo/inactivo (opcional, solo admins)
     """
-    # Verificamos permisos: solo el mismo usuario o un admin pueden actualizar
-    if user_id != current_user_id:
-        # Si no es el mismo usuario, verificamos si es admin
-        current_user = await service.get_user_by_id(current_user_id)
-        if current_user.role.value != "admin":
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="No tienes permisos para actualizar otro usuario",
-            )
+    # Verificamos permisos con los claims del token (sin consultar la base de datos)
+    if user_id != principal.user_id and not has_permission(
+        principal.role, Permission.USERS_UPDATE_ANY
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tienes permisos para actualizar otro usuario",
+        )
 
-    return await service.update_user(user_id, update_data)
+    if (
+        update_data.role is not None or update_data.is_active is not None
+    ) and not has_permission(principal.role, Permission.USERS_MANAGE):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo administradores pueden cambiar el rol o el estado",
+        )
+
+    return await service.update_user(user_id, update_data, principal.user_id)
 
 
 @router.delete(
@@ -157,28 +378,22 @@ async def update_user(
 async def delete_user(
     user_id: str,
     service: UserService = Depends(get_user_service),
-    current_user_id: str = Depends(get_current_user_id),
+    principal: TokenData = Depends(require_permission(Permission.USERS_DELETE)),
 ):
     """
     Elimina un usuario del sistema.
 
     Solo administradores pueden eliminar usuarios.
     No se puede eliminar a sí mismo.
+    La baja es lógica: el usuario deja de verse y se archiva pasado el
+    periodo de retención.
     """
-    # Verificamos que sea admin
-    current_user = await service.get_user_by_id(current_user_id)
-    if current_user.role.value != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Solo administradores pueden eliminar usuarios",
-        )
-
     # No permitimos que el admin se elimine a sí mismo
-    if user_id == current_user_id:
+    if user_id == principal.user_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No puedes eliminarte a ti mismo",
         )
 
-    await service.delete_user(user_id)
+    await service.delete_user(user_id, principal.user_id)
     return None  # 204 No Content
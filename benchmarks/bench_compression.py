@@ -0,0 +1,53 @@
+"""
+Costo de CPU vs bytes ahorrados al comprimir listados de usuarios.
+
+Uso:
+    python -m benchmarks.bench_compression
+"""
+import json
+import time
+from datetime import datetime, timedelta
+from utils.compression import available_encoders
+
+SIZES = (10, 100, 1000, 10000)
+ROUNDS = 20
+
+
+def make_users(n: int) -> bytes:
+    base = datetime(2025, 1, 1)
+    users = [
+        {
+            "_id": f"{i:024x}",
+            "email": f"usuario{i}@laboratorio.com",
+            "username": f"usuario_{i}",
+            "full_name": f"Usuario Número {i}",
+            "role": ("admin", "quality", "technician", "auditor", "viewer")[i % 5],
+            "is_active": i % 7 != 0,
+            "created_at": (base + timedelta(minutes=i)).isoformat(),
+            "updated_at": None,
+        }
+        for i in range(n)
+    ]
+    return json.dumps(users, separators=(",", ":")).encode()
+
+
+def main():
+    encoders = available_encoders()
+    print(f"{'usuarios':>9} {'enc':>5} {'original':>10} {'comprimido':>11} {'ratio':>6} {'ms/resp':>8} {'MB/s':>7}")
+    for n in SIZES:
+        body = make_users(n)
+        for name, factory in encoders.items():
+            start = time.perf_counter()
+            for _ in range(ROUNDS):
+                compressor = factory()
+                out = compressor.compress(body) + compressor.finish()
+            elapsed = (time.perf_counter() - start) / ROUNDS
+            print(
+                f"{n:>9} {name:>5} {len(body):>10} {len(out):>11} "
+                f"{len(body) / len(out):>6.1f} {elapsed * 1000:>8.2f} "
+                f"{len(body) / elapsed / 1e6:>7.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+find_all sobre 100k filas: instancias del ORM + model_dump() por fila (camino
+anterior) frente al serializador por modelo y a las filas Core que usa ahora
+BaseRepositoryPG.find_all.
+
+Corre contra SQLite en memoria: mide el costo en Python de materializar y
+serializar las filas, no la red.
+
+Uso:
+    python -m benchmarks.bench_pg_serialize
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from sqlalchemy import create_engine
+from sqlmodel import Field, Session, SQLModel, select
+from repositories.base_repository_pg import serializer_for
+
+ROWS = 100_000
+ROUNDS = 3
+
+
+class BenchResult(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    sample_code: str
+    analyte: str
+    value: float
+    unit: str
+    status: str
+    measured_at: datetime
+    deleted_at: Optional[datetime] = None
+
+
+def fallback_dump(instance) -> Dict[str, Any]:
+    """
+    Copia del _serialize_model anterior (model_dump -> dict -> vars).
+    """
+    if instance is None:
+        return {}
+    if hasattr(instance, "model_dump"):
+        try:
+            return instance.model_dump()
+        except Exception:
+            pass
+    if hasattr(instance, "dict"):
+        try:
+            return instance.dict()
+        except Exception:
+            pass
+    try:
+        return dict(vars(instance))
+    except Exception:
+        return {}
+
+
+def orm_fallback(session: Session):
+    items = session.execute(select(BenchResult)).scalars().all()
+    return [fallback_dump(item) for item in items]
+
+
+def orm_serializer(session: Session):
+    serialize = serializer_for(BenchResult)
+    items = session.execute(select(BenchResult)).scalars().all()
+    return [serialize(item) for item in items]
+
+
+def core_rows(session: Session):
+    columns = serializer_for(BenchResult).columns
+    return [dict(row) for row in session.execute(select(*columns)).mappings()]
+
+
+def main():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine, tables=[BenchResult.__table__])
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    with Session(engine) as session:
+        session.add_all(
+            BenchResult(
+                sample_code=f"M-{i // 10}",
+                analyte=("pH", "Brix", "Acidez", "Humedad")[i % 4],
+                value=i * 0.01,
+                unit="%",
+                status="validado",
+                measured_at=base + timedelta(seconds=i),
+            )
+            for i in range(ROWS)
+        )
+        session.commit()
+
+    expected = None
+    print(f"{'camino':<30} {'s/find_all':>11} {'µs/fila':>8}")
+    for name, fn in (
+        ("ORM + model_dump (anterior)", orm_fallback),
+        ("ORM + serializador", orm_serializer),
+        ("filas Core (actual)", core_rows),
+    ):
+        best = float("inf")
+        for _ in range(ROUNDS):
+            # Sesión nueva en cada ronda: sin identity map caliente
+            with Session(engine) as session:
+                start = time.perf_counter()
+                rows = fn(session)
+                best = min(best, time.perf_counter() - start)
+        # Los tres caminos devuelven exactamente los mismos dicts
+        expected = expected or rows
+        assert rows == expected, name
+        print(f"{name:<30} {best:>11.3f} {best / ROWS * 1e6:>8.2f}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
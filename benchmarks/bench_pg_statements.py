@@ -0,0 +1,76 @@
+"""
+Costo por llamada de armar la consulta de find_by_id en cada llamada frente a
+reutilizar la sentencia prearmada de BaseRepositoryPG (bindparam + caché de
+compilados de SQLAlchemy).
+
+No necesita Postgres: ejecuta contra SQLite en memoria, así que mide sobre todo
+el overhead de Python (construcción, clave de caché, compilación) y no la red.
+
+Uso:
+    python -m benchmarks.bench_pg_statements
+"""
+import time
+from typing import Optional
+from sqlalchemy import bindparam, create_engine
+from sqlmodel import Field, Session, SQLModel, select
+
+ROWS = 1000
+CALLS = 20000
+
+
+class BenchSample(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    code: str
+    deleted_at: Optional[str] = None
+
+
+def rebuilt(session: Session, pk: int):
+    q = select(BenchSample).where(BenchSample.id == pk).where(
+        BenchSample.deleted_at.is_(None)
+    )
+    return session.execute(q).scalars().first()
+
+
+PREBUILT = select(BenchSample).where(BenchSample.id == bindparam("pk")).where(
+    BenchSample.deleted_at.is_(None)
+)
+
+
+def prebuilt(session: Session, pk: int):
+    return session.execute(PREBUILT, {"pk": pk}).scalars().first()
+
+
+def build_only(session: Session, pk: int):
+    return select(BenchSample).where(BenchSample.id == pk).where(
+        BenchSample.deleted_at.is_(None)
+    )
+
+
+def run(name: str, fn, engine):
+    with Session(engine) as session:
+        for i in range(100):  # calentamiento (llena la caché de compilados)
+            fn(session, i % ROWS + 1)
+        start = time.perf_counter()
+        for i in range(CALLS):
+            fn(session, i % ROWS + 1)
+        elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed / CALLS * 1e6:>8.1f} µs/llamada")
+
+
+def main():
+    for cache_size in (500, 0):
+        engine = create_engine("sqlite://", query_cache_size=cache_size)
+        SQLModel.metadata.create_all(engine, tables=[BenchSample.__table__])
+        with Session(engine) as session:
+            session.add_all(BenchSample(code=f"M-{i}") for i in range(ROWS))
+            session.commit()
+
+        print(f"query_cache_size={cache_size}")
+        run("armar la consulta (solo)", build_only, engine)
+        run("armar y ejecutar", rebuilt, engine)
+        run("sentencia prearmada", prebuilt, engine)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
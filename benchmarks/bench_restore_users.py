@@ -0,0 +1,127 @@
+"""
+Restauración de 1M usuarios desde un volcado (cli.dump_users).
+
+Sin Mongo mide el lado del archivo: tamaño y tiempo del volcado por códec y
+lectura + descompresión + separación de documentos (lo que la restauración
+hace antes de insertar). Con --mongo restaura de verdad en una base
+desechable, con los índices al final (como hace el CLI) y, para comparar,
+con los índices creados antes de la carga.
+
+Uso:
+    python -m benchmarks.bench_restore_users [--users 1000000]
+        [--mongo mongodb://localhost:27017] [--workers 4]
+"""
+import argparse
+import asyncio
+import io
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId, encode
+from bson.raw_bson import RawBSONDocument
+from cli.dump_users import dump_collection, load_collection
+from core.config import settings
+from utils.dump_format import CODECS
+
+BENCH_DB = "bench_restore_users"
+ROLES = ("admin", "quality", "technician", "auditor", "viewer")
+
+
+def make_users(n: int):
+    base = datetime(2025, 1, 1)
+    return [
+        RawBSONDocument(
+            encode(
+                {
+                    "_id": ObjectId(f"{i:024x}"),
+                    "email": f"usuario{i}@laboratorio.com",
+                    "username": f"usuario_{i}",
+                    "full_name": f"Usuario Número {i}",
+                    "role": ROLES[i % 5],
+                    "hashed_password": "$2b$12$" + "x" * 53,
+                    "is_active": i % 7 != 0,
+                    "token_version": 0,
+                    "created_at": base + timedelta(seconds=i),
+                    "updated_at": None,
+                    "deleted_at": None,
+                    "change_seq": i + 1,
+                }
+            )
+        )
+        for i in range(n)
+    ]
+
+
+class MemoryRepo:
+    def __init__(self, docs=()):
+        self.docs = docs
+
+    async def iter_raw(self, batch_size=1000):
+        for doc in self.docs:
+            yield doc
+
+    async def insert_raw(self, docs):
+        return len(docs)
+
+
+async def restore_into_mongo(uri: str, dump: bytes, workers: int, indexes_first: bool):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from repositories.user_repository import UserRepository
+
+    client = AsyncIOMotorClient(uri)
+    try:
+        await client.drop_database(BENCH_DB)
+        users = UserRepository(client[BENCH_DB]["users"])
+        start = time.perf_counter()
+        if indexes_first:
+            await users.ensure_indexes()
+        inserted = await load_collection(users, io.BytesIO(dump), workers)
+        loaded = time.perf_counter()
+        if not indexes_first:
+            await users.ensure_indexes()
+        await users.sync_sequence()
+        done = time.perf_counter()
+        label = "índices antes" if indexes_first else "índices al final"
+        print(
+            f"   {label:>16}: carga {loaded - start:6.1f} s + índices "
+            f"{done - loaded:5.1f} s = {done - start:6.1f} s "
+            f"({inserted / (done - start):,.0f} usuarios/s)"
+        )
+    finally:
+        await client.drop_database(BENCH_DB)
+        client.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_restore_users")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--mongo", help="URI de un Mongo desechable para restaurar de verdad")
+    parser.add_argument("--workers", type=int, default=settings.USER_RESTORE_WORKERS)
+    args = parser.parse_args()
+
+    users = make_users(args.users)
+    raw_size = sum(len(doc.raw) for doc in users)
+    print(f"{args.users} usuarios, {raw_size / 1e6:.0f} MB de BSON")
+    print(f"{'códec':>6} {'MB':>7} {'ratio':>6} {'volcado s':>10} {'lectura s':>10}")
+    dumps = {}
+    for codec in sorted(CODECS):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        await dump_collection(MemoryRepo(users), buffer, codec)
+        dumped = time.perf_counter() - start
+        dumps[codec] = buffer.getvalue()
+
+        start = time.perf_counter()
+        await load_collection(MemoryRepo(), io.BytesIO(dumps[codec]), args.workers)
+        read = time.perf_counter() - start
+        size = len(dumps[codec])
+        print(f"{codec:>6} {size / 1e6:>7.1f} {raw_size / size:>6.1f} {dumped:>10.2f} {read:>10.2f}")
+
+    if args.mongo:
+        codec = "zstd" if "zstd" in dumps else "zlib"
+        print(f"Restauración en Mongo ({codec}, {args.workers} workers):")
+        for indexes_first in (False, True):
+            await restore_into_mongo(args.mongo, dumps[codec], args.workers, indexes_first)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
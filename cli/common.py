@@ -0,0 +1,52 @@
+import time
+from contextlib import asynccontextmanager
+from core.database import db
+
+
+@asynccontextmanager
+async def connected(postgres: bool = False):
+    """
+    Conecta Mongo (y Postgres, creando las tablas que falten) para un comando
+    de consola, y desconecta al salir aunque el comando falle.
+    """
+    await db.mongo.connect()
+    try:
+        if postgres:
+            await db.postgres.connect()
+            await db.postgres.init_models()
+        yield db
+    finally:
+        if db.postgres.is_connected:
+            await db.postgres.disconnect()
+        await db.mongo.disconnect()
+
+
+class Throughput:
+    """
+    Contador de filas procesadas con filas/s, para informar el avance.
+    """
+
+    def __init__(self, label: str, every_seconds: float = 5.0):
+        self.label = label
+        self.every_seconds = every_seconds
+        self.rows = 0
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def add(self, rows: int, extra: str = ""):
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self._last_report >= self.every_seconds:
+            self._last_report = now
+            print(f"   {self.label}: {self.rows} filas, {self.rate:,.0f} filas/s {extra}")
+
+    def summary(self) -> str:
+        return f"{self.rows} filas en {self.elapsed:.1f} s ({self.rate:,.0f} filas/s)"
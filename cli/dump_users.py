@@ -0,0 +1,170 @@
+"""
+Volcado y restauración de la colección de usuarios (copias de seguridad y
+carga de entornos de prueba).
+
+    python -m cli.dump_users dump usuarios.lqcdump [--codec zstd|zlib|none]
+    python -m cli.dump_users restore usuarios.lqcdump [--drop] [--workers 4]
+
+El volcado es un flujo BSON por tramos comprimidos (utils.dump_format) con
+todos los documentos, incluidas las bajas lógicas, tal como están en Mongo:
+se leen y escriben sin decodificar.
+
+La restauración:
+    1. Exige la colección vacía (--drop la vacía antes) y la crea sin índices
+       secundarios: mantenerlos durante la carga encarece cada inserción.
+    2. Descomprime los tramos en hilos e inserta hasta `--workers` lotes en
+       paralelo.
+    3. Al final crea los índices de UserRepository.ensure_indexes de una vez,
+       lleva la secuencia del change feed al mayor change_seq restaurado y
+       recalcula las estadísticas materializadas.
+"""
+import argparse
+import asyncio
+from typing import BinaryIO, List, Optional, Set
+from bson.raw_bson import RawBSONDocument
+from core.config import settings
+from repositories.base_repository_md import BaseRepositoryMD
+from repositories.user_repository import UserRepository
+from utils.dump_format import (
+    CODECS,
+    DEFAULT_CODEC,
+    DumpFormatError,
+    DumpWriter,
+    decode_frame,
+    iter_frames,
+    read_header,
+)
+from cli.common import Throughput, connected
+
+
+async def dump_collection(
+    repo: BaseRepositoryMD,
+    fileobj: BinaryIO,
+    codec: str = DEFAULT_CODEC,
+    frame_size: int = settings.USER_DUMP_FRAME_SIZE,
+    meter: Optional[Throughput] = None,
+) -> DumpWriter:
+    """
+    Escribe todos los documentos del repo, en orden de _id, en tramos de
+    `frame_size` documentos.
+    """
+    writer = DumpWriter(fileobj, codec)
+    batch: List[RawBSONDocument] = []
+    async for doc in repo.iter_raw(batch_size=frame_size):
+        batch.append(doc)
+        if len(batch) >= frame_size:
+            writer.write_frame(batch)
+            if meter:
+                meter.add(len(batch))
+            batch = []
+    writer.write_frame(batch)
+    if meter:
+        meter.add(len(batch))
+    writer.close()
+    return writer
+
+
+async def load_collection(
+    repo: BaseRepositoryMD,
+    fileobj: BinaryIO,
+    workers: int = settings.USER_RESTORE_WORKERS,
+    meter: Optional[Throughput] = None,
+) -> int:
+    """
+    Inserta los tramos del volcado con hasta `workers` lotes en vuelo. La
+    descompresión va a un hilo para que no frene las inserciones en curso.
+    Devuelve cuántos documentos se insertaron.
+    """
+    codec = read_header(fileobj)
+    slots = asyncio.Semaphore(workers)
+    pending: Set[asyncio.Task] = set()
+    inserted = 0
+
+    async def load(count: int, payload: bytes):
+        nonlocal inserted
+        docs = await asyncio.to_thread(decode_frame, codec, payload, count)
+        inserted += await repo.insert_raw(docs)
+        if meter:
+            meter.add(count)
+
+    try:
+        for count, payload in iter_frames(fileobj):
+            await slots.acquire()
+            # Un lote fallido corta la carga en cuanto se detecta
+            for task in [t for t in pending if t.done()]:
+                pending.discard(task)
+                task.result()
+            task = asyncio.create_task(load(count, payload))
+            task.add_done_callback(lambda _: slots.release())
+            pending.add(task)
+        await asyncio.gather(*pending)
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise
+    return inserted
+
+
+async def dump(db, path: str, codec: str, frame_size: int) -> int:
+    users = UserRepository(db.mongo.db["users"])
+    meter = Throughput("volcado")
+    with open(path, "wb") as f:
+        writer = await dump_collection(users, f, codec, frame_size, meter)
+    print(
+        f"✅ Volcado en {path}: {writer.documents} usuarios, "
+        f"{writer.bytes_written / 1e6:.1f} MB ({codec}), {meter.summary()}"
+    )
+    return 0
+
+
+async def restore(db, path: str, drop: bool, workers: int) -> int:
+    users = UserRepository(db.mongo.db["users"])
+    # Antes de tocar la colección: que el archivo sea un volcado legible
+    with open(path, "rb") as f:
+        read_header(f)
+    if not drop and await users.collection.find_one({}, projection={"_id": 1}):
+        print("❌ La colección 'users' no está vacía; usa --drop para reemplazarla")
+        return 1
+    # Vacía (o borrada con --drop): se recrea sin índices secundarios
+    await users.collection.drop()
+
+    meter = Throughput("restauración")
+    with open(path, "rb") as f:
+        inserted = await load_collection(users, f, workers, meter)
+    print(f"   Carga: {meter.summary()}")
+
+    indexes = Throughput("índices")
+    await users.ensure_indexes()
+    seq = await users.sync_sequence()
+    await users.stats.reconcile(users.collection)
+    print(f"   Índices, secuencia (change_seq {seq}) y estadísticas en {indexes.elapsed:.1f} s")
+    print(f"✅ Restaurados {inserted} usuarios desde {path} en {meter.elapsed:.1f} s")
+    return 0
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli.dump_users",
+        description="Volcado y restauración de la colección de usuarios",
+    )
+    parser.add_argument("command", choices=("dump", "restore"))
+    parser.add_argument("path")
+    parser.add_argument("--codec", choices=sorted(CODECS), default=DEFAULT_CODEC)
+    parser.add_argument("--frame-size", type=int, default=settings.USER_DUMP_FRAME_SIZE)
+    parser.add_argument("--workers", type=int, default=settings.USER_RESTORE_WORKERS)
+    parser.add_argument("--drop", action="store_true", help="restore: reemplazar la colección")
+    args = parser.parse_args(argv)
+
+    async with connected() as db:
+        try:
+            if args.command == "dump":
+                return await dump(db, args.path, args.codec, args.frame_size)
+            return await restore(db, args.path, args.drop, args.workers)
+        except DumpFormatError as e:
+            print(f"❌ {e}")
+            return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
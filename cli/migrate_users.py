@@ -0,0 +1,223 @@
+"""
+Migración online de usuarios de Mongo a Postgres.
+
+Pasos para migrar sin cortar el servicio:
+    1. Activar USER_DUAL_WRITE=true y reiniciar la API: desde ese momento cada
+       escritura de usuarios se copia también a Postgres.
+    2. python -m cli.migrate_users copy
+       Copia la colección en orden de _id, por lotes (INSERT multi-fila). Guarda
+       un checkpoint tras cada lote; si se interrumpe, se vuelve a lanzar y
+       continúa donde quedó (--restart empieza de cero).
+    3. python -m cli.migrate_users catchup
+       Aplica los cambios hechos mientras duraba la copia (change feed desde la
+       secuencia anotada al empezar). Se puede repetir las veces que haga falta.
+    4. python -m cli.migrate_users verify
+       Compara conteos y checksums por tramos de _id.
+    5. Pasar las lecturas a Postgres y, después, desactivar el dual-write.
+"""
+import argparse
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+from bson import ObjectId
+from core.config import settings
+from models.user_sql import UserRow  # noqa: F401  (registra la tabla para init_models)
+from repositories.user_repository import UserRepository
+from repositories.user_repository_pg import (
+    USER_COLUMNS,
+    UserRepositoryPG,
+    row_from_document,
+)
+from cli.common import Throughput, connected
+
+MIGRATION_ID = "users_to_postgres"
+MIGRATIONS_COLLECTION = "migrations"
+
+# Filas por tramo al comparar checksums
+CHECKSUM_CHUNK = 10000
+
+# (primer id, último id, filas, sha256) de un tramo
+Chunk = Tuple[str, str, int, str]
+
+
+class Migration:
+    def __init__(self, db, batch_size: int):
+        self.users = UserRepository(db.mongo.db["users"])
+        self.checkpoints = db.mongo.db[MIGRATIONS_COLLECTION]
+        self.session_factory = db.postgres.async_session
+        self.batch_size = batch_size
+
+    async def _state(self) -> dict:
+        return await self.checkpoints.find_one({"_id": MIGRATION_ID}) or {}
+
+    async def _save(self, **fields):
+        await self.checkpoints.update_one(
+            {"_id": MIGRATION_ID}, {"$set": fields}, upsert=True
+        )
+
+    async def _write(self, docs: List[dict], overwrite: bool) -> int:
+        async with self.session_factory() as session:
+            return await UserRepositoryPG(session).upsert_many(docs, overwrite=overwrite)
+
+    async def copy(self, restart: bool = False):
+        state = await self._state()
+        if restart or "since_seq" not in state:
+            # Lo que cambie desde aquí lo recoge catchup
+            state = {
+                "since_seq": await self.users.current_sequence(),
+                "last_id": None,
+                "copied": 0,
+            }
+            await self.checkpoints.replace_one(
+                {"_id": MIGRATION_ID},
+                {**state, "started_at": datetime.utcnow()},
+                upsert=True,
+            )
+        elif state.get("copied_at"):
+            print("ℹ️ La copia ya terminó; usa catchup para los cambios posteriores")
+            return
+
+        query = {}
+        if state["last_id"]:
+            query = {"_id": {"$gt": ObjectId(state["last_id"])}}
+            print(f"⏩ Reanudando después de {state['last_id']} ({state['copied']} copiados)")
+
+        meter = Throughput("copia")
+        copied = state["copied"]
+        batch: List[dict] = []
+
+        async def flush():
+            nonlocal copied
+            await self._write(batch, overwrite=False)
+            copied += len(batch)
+            await self._save(last_id=batch[-1]["_id"], copied=copied)
+            meter.add(len(batch), f"(último _id {batch[-1]['_id']})")
+            batch.clear()
+
+        async for doc in self.users.iter_all(
+            query,
+            batch_size=self.batch_size,
+            sort=[("_id", 1)],
+            include_deleted=True,
+        ):
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                await flush()
+        if batch:
+            await flush()
+
+        await self._save(copied_at=datetime.utcnow())
+        print(f"✅ Copia terminada: {meter.summary()}. Ahora ejecuta catchup.")
+
+    async def catchup(self):
+        state = await self._state()
+        if "since_seq" not in state:
+            print("❌ No hay copia iniciada; ejecuta primero copy")
+            return
+        since = state.get("synced_seq") or state["since_seq"]
+        meter = Throughput("puesta al día")
+        while True:
+            docs = await self.users.find_changed_since(
+                since, limit=self.batch_size, until=await self.users.current_sequence()
+            )
+            if not docs:
+                break
+            await self._write(docs, overwrite=True)
+            since = docs[-1]["change_seq"]
+            await self._save(synced_seq=since)
+            meter.add(len(docs), f"(change_seq {since})")
+        print(f"✅ Puesta al día hasta change_seq {since}: {meter.summary()}")
+
+    async def verify(self) -> bool:
+        mongo_count = await self.users.collection.count_documents({})
+        async with self.session_factory() as session:
+            pg = UserRepositoryPG(session)
+            pg_count = await pg.count_all()
+            mongo_chunks, pg_chunks = await asyncio.gather(
+                chunk_digests(
+                    row_from_document(doc)
+                    async for doc in self.users.iter_all(
+                        batch_size=self.batch_size,
+                        sort=[("_id", 1)],
+                        include_deleted=True,
+                    )
+                ),
+                chunk_digests(pg.iter_by_id(batch_size=self.batch_size)),
+            )
+
+        print(f"   Conteo: Mongo {mongo_count} / Postgres {pg_count}")
+        mismatches = compare_chunks(mongo_chunks, pg_chunks)
+        for first, last in mismatches[:20]:
+            print(f"   ❌ Difiere el tramo de _id {first} a {last}")
+        ok = mongo_count == pg_count and not mismatches
+        print("✅ Verificación correcta" if ok else "❌ La verificación encontró diferencias")
+        return ok
+
+
+def _canonical(row: dict) -> bytes:
+    values = [row["id"]] + [row.get(column) for column in USER_COLUMNS]
+    return "\x1f".join(
+        v.isoformat() if isinstance(v, datetime) else repr(v) for v in values
+    ).encode()
+
+
+async def chunk_digests(
+    rows: AsyncIterator[dict], chunk_size: int = CHECKSUM_CHUNK
+) -> List[Chunk]:
+    """
+    Recorre filas ordenadas por id y devuelve un sha256 por cada tramo de
+    `chunk_size` filas, para localizar diferencias sin cargar la tabla.
+    """
+    chunks: List[Chunk] = []
+    digest, first, last, count = hashlib.sha256(), None, None, 0
+    async for row in rows:
+        if count == chunk_size:
+            chunks.append((first, last, count, digest.hexdigest()))
+            digest, first, count = hashlib.sha256(), None, 0
+        first = first or row["id"]
+        last = row["id"]
+        digest.update(_canonical(row))
+        count += 1
+    if count:
+        chunks.append((first, last, count, digest.hexdigest()))
+    return chunks
+
+
+def compare_chunks(source: List[Chunk], target: List[Chunk]) -> List[Tuple[str, Optional[str]]]:
+    """
+    Tramos (primer id, último id) que no coinciden entre origen y destino.
+    """
+    mismatches = []
+    for i in range(max(len(source), len(target))):
+        a = source[i] if i < len(source) else None
+        b = target[i] if i < len(target) else None
+        if a != b:
+            ref = a or b
+            mismatches.append((ref[0], ref[1]))
+    return mismatches
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli.migrate_users",
+        description="Migración online de usuarios de Mongo a Postgres",
+    )
+    parser.add_argument("command", choices=("copy", "catchup", "verify"))
+    parser.add_argument("--batch-size", type=int, default=settings.USER_MIGRATION_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="copy: empezar de cero")
+    args = parser.parse_args(argv)
+
+    async with connected(postgres=True) as db:
+        migration = Migration(db, args.batch_size)
+        if args.command == "copy":
+            await migration.copy(restart=args.restart)
+        elif args.command == "catchup":
+            await migration.catchup()
+        else:
+            return 0 if await migration.verify() else 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
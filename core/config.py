@@ -14,17 +14,114 @@ class Settings(BaseSettings):
 
     # Postgres (SQLModel / SQLAlchemy async)
     POSTGRES_URI: Optional[str] = None
+    POSTGRES_REPLICA_URI: Optional[str] = None  # réplica de lectura (opcional)
+    # Statements preparados por conexión de asyncpg (0 los desactiva, p. ej. detrás
+    # de PgBouncer en modo transacción) y sentencias compiladas por SQLAlchemy
+    POSTGRES_PREPARED_STATEMENT_CACHE_SIZE: int = 256
+    POSTGRES_COMPILED_CACHE_SIZE: int = 1000
+
+    # Multi-laboratorio: cada laboratorio (tenant) con su propia base de datos
+    TENANCY_ENABLED: bool = False
+    TENANT_CLAIM: str = "lab"  # claim del JWT con el laboratorio
+    TENANT_HOST_SUFFIX: Optional[str] = None  # ".lims.example.com" -> <lab>.lims.example.com
+    TENANT_DEFAULT: Optional[str] = None  # si no llega ni en el token ni en el host
+    TENANT_IDS: List[str] = []  # laboratorios permitidos (vacío = cualquier id válido)
+    TENANT_MONGODB_URI: Optional[str] = None  # admite {tenant}; por defecto la URI global
+    TENANT_POSTGRES_URI: Optional[str] = None  # admite {tenant}; por defecto <base>_<tenant>
+    TENANT_MAX_POOLS: int = 50  # clientes de Mongo / engines de Postgres abiertos (LRU)
+    TENANT_POOL_IDLE_SECONDS: int = 300  # se cierran los pools sin uso en este tiempo
+
+    # Réplicas de lectura para listados y búsquedas
+    MONGO_LIST_READ_PREFERENCE: str = "secondaryPreferred"  # "primary" lo desactiva
+    READ_YOUR_WRITES_SECONDS: float = 5.0  # tras escribir, el usuario lee del primario
 
     # App
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTHZ_EPOCH: int = 0  # incrementar invalida todos los tokens emitidos
+    TOKEN_VERSION_SYNC_SECONDS: int = 30  # sincronización de versiones entre workers
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    REVOCATION_SYNC_SECONDS: int = 30  # sincronización de tokens revocados entre workers
+    REVOCATION_BLOOM_CAPACITY: int = 100000
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001
     PROJECT_NAME: str = "FastAPI Template"
     PROJECT_DESCRIPTION: str = "Plantilla FastAPI con MongoDB y Postgres (SQLModel)."
     PROJECT_VERSION: str = "1.0.0"
     API_PREFIX: str = "/api/v1"
     CORS_ORIGINS: List[str] = ["http://localhost:4321", "https://lims-qc-ui.vercel.app"]
 
+    # Deadline por petición (cabecera X-Request-Timeout o este valor por defecto)
+    REQUEST_TIMEOUT_SECONDS: float = 15.0
+    REQUEST_TIMEOUT_MAX_SECONDS: float = 60.0  # máximo que puede pedir un cliente
+
+    # Resiliencia de repositorios: reintentos de lecturas y circuit breaker por motor
+    DB_READ_RETRIES: int = 2  # reintentos de una lectura ante fallos transitorios
+    DB_RETRY_BASE_DELAY: float = 0.05  # segundos; backoff exponencial con jitter completo
+    DB_RETRY_MAX_DELAY: float = 1.0
+    DB_BREAKER_FAILURE_THRESHOLD: int = 5  # fallos transitorios seguidos para abrirlo
+    DB_BREAKER_RESET_SECONDS: float = 10.0  # abierto antes de dejar pasar una prueba
+
+    # Conteos y estadísticas
+    COUNT_CACHE_TTL_SECONDS: int = 30  # vida del total estimado en caché
+    USER_STATS_RECONCILE_SECONDS: int = 300  # 0 desactiva la reconciliación periódica
+
+    # Change feed
+    USER_TOMBSTONE_TTL_DAYS: int = 30  # retención de bajas (sync delta) antes de purgarlas
+
+    # Migración de usuarios de Mongo a Postgres (python -m cli.migrate_users)
+    USER_DUAL_WRITE: bool = False  # copia cada escritura de usuarios a Postgres
+    USER_MIGRATION_BATCH_SIZE: int = 2000
+
+    # Volcado / restauración de usuarios (python -m cli.dump_users)
+    USER_DUMP_FRAME_SIZE: int = 5000  # documentos por tramo comprimido
+    USER_RESTORE_WORKERS: int = 4  # inserciones en paralelo al restaurar
+
+    # Soft delete: purga y archivo de usuarios dados de baja
+    USER_PURGE_INTERVAL_SECONDS: int = 3600  # 0 desactiva la purga periódica
+    USER_PURGE_BATCH_SIZE: int = 500
+
+    # Eventos de usuarios (SSE)
+    USER_EVENTS_QUEUE_SIZE: int = 100  # eventos pendientes por suscriptor antes de descartarlo
+    USER_EVENTS_HEARTBEAT_SECONDS: int = 15
+    USER_EVENTS_RELAY: str = "none"  # "none" (un solo worker) o "mongo" (colección capped)
+
+    # Compresión de respuestas (gzip siempre; br y zstd si están instalados brotli/zstandard)
+    COMPRESSION_MINIMUM_SIZE: int = 1024  # bytes; por debajo no se comprime
+    COMPRESSION_CACHE_ENTRIES: int = 256  # respuestas con ETag precomprimidas (0 = sin caché)
+
+    # Límite de intentos de login (token buckets por IP y por cuenta)
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" (un solo worker) o "mongo" (compartido)
+    RATE_LIMIT_MAX_KEYS: int = 100000  # buckets en memoria como máximo
+    RATE_LIMIT_EVICT_SECONDS: int = 60  # limpieza de buckets ya recargados
+    LOGIN_IP_BURST: int = 20
+    LOGIN_IP_PER_MINUTE: float = 10
+    LOGIN_ACCOUNT_BURST: int = 5
+    LOGIN_ACCOUNT_PER_MINUTE: float = 2
+
+    # Idempotency-Key en POST/PUT/PATCH/DELETE
+    IDEMPOTENCY_STORE: str = "memory"  # "memory" (un solo worker) o "mongo" (compartido)
+    IDEMPOTENCY_TTL_SECONDS: int = 86400  # cuánto se recuerda la respuesta de una clave
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000  # tamaño del LRU en memoria
+    IDEMPOTENCY_LEASE_SECONDS: int = 60  # reserva de una clave mientras se ejecuta
+    IDEMPOTENCY_WAIT_SECONDS: float = 10.0  # espera de un duplicado concurrente antes del 409
+
+    # Audit trail (escritura en lote en segundo plano)
+    AUDIT_QUEUE_SIZE: int = 10000  # registros en memoria antes de volcar al archivo local
+    AUDIT_BATCH_SIZE: int = 200
+    AUDIT_FLUSH_SECONDS: float = 1.0  # espera máxima antes de escribir un lote incompleto
+    AUDIT_SPILL_PATH: str = "audit_spill.jsonl"  # respaldo local si la base de datos falla
+
+    # Tareas en segundo plano (/jobs)
+    JOB_WORKERS: int = 2  # tareas en paralelo por proceso
+    JOB_MAX_QUEUED: int = 100  # pendientes antes de rechazar nuevas (429)
+    JOB_POLL_SECONDS: float = 2.0  # busca tareas encoladas desde otros procesos
+    JOB_PROGRESS_SECONDS: float = 1.0  # frecuencia máxima de guardado del progreso
+    JOB_HEARTBEAT_SECONDS: float = 10.0
+    JOB_STALE_SECONDS: float = 60.0  # sin latido: su proceso murió y se reencola
+    JOB_SHUTDOWN_GRACE_SECONDS: float = 20.0  # al cerrar, espera antes de interrumpir
+    JOB_RETENTION_DAYS: int = 7  # las terminadas se borran por TTL
+
     model_config = SettingsConfigDict(
         env_file=BASE_DIR / "config.env",
         env_file_encoding="utf-8",
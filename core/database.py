@@ -11,6 +11,11 @@ from sqlalchemy.ext.asyncio import (
 )
 from sqlalchemy.exc import NoSuchModuleError
 from sqlalchemy import text  
+from sqlalchemy.engine import make_url
+from core.read_routing import read_your_writes
+from core.tenancy import TenantRouter, current_tenant
+from core.unit_of_work import LazySession
+from utils.metrics import register_metrics
 
 
 def _normalize_postgres_uri(uri: str) -> str:
@@ -37,12 +42,51 @@ def _normalize_postgres_uri(uri: str) -> str:
     return uri
 
 
+def _create_engine(uri: str) -> AsyncEngine:
+    """
+    Engine async con las cachés de sentencias configuradas: la de compilados de
+    SQLAlchemy (query_cache_size) y la de statements preparados de asyncpg.
+    """
+    url = make_url(_normalize_postgres_uri(uri))
+    if url.drivername == "postgresql+asyncpg":
+        url = url.update_query_dict(
+            {
+                "prepared_statement_cache_size": str(
+                    settings.POSTGRES_PREPARED_STATEMENT_CACHE_SIZE
+                )
+            }
+        )
+    return create_async_engine(
+        url, future=True, query_cache_size=settings.POSTGRES_COMPILED_CACHE_SIZE
+    )
+
+
+def _compiled_cache_size(engine: Optional[AsyncEngine]) -> Optional[int]:
+    cache = getattr(getattr(engine, "sync_engine", None), "_compiled_cache", None)
+    return len(cache) if cache is not None else None
+
+
 class MongoDB:
     def __init__(self):
         self.client: Optional[AsyncIOMotorClient] = None
-        self.db = None
+        self._db = None
         self.is_connected = False
 
+    @property
+    def db(self):
+        """
+        Base del laboratorio de la petición en curso (multi-laboratorio) o la
+        base por defecto.
+        """
+        tenant = current_tenant()
+        if tenant is not None:
+            return tenant_router.mongo_db(tenant)
+        return self._db
+
+    @db.setter
+    def db(self, value):
+        self._db = value
+
     async def connect(self):
         if self.is_connected:
             return
@@ -63,20 +107,54 @@ class MongoDB:
 
 class PostgresDB:
     def __init__(self):
-        self.engine: Optional[AsyncEngine] = None
-        self.async_session: Optional[async_sessionmaker[AsyncSession]] = None
+        self._engine: Optional[AsyncEngine] = None
+        self._async_session: Optional[async_sessionmaker[AsyncSession]] = None
+        # Réplica de lectura (opcional, POSTGRES_REPLICA_URI)
+        self.replica_engine: Optional[AsyncEngine] = None
+        self._replica_session: Optional[async_sessionmaker[AsyncSession]] = None
         self.is_connected = False
 
+    # Con un laboratorio en curso (multi-laboratorio) engine y sesiones son los
+    # de su base; los laboratorios no tienen réplica de lectura.
+
+    @property
+    def engine(self) -> Optional[AsyncEngine]:
+        tenant = current_tenant()
+        if tenant is not None:
+            return tenant_router.postgres_engine(tenant)
+        return self._engine
+
+    @engine.setter
+    def engine(self, value: Optional[AsyncEngine]):
+        self._engine = value
+
+    @property
+    def async_session(self) -> Optional[async_sessionmaker[AsyncSession]]:
+        tenant = current_tenant()
+        if tenant is not None:
+            return tenant_router.postgres_session(tenant)
+        return self._async_session
+
+    @async_session.setter
+    def async_session(self, value: Optional[async_sessionmaker[AsyncSession]]):
+        self._async_session = value
+
+    @property
+    def replica_session(self) -> Optional[async_sessionmaker[AsyncSession]]:
+        return None if current_tenant() is not None else self._replica_session
+
+    @replica_session.setter
+    def replica_session(self, value: Optional[async_sessionmaker[AsyncSession]]):
+        self._replica_session = value
+
     async def connect(self):
         if self.is_connected:
             return
         if not settings.POSTGRES_URI:
             raise RuntimeError("POSTGRES_URI no configurado")
 
-        normalized = _normalize_postgres_uri(settings.POSTGRES_URI)
-
         try:
-            self.engine = create_async_engine(normalized, future=True)
+            self.engine = _create_engine(settings.POSTGRES_URI)
         except NoSuchModuleError as e:
             msg = (
                 f"No se pudo crear engine con la URI: {settings.POSTGRES_URI!r}. "
@@ -102,9 +180,24 @@ class PostgresDB:
                 pass
             raise RuntimeError(f"Error probando conexión a Postgres: {e}") from e
 
+        if settings.POSTGRES_REPLICA_URI:
+            self.replica_engine = _create_engine(settings.POSTGRES_REPLICA_URI)
+            self.replica_session = async_sessionmaker(
+                self.replica_engine, expire_on_commit=False, class_=AsyncSession
+            )
+            print("Réplica de lectura de Postgres configurada.")
+
         self.is_connected = True
         print("Conexión a Postgres establecida.")
 
+    def metrics(self) -> dict:
+        return {
+            "prepared_statement_cache_size": settings.POSTGRES_PREPARED_STATEMENT_CACHE_SIZE,
+            "compiled_cache_size": settings.POSTGRES_COMPILED_CACHE_SIZE,
+            "compiled_cache_entries": _compiled_cache_size(self._engine),
+            "replica_compiled_cache_entries": _compiled_cache_size(self.replica_engine),
+        }
+
     async def init_models(self):
         if not self.engine:
             raise RuntimeError("Engine no inicializado")
@@ -113,8 +206,10 @@ class PostgresDB:
         print("Tablas de SQLModel creadas (si no existían).")
 
     async def disconnect(self):
-        if self.engine:
-            await self.engine.dispose()
+        if self.replica_engine:
+            await self.replica_engine.dispose()
+        if self._engine:
+            await self._engine.dispose()
             self.is_connected = False
             print("Conexión a Postgres cerrada.")
 
@@ -143,15 +238,52 @@ class Database:
 
 
 db = Database()
+register_metrics("postgres", db.postgres.metrics)
+
+# Bases por laboratorio (TENANCY_ENABLED; ver core.tenancy)
+tenant_router = TenantRouter(
+    _create_engine,
+    max_pools=settings.TENANT_MAX_POOLS,
+    idle_seconds=settings.TENANT_POOL_IDLE_SECONDS,
+)
+register_metrics("tenants", tenant_router.metrics)
 
-# dependencia de la sesión de SQL
+# dependencia de la sesión de SQL: unidad de trabajo de la petición (ver
+# LazySession). No saca conexión hasta la primera consulta y confirma todo con
+# un único commit al terminar el endpoint; si el endpoint falla, rollback.
+# Úsala con Depends(get_sql_session, scope="function") para que el commit
+# ocurra antes de enviar la respuesta (y un fallo al confirmar sea un error).
 async def get_sql_session() -> AsyncGenerator[Optional[AsyncSession], None]:
     if (settings.DB_ENGINE or "").lower() not in ("postgres", "postgresql"):
         yield None
-    else:
-        assert db.postgres.async_session is not None, "async_session no inicializada"
-        async with db.postgres.async_session() as session:
-            yield session
+        return
+    assert db.postgres.async_session is not None, "async_session no inicializada"
+    session = LazySession(db.postgres.async_session)
+    try:
+        yield session
+        await session.complete()
+    except BaseException:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+# dependencia de la sesión de lectura (listados/búsquedas): réplica si está
+# configurada y el usuario no acaba de escribir; si no, el primario
+async def get_sql_read_session() -> AsyncGenerator[Optional[AsyncSession], None]:
+    if (settings.DB_ENGINE or "").lower() not in ("postgres", "postgresql"):
+        yield None
+        return
+    factory = db.postgres.async_session
+    if db.postgres.replica_session is not None and read_your_writes.use_replica():
+        factory = db.postgres.replica_session
+    assert factory is not None, "async_session no inicializada"
+    session = LazySession(factory, deferred_commit=False)
+    try:
+        yield session
+    finally:
+        await session.close()
 
 
 # Compatibilidad de nombres antiguos
@@ -165,4 +297,11 @@ try:
 except Exception:
     postgres = None
 
-__all__ = ["db", "mongodb", "postgres", "get_sql_session"]
+__all__ = [
+    "db",
+    "mongodb",
+    "postgres",
+    "tenant_router",
+    "get_sql_session",
+    "get_sql_read_session",
+]
@@ -0,0 +1,166 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+import pymongo
+from pymongo.errors import PyMongoError
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from exceptions import DatabaseException
+from utils.metrics import register_metrics
+
+# Momento (time.monotonic) en que vence la petición en curso
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+_TIMEOUT_DETAIL = "La base de datos no respondió a tiempo"
+
+
+def remaining() -> Optional[float]:
+    """
+    Segundos que le quedan a la petición actual (None si no tiene deadline).
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def is_timeout(exc: Optional[BaseException]) -> bool:
+    """
+    True si `exc` (o alguna excepción de su cadena) es un timeout del driver:
+    asyncio, pymongo (maxTimeMS / CSOT) o Postgres (statement_timeout).
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+            return True
+        if isinstance(exc, PyMongoError) and exc.timeout:
+            return True
+        # asyncpg QueryCanceledError (SQLSTATE 57014) envuelto por SQLAlchemy
+        if getattr(getattr(exc, "orig", None), "sqlstate", None) == "57014":
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def apply_statement_timeout(session: AsyncSession):
+    """
+    Cada transacción de la sesión arranca con SET LOCAL statement_timeout igual
+    a lo que le queda a la petición, así Postgres corta la consulta por su lado.
+    """
+
+    @event.listens_for(session.sync_session, "after_begin")
+    def _set_timeout(sync_session, transaction, connection):
+        left = remaining()
+        if left is not None:
+            ms = max(1, int(left * 1000))
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {ms}")
+
+
+async def database_exception_handler(request: Request, exc: DatabaseException):
+    """
+    Un error de base de datos causado por un timeout (o con la petición ya
+    vencida) se responde con 504 en lugar de 500.
+    """
+    if is_timeout(exc) or expired():
+        deadlines.stats["db_timeouts"] += 1
+        return JSONResponse({"detail": _TIMEOUT_DETAIL}, status_code=504)
+    return JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+
+
+class Deadlines:
+    def __init__(self):
+        self.stats = {"requests": 0, "expired": 0, "db_timeouts": 0}
+
+    def metrics(self) -> dict:
+        return dict(self.stats)
+
+
+deadlines = Deadlines()
+register_metrics("deadlines", deadlines.metrics)
+
+
+class DeadlineMiddleware:
+    """
+    Middleware ASGI que asigna un deadline a cada petición.
+
+    - Se toma de la cabecera `X-Request-Timeout` (segundos, acotada a
+      `max_seconds`), del prefijo de ruta en `routes` o de `default_seconds`.
+      En `routes`, None desactiva el deadline (p. ej. streams SSE).
+    - Se aplica a Mongo con pymongo.timeout (maxTimeMS y timeouts de socket en
+      cada operación) y a Postgres con statement_timeout (ver
+      apply_statement_timeout).
+    - Al vencer se cancela el endpoint y se responde 504 de inmediato.
+    """
+
+    def __init__(
+        self,
+        app,
+        default_seconds: float,
+        max_seconds: float,
+        routes: Optional[Dict[str, Optional[float]]] = None,
+    ):
+        self.app = app
+        self.default_seconds = default_seconds
+        self.max_seconds = max_seconds
+        # Prefijos más largos primero
+        self.routes = sorted((routes or {}).items(), key=lambda r: -len(r[0]))
+
+    def _timeout_for(self, scope) -> Optional[float]:
+        timeout: Optional[float] = self.default_seconds
+        for prefix, seconds in self.routes:
+            if scope["path"].startswith(prefix):
+                timeout = seconds
+                break
+        if timeout is None:
+            return None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-timeout":
+                try:
+                    requested = float(value)
+                except ValueError:
+                    break
+                if requested > 0:
+                    timeout = min(requested, self.max_seconds)
+                break
+        return timeout if timeout > 0 else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timeout = self._timeout_for(scope)
+        if timeout is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = False
+
+        async def send_tracking(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        deadlines.stats["requests"] += 1
+        token = _deadline.set(time.monotonic() + timeout)
+        try:
+            with pymongo.timeout(timeout):
+                async with asyncio.timeout(timeout):
+                    await self.app(scope, receive, send_tracking)
+        except TimeoutError:
+            deadlines.stats["expired"] += 1
+            if started:
+                return  # la respuesta ya empezó: solo se corta
+            response = JSONResponse(
+                {"detail": "La petición superó su tiempo límite"}, status_code=504
+            )
+            await response(scope, receive, send)
+        finally:
+            _deadline.reset(token)
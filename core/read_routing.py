@@ -0,0 +1,60 @@
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from core.config import settings
+from utils.metrics import register_metrics
+
+# Usuario de la petición en curso (lo fija la verificación del token)
+_current_user: ContextVar[Optional[str]] = ContextVar("current_user", default=None)
+
+
+def set_current_user(user_id: Optional[str]):
+    _current_user.set(user_id)
+
+
+class ReadYourWrites:
+    """
+    Ventana de lectura-de-tus-escrituras por usuario.
+
+    Después de que un usuario escribe, sus lecturas van al primario durante
+    `window_seconds` (lo que tarda en replicarse). El resto de lecturas de
+    listados y búsquedas pueden ir a las réplicas.
+    """
+
+    def __init__(self, window_seconds: float, max_users: int = 100_000):
+        self.window_seconds = window_seconds
+        self.max_users = max_users
+        self._until: Dict[str, float] = {}
+        self.stats = {"primary_reads": 0, "replica_reads": 0}
+
+    def mark_write(self, user_id: Optional[str] = None):
+        """
+        Registra una escritura del usuario actual (o de `user_id`).
+        """
+        user_id = user_id or _current_user.get()
+        if not user_id or self.window_seconds <= 0:
+            return
+        now = time.monotonic()
+        self._until[user_id] = now + self.window_seconds
+        if len(self._until) > self.max_users:
+            self._until = {u: t for u, t in self._until.items() if t > now}
+
+    def use_replica(self) -> bool:
+        """
+        True si la lectura actual puede ir a una réplica.
+        """
+        user_id = _current_user.get()
+        until = self._until.get(user_id) if user_id else None
+        if until is not None and until > time.monotonic():
+            self.stats["primary_reads"] += 1
+            return False
+        self.stats["replica_reads"] += 1
+        return True
+
+    def metrics(self) -> dict:
+        return {**self.stats, "tracked_users": len(self._until)}
+
+
+# Ventana compartida por el proceso
+read_your_writes = ReadYourWrites(settings.READ_YOUR_WRITES_SECONDS)
+register_metrics("read_routing", read_your_writes.metrics)
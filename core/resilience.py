@@ -0,0 +1,226 @@
+import asyncio
+import functools
+import math
+import random
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from pymongo.errors import AutoReconnect, ConnectionFailure, PyMongoError
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from core.config import settings
+from core.deadline import expired, is_timeout, remaining
+from exceptions import ServiceUnavailableException
+from utils.metrics import register_metrics
+from utils.single_flight import carry_context
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# SQLSTATE de Postgres que indican conexión perdida o servidor reiniciándose
+_TRANSIENT_SQLSTATES = ("08", "57P01", "57P02", "57P03")
+
+# True mientras se ejecuta un método protegido: las llamadas anidadas (p. ej. el
+# find_by_id que sigue a un update) no se reintentan ni cuentan dos veces
+_guarded: ContextVar[bool] = carry_context(ContextVar("db_guarded", default=False))
+
+_UNAVAILABLE_DETAIL = "La base de datos no está disponible, inténtalo más tarde"
+
+
+def is_transient(exc: Optional[BaseException]) -> bool:
+    """
+    True si `exc` (o alguna excepción de su cadena) es un fallo transitorio de
+    conexión: failover de Mongo, conexión caída o Postgres reiniciándose.
+    Los errores de la consulta en sí (clave duplicada, sintaxis...) no lo son.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, (AutoReconnect, ConnectionFailure)):
+            return True
+        if isinstance(exc, PyMongoError) and (
+            exc.has_error_label("RetryableReadError")
+            or exc.has_error_label("TransientTransactionError")
+        ):
+            return True
+        if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+            return True
+        if isinstance(exc, (OperationalError, InterfaceError, ConnectionError)):
+            return True
+        sqlstate = getattr(getattr(exc, "orig", None), "sqlstate", None) or ""
+        if sqlstate.startswith(_TRANSIENT_SQLSTATES):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por motor de base de datos.
+
+    - closed: las llamadas pasan; `failure_threshold` fallos transitorios
+      seguidos lo abren.
+    - open: las llamadas fallan al momento con 503 (sin esperar al timeout de
+      selección de servidor del driver) durante `reset_seconds`.
+    - half_open: pasado ese tiempo se deja pasar una sola llamada de prueba;
+      si va bien se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.stats = {"rejected": 0, "failures": 0, "opened": 0, "retries": 0}
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        if self._probing or time.monotonic() - self._opened_at < self.reset_seconds:
+            return OPEN
+        return HALF_OPEN
+
+    def before_call(self) -> bool:
+        """
+        Comprueba si la llamada puede pasar. Devuelve True si es la prueba del
+        estado half_open (quien la hace debe informar el resultado).
+
+        Raises:
+            ServiceUnavailableException: Si el breaker está abierto
+        """
+        state = self.state
+        if state == CLOSED:
+            return False
+        if state == HALF_OPEN:
+            self._probing = True
+            return True
+        self.stats["rejected"] += 1
+        raise ServiceUnavailableException(
+            _UNAVAILABLE_DETAIL, retry_after=math.ceil(self.retry_after())
+        )
+
+    def retry_after(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self._failures += 1
+        if self._probing or (
+            self._opened_at is None and self._failures >= self.failure_threshold
+        ):
+            if self._opened_at is None:
+                print(f"⚠️ Circuit breaker '{self.name}' abierto tras {self._failures} fallos")
+            self.stats["opened"] += 1
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def release_probe(self):
+        """
+        La prueba terminó sin resultado (cancelada): otra llamada podrá probar.
+        """
+        self._probing = False
+
+    def metrics(self) -> dict:
+        return {**self.stats, "state": self.state, "consecutive_failures": self._failures}
+
+
+def _backoff(attempt: int) -> float:
+    """
+    Espera antes del reintento `attempt` (0, 1, ...): jitter completo sobre un
+    backoff exponencial acotado, para que los workers no reintenten a la vez.
+    """
+    cap = min(settings.DB_RETRY_MAX_DELAY, settings.DB_RETRY_BASE_DELAY * 2**attempt)
+    return random.uniform(0, cap)
+
+
+def resilient(retry: bool = False):
+    """
+    Decorador para métodos de repositorio. Pasa la llamada por el circuit
+    breaker del repo (`self.breaker`) y, con `retry=True` (solo lecturas
+    idempotentes), la reintenta ante fallos transitorios hasta DB_READ_RETRIES
+    veces sin pasarse del deadline de la petición.
+
+    Antes de cada reintento se llama a `self._recover()` si existe (p. ej. el
+    rollback de la sesión de Postgres). Un fallo transitorio que persiste se
+    responde con 503; los timeouts siguen respondiéndose con 504.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            if _guarded.get():
+                return await method(self, *args, **kwargs)
+
+            breaker: CircuitBreaker = self.breaker
+            token = _guarded.set(True)
+            try:
+                attempts = 1 + (settings.DB_READ_RETRIES if retry else 0)
+                for attempt in range(attempts):
+                    probe = breaker.before_call()
+                    try:
+                        result = await method(self, *args, **kwargs)
+                    except Exception as e:
+                        if not is_transient(e):
+                            # La base de datos respondió (404, 409, ...)
+                            breaker.record_success()
+                            raise
+                        if expired():
+                            # Se agotó el tiempo de la petición, no la base de datos
+                            breaker.release_probe()
+                            raise
+                        breaker.record_failure()
+                        if is_timeout(e):
+                            raise
+                        delay = _backoff(attempt)
+                        left = remaining()
+                        if (
+                            attempt + 1 == attempts
+                            or breaker.state != CLOSED
+                            or (left is not None and left <= delay)
+                        ):
+                            raise ServiceUnavailableException(
+                                _UNAVAILABLE_DETAIL,
+                                retry_after=math.ceil(breaker.retry_after()),
+                            ) from e
+                        breaker.stats["retries"] += 1
+                        await asyncio.sleep(delay)
+                        recover = getattr(self, "_recover", None)
+                        if recover is not None:
+                            await recover()
+                        continue
+                    except BaseException:
+                        if probe:
+                            breaker.release_probe()
+                        raise
+                    breaker.record_success()
+                    return result
+            finally:
+                _guarded.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+# Un breaker por motor, compartido por todos los repositorios del proceso
+breakers: Dict[str, CircuitBreaker] = {
+    name: CircuitBreaker(
+        name,
+        failure_threshold=settings.DB_BREAKER_FAILURE_THRESHOLD,
+        reset_seconds=settings.DB_BREAKER_RESET_SECONDS,
+    )
+    for name in ("mongodb", "postgresql")
+}
+mongo_breaker = breakers["mongodb"]
+postgres_breaker = breakers["postgresql"]
+register_metrics(
+    "circuit_breakers", lambda: {name: b.metrics() for name, b in breakers.items()}
+)
@@ -0,0 +1,385 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+from motor.motor_asyncio import AsyncIOMotorClient
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from core.config import settings
+from utils.single_flight import carry_context
+
+# Laboratorio (tenant) de la petición en curso; None = base por defecto
+_current_tenant: ContextVar[Optional[str]] = carry_context(
+    ContextVar("current_tenant", default=None)
+)
+
+# Ids de laboratorio: se usan en nombres de base de datos y URIs
+_TENANT_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+MONGO = "mongodb"
+POSTGRES = "postgresql"
+
+
+def current_tenant() -> Optional[str]:
+    return _current_tenant.get()
+
+
+@contextmanager
+def use_tenant(tenant: Optional[str]):
+    """
+    Fija el laboratorio fuera de una petición (comandos de consola, tareas).
+    """
+    token = _current_tenant.set(tenant)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+
+def is_valid_tenant(tenant: Optional[str]) -> bool:
+    if not tenant or not _TENANT_ID.match(tenant):
+        return False
+    return not settings.TENANT_IDS or tenant in settings.TENANT_IDS
+
+
+class TenantError(Exception):
+    def __init__(self, detail: str, status_code: int):
+        self.detail = detail
+        self.status_code = status_code
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _tenant_from_token(scope) -> Optional[str]:
+    authorization = _header(scope, b"authorization") or ""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(
+            token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]
+        )
+    except JWTError:
+        return None  # la dependencia de auth responderá 401
+    return payload.get(settings.TENANT_CLAIM)
+
+
+def _tenant_from_host(scope) -> Optional[str]:
+    suffix = settings.TENANT_HOST_SUFFIX
+    host = (_header(scope, b"host") or "").split(":")[0].lower()
+    if not suffix or not host.endswith(suffix) or len(host) == len(suffix):
+        return None
+    label = host[: -len(suffix)]
+    return None if "." in label else label
+
+
+def resolve_tenant(scope) -> Optional[str]:
+    """
+    Laboratorio de la petición: claim del token (firmado), subdominio del host
+    o TENANT_DEFAULT, en ese orden. Un token de otro laboratorio que el del
+    host se rechaza (403); un laboratorio desconocido, 404.
+    """
+    claim = _tenant_from_token(scope)
+    host = _tenant_from_host(scope)
+    if claim and host and claim != host:
+        raise TenantError("El token no pertenece a este laboratorio", 403)
+    tenant = claim or host or settings.TENANT_DEFAULT
+    if tenant is not None and not is_valid_tenant(tenant):
+        raise TenantError("Laboratorio desconocido", 404)
+    return tenant
+
+
+class TenantStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.last_seen = time.monotonic()
+
+    def record(self, seconds: float, status_code: int):
+        self.requests += 1
+        if status_code >= 500:
+            self.errors += 1
+        self.latency_total += seconds
+        self.latency_max = max(self.latency_max, seconds)
+        self.last_seen = time.monotonic()
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "avg_ms": round(self.latency_total / self.requests * 1000, 2) if self.requests else 0.0,
+            "max_ms": round(self.latency_max * 1000, 2),
+        }
+
+
+class _Pool:
+    """
+    Un cliente de Mongo o un engine de Postgres y los laboratorios que lo usan
+    (varios laboratorios en la misma URI de Mongo comparten cliente).
+    """
+
+    def __init__(self, kind: str, uri: str, handle, sessionmaker=None):
+        self.kind = kind
+        self.uri = uri
+        self.handle = handle
+        self.sessionmaker = sessionmaker
+        self.tenants: Set[str] = set()
+        self.opened_at = self.last_used = time.monotonic()
+
+    def touch(self, tenant: str):
+        self.tenants.add(tenant)
+        self.last_used = time.monotonic()
+
+    async def close(self):
+        if self.kind == MONGO:
+            self.handle.close()
+        else:
+            await self.handle.dispose()
+
+    def metrics(self) -> dict:
+        data = {
+            "tenants": len(self.tenants),
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+        }
+        pool = getattr(getattr(self.handle, "sync_engine", None), "pool", None)
+        if pool is not None and hasattr(pool, "checkedout"):
+            data["checked_out"] = pool.checkedout()
+        return data
+
+
+class TenantRouter:
+    """
+    Clientes de Mongo y engines de Postgres por laboratorio.
+
+    - Se abren al llegar la primera petición del laboratorio (prepare) y se
+      ejecutan una vez los `on_open` (índices, tablas) sobre su base.
+    - Como máximo `max_pools` abiertos por motor: al pasarse se cierra el
+      usado hace más tiempo, y `evict_idle` (tarea periódica) cierra los que
+      llevan `idle_seconds` sin uso. Nunca se cierra el pool de un
+      laboratorio con peticiones en curso; si todos están ocupados se admite
+      pasarse del máximo hasta que alguno quede libre.
+    """
+
+    def __init__(
+        self,
+        engine_factory: Callable[[str], AsyncEngine],
+        max_pools: int,
+        idle_seconds: float,
+    ):
+        self.engine_factory = engine_factory
+        self.max_pools = max_pools
+        self.idle_seconds = idle_seconds
+        self._pools: Dict[str, "OrderedDict[str, _Pool]"] = {
+            MONGO: OrderedDict(),
+            POSTGRES: OrderedDict(),
+        }
+        self._hooks: List[Callable[[], Awaitable[None]]] = []
+        self._prepared: Set[str] = set()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.tenants: Dict[str, TenantStats] = {}
+        self.stats = {"opened": 0, "evicted": 0, "rejected": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.TENANCY_ENABLED
+
+    def on_open(self, hook: Callable[[], Awaitable[None]]):
+        """
+        Registra una inicialización por laboratorio; se llama con el
+        laboratorio ya fijado (db.mongo.db / db.postgres apuntan a su base).
+        """
+        self._hooks.append(hook)
+
+    # --- Ubicación de cada laboratorio ---
+
+    def mongo_uri(self, tenant: str) -> str:
+        template = settings.TENANT_MONGODB_URI or settings.MONGODB_URI_DEV_LAB_TEST
+        return template.format(tenant=tenant)
+
+    def mongo_name(self, tenant: str) -> str:
+        return f"{settings.MONGODB_NAME}_{tenant}"
+
+    def postgres_uri(self, tenant: str) -> str:
+        if settings.TENANT_POSTGRES_URI:
+            return settings.TENANT_POSTGRES_URI.format(tenant=tenant)
+        url = make_url(settings.POSTGRES_URI)
+        return url.set(database=f"{url.database}_{tenant}").render_as_string(
+            hide_password=False
+        )
+
+    # --- Pools ---
+
+    def _pool(self, kind: str, uri: str, tenant: str) -> _Pool:
+        pools = self._pools[kind]
+        pool = pools.get(uri)
+        if pool is None:
+            if kind == MONGO:
+                pool = _Pool(kind, uri, AsyncIOMotorClient(uri))
+            else:
+                engine = self.engine_factory(uri)
+                pool = _Pool(
+                    kind,
+                    uri,
+                    engine,
+                    async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession),
+                )
+            pools[uri] = pool
+            self.stats["opened"] += 1
+        pools.move_to_end(uri)
+        pool.touch(tenant)
+        return pool
+
+    def mongo_db(self, tenant: str):
+        pool = self._pool(MONGO, self.mongo_uri(tenant), tenant)
+        return pool.handle[self.mongo_name(tenant)]
+
+    def postgres_engine(self, tenant: str) -> AsyncEngine:
+        return self._pool(POSTGRES, self.postgres_uri(tenant), tenant).handle
+
+    def postgres_session(self, tenant: str) -> async_sessionmaker:
+        return self._pool(POSTGRES, self.postgres_uri(tenant), tenant).sessionmaker
+
+    def _busy(self, pool: _Pool) -> bool:
+        return any(
+            self.tenants[t].in_flight > 0 for t in pool.tenants if t in self.tenants
+        )
+
+    async def _evict(self, kind: str, uri: str):
+        pool = self._pools[kind].pop(uri)
+        self.stats["evicted"] += 1
+        try:
+            await pool.close()
+        except Exception as e:
+            print(f"⚠️ No se pudo cerrar el pool de {sorted(pool.tenants)}: {e}")
+
+    async def _enforce_capacity(self):
+        for kind, pools in self._pools.items():
+            excess = len(pools) - self.max_pools
+            for uri in [u for u, p in pools.items() if not self._busy(p)][:max(excess, 0)]:
+                await self._evict(kind, uri)
+
+    async def prepare(self, tenant: str):
+        """
+        Abre los pools del laboratorio para el motor configurado y, la primera
+        vez, ejecuta las inicializaciones registradas.
+        """
+        if (settings.DB_ENGINE or "").lower() in ("postgres", "postgresql"):
+            self.postgres_engine(tenant)
+        else:
+            self.mongo_db(tenant)
+        await self._enforce_capacity()
+        if tenant in self._prepared:
+            return
+        lock = self._locks.setdefault(tenant, asyncio.Lock())
+        async with lock:
+            if tenant in self._prepared:
+                return
+            with use_tenant(tenant):
+                for hook in self._hooks:
+                    await hook()
+            self._prepared.add(tenant)
+            print(f"🏷️ Laboratorio '{tenant}' inicializado")
+
+    async def evict_idle(self) -> int:
+        """
+        Cierra los pools sin uso desde hace `idle_seconds`. Devuelve cuántos.
+        """
+        cutoff = time.monotonic() - self.idle_seconds
+        evicted = 0
+        for kind, pools in self._pools.items():
+            for uri in [u for u, p in pools.items() if p.last_used < cutoff and not self._busy(p)]:
+                await self._evict(kind, uri)
+                evicted += 1
+        return evicted
+
+    async def close_all(self):
+        for kind, pools in self._pools.items():
+            for uri in list(pools):
+                await self._evict(kind, uri)
+
+    # --- Métricas ---
+
+    def stats_for(self, tenant: str) -> TenantStats:
+        stats = self.tenants.get(tenant)
+        if stats is None:
+            stats = self.tenants[tenant] = TenantStats()
+        return stats
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "open_pools": {kind: len(pools) for kind, pools in self._pools.items()},
+            "pools": {
+                f"{kind}:{','.join(sorted(pool.tenants))}": pool.metrics()
+                for kind, pools in self._pools.items()
+                for pool in pools.values()
+            },
+            "tenants": {t: s.as_dict() for t, s in sorted(self.tenants.items())},
+        }
+
+
+class TenantMiddleware:
+    """
+    Middleware ASGI que fija el laboratorio de cada petición (ver
+    resolve_tenant) y abre sus pools antes de llamar al endpoint. Registra
+    peticiones, errores y latencia por laboratorio.
+
+    Las rutas de `exempt` (salud, métricas, documentación) sin laboratorio
+    usan la base por defecto; el resto sin laboratorio recibe 400.
+    """
+
+    def __init__(self, app, router: TenantRouter, exempt: tuple = ()):
+        self.app = app
+        self.router = router
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.router.enabled:
+            await self.app(scope, receive, send)
+            return
+        try:
+            tenant = resolve_tenant(scope)
+            if tenant is None and not scope["path"].startswith(self.exempt):
+                raise TenantError("No se pudo determinar el laboratorio", 400)
+        except TenantError as e:
+            self.router.stats["rejected"] += 1
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code)
+            await response(scope, receive, send)
+            return
+        if tenant is None:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_tracking(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = self.router.stats_for(tenant)
+        stats.in_flight += 1
+        started = time.perf_counter()
+        token = _current_tenant.set(tenant)
+        try:
+            await self.router.prepare(tenant)
+            await self.app(scope, receive, send_tracking)
+        finally:
+            _current_tenant.reset(token)
+            stats.in_flight -= 1
+            stats.record(time.perf_counter() - started, status_code)
@@ -0,0 +1,98 @@
+from typing import Callable, Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.pool import Pool
+from core.deadline import apply_statement_timeout
+from utils.metrics import register_metrics
+
+
+class SessionStats:
+    def __init__(self):
+        self.stats = {
+            "requests": 0,  # sesiones entregadas por las dependencias
+            "opened": 0,  # las que llegaron a crear una AsyncSession
+            "commits": 0,
+            "deferred_commits": 0,  # commits de repos agrupados en el commit final
+            "rollbacks": 0,
+            "checkouts": 0,  # conexiones sacadas de los pools (primario y réplica)
+        }
+
+    def metrics(self) -> dict:
+        return {**self.stats, "unused": self.stats["requests"] - self.stats["opened"]}
+
+
+sql_sessions = SessionStats()
+register_metrics("sql_sessions", sql_sessions.metrics)
+
+
+@event.listens_for(Pool, "checkout")
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    sql_sessions.stats["checkouts"] += 1
+
+
+class LazySession:
+    """
+    Unidad de trabajo de una petición sobre una AsyncSession perezosa.
+
+    - La AsyncSession (y con ella la conexión del pool) no se crea hasta el
+      primer uso: una petición que no toca la base de datos (p. ej. un acierto
+      de caché) no saca ninguna conexión.
+    - Con `deferred_commit`, los commit() de los repositorios solo hacen flush
+      (se asignan ids y saltan los errores de integridad donde se producen) y
+      la transacción se confirma una sola vez en complete(), al final de la
+      petición. Así la petición usa una única conexión y una única transacción.
+
+    Expone la misma API que AsyncSession (execute, add, refresh, ...).
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], AsyncSession],
+        deferred_commit: bool = True,
+    ):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+        self.deferred_commit = deferred_commit
+        sql_sessions.stats["requests"] += 1
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    def _get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+            apply_statement_timeout(self._session)
+            sql_sessions.stats["opened"] += 1
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    async def commit(self):
+        if not self.deferred_commit:
+            await self._commit()
+            return
+        if self._session is not None:
+            await self._session.flush()
+        sql_sessions.stats["deferred_commits"] += 1
+
+    async def rollback(self):
+        if self._session is not None:
+            await self._session.rollback()
+            sql_sessions.stats["rollbacks"] += 1
+
+    async def complete(self):
+        """
+        Confirma lo pendiente de la petición (no hace nada si no se usó).
+        """
+        if self._session is not None and self._session.in_transaction():
+            await self._commit()
+
+    async def _commit(self):
+        await self._get().commit()
+        sql_sessions.stats["commits"] += 1
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
@@ -21,6 +21,16 @@ class ValidationException(AppException):
     def __init__(self, detail: str = "Error de validación"):
         super().__init__(status.HTTP_422_UNPROCESSABLE_ENTITY, detail)
 
+class TooManyRequestsException(AppException):
+    def __init__(self, detail: str = "Demasiadas peticiones", retry_after: int = 1):
+        super().__init__(status.HTTP_429_TOO_MANY_REQUESTS, detail)
+        self.headers = {"Retry-After": str(max(retry_after, 1))}
+
+class ServiceUnavailableException(AppException):
+    def __init__(self, detail: str = "Servicio no disponible", retry_after: int = 1):
+        super().__init__(status.HTTP_503_SERVICE_UNAVAILABLE, detail)
+        self.headers = {"Retry-After": str(max(retry_after, 1))}
+
 class DatabaseException(HTTPException):
     def __init__(self, detail: str):
         super().__init__(
@@ -1,16 +1,51 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from core.config import settings
-from core.database import db 
+from core.database import db, tenant_router
+from core.deadline import DeadlineMiddleware, database_exception_handler
+from core.tenancy import TenantMiddleware
+from exceptions import DatabaseException
 from repositories.user_repository import UserRepository
+from repositories.user_mirror import user_mirror
+from repositories.audit_repository import AuditRepository, AUDIT_COLLECTION
+from services.user_service import UserService
+from services.user_events import user_events, MongoCappedRelay
+from services.audit_service import audit_log
+from services.job_runner import job_runner
+from repositories.job_repository import JobRepository, JOBS_COLLECTION
+import services.job_handlers  # noqa: F401  (registra los tipos de tarea)
+from utils.periodic import run_periodically
+from utils.compression import CompressionMiddleware
+from utils.rate_limiter import login_rate_limiter, MongoRateLimitBackend
+from utils.idempotency import (
+    IdempotencyMiddleware,
+    MongoIdempotencyStore,
+    idempotency_keys,
+)
 
 # Importar routers de los endpoints
 from api.endpoints.ok import router as ok_router
 from api.endpoints.hello import router as hello_router
 from api.endpoints.users import router as users_router
 from api.endpoints.auth import router as auth_router
+from api.endpoints.metrics import router as metrics_router
+from api.endpoints.audit import router as audit_router
+from api.endpoints.jobs import router as jobs_router
+
+
+async def prepare_tenant_database():
+    """
+    Primera petición de un laboratorio: índices (o tablas) de su base.
+    """
+    if (settings.DB_ENGINE or "").lower() in ("postgres", "postgresql"):
+        await db.postgres.init_models()
+        return
+    user_repo = UserRepository(db.mongo.db["users"])
+    await user_repo.ensure_indexes()
+    await UserService(user_repo).revocation_repo.ensure_indexes()
 
 
 @asynccontextmanager
@@ -24,15 +59,120 @@ async def lifespan(app: FastAPI):
         collection = db.mongo.db["users"]
         user_repo = UserRepository(collection)
         await user_repo.ensure_indexes()
+
+        # Dual-write de usuarios a Postgres mientras dura la migración (opcional)
+        if settings.USER_DUAL_WRITE:
+            await db.postgres.connect()
+            await db.postgres.init_models()
+            user_mirror.start(db.postgres.async_session)
+
+        # Audit trail: índices y flusher en segundo plano
+        audit_repo = AuditRepository(db.mongo.db[AUDIT_COLLECTION])
+        await audit_repo.ensure_indexes()
+        await audit_log.start(audit_repo)
+
+        # Tareas en segundo plano: registros en la base por defecto
+        jobs_repo = JobRepository(db.mongo.db[JOBS_COLLECTION])
+        await jobs_repo.ensure_indexes()
+        await job_runner.start(jobs_repo)
+
+        # Versiones de token invalidadas (cambios de rol/estado) y tokens revocados
+        # antes de aceptar peticiones
+        user_service = UserService(user_repo)
+        await user_service.revocation_repo.ensure_indexes()
+        await user_service.sync_token_versions()
+        await user_service.sync_revocations()
+
+        # Idempotency-Key compartida entre workers (opcional)
+        if settings.IDEMPOTENCY_STORE.lower() == "mongo":
+            store = MongoIdempotencyStore(db.mongo.db["idempotency_keys"])
+            await store.ensure_indexes()
+            idempotency_keys.store = store
+
+        # Límite de intentos de login compartido entre workers (opcional)
+        if settings.RATE_LIMIT_BACKEND.lower() == "mongo":
+            backend = MongoRateLimitBackend(db.mongo.db["rate_limits"])
+            await backend.ensure_indexes()
+            login_rate_limiter.backend = backend
+
+        # Relay de eventos entre workers (opcional)
+        if settings.USER_EVENTS_RELAY.lower() == "mongo":
+            user_events.relay = MongoCappedRelay(db.mongo.db)
+        await user_events.start()
+
+        # Multi-laboratorio: cada base se prepara con su primera petición
+        if tenant_router.enabled:
+            tenant_router.on_open(prepare_tenant_database)
         
     except Exception as e:
         print(f"❌ Error fatal de conexión a la base de datos: {str(e)}")
         raise RuntimeError("No se pudo iniciar la aplicación - Error de base de datos") from e
 
+    # Tareas de fondo
+    background_tasks = [
+        run_periodically(
+            user_service.sync_token_versions,
+            settings.TOKEN_VERSION_SYNC_SECONDS,
+            "sync-token-versions",
+        )
+    ]
+    background_tasks.append(
+        run_periodically(
+            user_service.sync_revocations,
+            settings.REVOCATION_SYNC_SECONDS,
+            "sync-revoked-tokens",
+        )
+    )
+    if settings.RATE_LIMIT_EVICT_SECONDS > 0:
+        background_tasks.append(
+            run_periodically(
+                login_rate_limiter.evict,
+                settings.RATE_LIMIT_EVICT_SECONDS,
+                "evict-rate-limit-buckets",
+            )
+        )
+    if settings.USER_PURGE_INTERVAL_SECONDS > 0:
+        background_tasks.append(
+            run_periodically(
+                user_repo.purge_deleted_users,
+                settings.USER_PURGE_INTERVAL_SECONDS,
+                "purge-deleted-users",
+            )
+        )
+    if settings.USER_STATS_RECONCILE_SECONDS > 0:
+        background_tasks.append(
+            run_periodically(
+                user_repo.reconcile_stats,
+                settings.USER_STATS_RECONCILE_SECONDS,
+                "reconcile-user-stats",
+                run_immediately=True,
+            )
+        )
+
+    if tenant_router.enabled:
+        background_tasks.append(
+            run_periodically(
+                tenant_router.evict_idle,
+                max(settings.TENANT_POOL_IDLE_SECONDS / 2, 1),
+                "evict-tenant-pools",
+            )
+        )
+
     yield
 
     # Cierre
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await job_runner.stop()  # espera a las tareas en curso o las reencola
+    await user_events.stop()
+    await audit_log.stop()  # escribe los registros pendientes antes de desconectar
+
+    await tenant_router.close_all()
     await db.disconnect()
+    if user_mirror.enabled:
+        user_mirror.stop()
+        await db.postgres.disconnect()
     print("🔌 Conexión a la base de datos cerrada")
 
 app = FastAPI(
@@ -45,6 +185,31 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Idempotency-Key (el más interno: guarda la respuesta sin comprimir)
+app.add_middleware(IdempotencyMiddleware)
+
+# Deadline por petición (los streams SSE no tienen)
+app.add_middleware(
+    DeadlineMiddleware,
+    default_seconds=settings.REQUEST_TIMEOUT_SECONDS,
+    max_seconds=settings.REQUEST_TIMEOUT_MAX_SECONDS,
+    routes={f"{settings.API_PREFIX}/users/events": None},
+)
+app.add_exception_handler(DatabaseException, database_exception_handler)
+
+# Laboratorio de la petición (multi-laboratorio, TENANCY_ENABLED)
+app.add_middleware(
+    TenantMiddleware,
+    router=tenant_router,
+    exempt=(
+        f"{settings.API_PREFIX}/ok",
+        f"{settings.API_PREFIX}/metrics",
+        f"{settings.API_PREFIX}/openapi.json",
+        "/docs",
+        "/redoc",
+    ),
+)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -54,11 +219,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compresión negociada (zstd / br / gzip)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    cache_entries=settings.COMPRESSION_CACHE_ENTRIES,
+)
+
 # Routers
 app.include_router(ok_router, prefix=settings.API_PREFIX, tags=["ok"])
 app.include_router(hello_router, prefix=settings.API_PREFIX, tags=["hello"])
 app.include_router(users_router, prefix=settings.API_PREFIX, tags=["users"])
 app.include_router(auth_router, prefix=settings.API_PREFIX, tags=["auth"])
+app.include_router(metrics_router, prefix=settings.API_PREFIX, tags=["metrics"])
+app.include_router(audit_router, prefix=settings.API_PREFIX, tags=["audit"])
+app.include_router(jobs_router, prefix=settings.API_PREFIX, tags=["jobs"])
 
 
 # Static files
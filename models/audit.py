@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import Optional, Dict, Any
+from datetime import datetime
+from enum import Enum
+
+
+# Acciones que quedan registradas en el audit trail
+class AuditAction(str, Enum):
+    USER_CREATED = "user.created"
+    USER_UPDATED = "user.updated"
+    USER_ROLE_CHANGED = "user.role_changed"
+    USER_DEACTIVATED = "user.deactivated"
+    USER_DELETED = "user.deleted"
+    LOGIN = "auth.login"
+    LOGIN_FAILED = "auth.login_failed"
+    LOGOUT = "auth.logout"
+
+
+# Registro de auditoría tal como se devuelve a los auditores
+class AuditRecord(BaseModel):
+    id: str = Field(..., alias="_id")
+    action: AuditAction
+    actor_id: Optional[str] = None  # quién hizo la acción (None si no autenticado)
+    target_id: Optional[str] = None  # sobre qué usuario
+    at: datetime
+    details: Dict[str, Any] = {}
+
+    model_config = ConfigDict(populate_by_name=True)
@@ -0,0 +1,48 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import Optional, Dict, Any
+from datetime import datetime
+from enum import Enum
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+# Tipos de tarea disponibles (cada uno con su handler en services.job_handlers)
+class JobKind(str, Enum):
+    PURGE_DELETED_USERS = "users.purge_deleted"
+    RECONCILE_USER_STATS = "users.reconcile_stats"
+
+
+class JobCreate(BaseModel):
+    kind: JobKind
+    params: Dict[str, Any] = {}
+
+
+class JobProgress(BaseModel):
+    done: int = 0
+    total: Optional[int] = None  # None si no se conoce de antemano
+    message: Optional[str] = None
+
+
+# Tarea tal como se devuelve al consultar su estado
+class JobRecord(BaseModel):
+    id: str = Field(..., alias="_id")
+    kind: JobKind
+    status: JobStatus
+    params: Dict[str, Any] = {}
+    progress: JobProgress = JobProgress()
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    attempts: int = 0  # veces que empezó (se reanuda tras un reinicio)
+    created_by: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(populate_by_name=True)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field, ConfigDict, field_validator
-from typing import Optional
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -84,6 +84,7 @@ class User(UserBase):
     id: Optional[str] = Field(None, alias="_id")  # MongoDB usa objeto _id
     hashed_password: str  # Contraseña hasheada
     is_active: bool = True
+    token_version: int = 0  # se incrementa al cambiar rol/estado
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = None
 
@@ -114,13 +115,57 @@ class UserResponse(UserBase):
     model_config = ConfigDict(populate_by_name=True)
 
 
+# Modelo para pedir varios usuarios por id en una sola petición
+class UserBatchGetRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=1000)
+
+
+# Respuesta del batch: usuarios en el orden pedido + ids que no existen
+class UserBatchGetResponse(BaseModel):
+    users: List[UserResponse]
+    missing: List[str] = []
+
+
+# Un cambio del change feed: alta/modificación (con el usuario) o baja
+class UserChange(BaseModel):
+    id: str
+    deleted: bool = False
+    user: Optional[UserResponse] = None
+
+
+# Página del change feed; `cursor` se envía como `since` en la siguiente llamada
+class UserChangesResponse(BaseModel):
+    changes: List[UserChange]
+    cursor: str
+    has_more: bool = False
+
+
+# Estadísticas materializadas de usuarios (por estado y por rol)
+class UserStats(BaseModel):
+    total: int
+    active: int
+    inactive: int
+    by_role: Dict[str, int]
+    updated_at: Optional[datetime] = None
+    reconciled_at: Optional[datetime] = None
+
+
 # Modelo para el TOKEN JWT que devolvemos al hacer login
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None  # para pedir un nuevo access token
+
+
+# Petición para renovar tokens (o para revocar el refresh token al cerrar sesión)
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 # Datos que guardamos DENTRO del token JWT
 class TokenData(BaseModel):
     user_id: Optional[str] = None  # Cambiado de email a user_id
     role: Optional[str] = None
+    token_version: int = 0
+    jti: Optional[str] = None  # identificador único del token (para revocarlo)
+    expires_at: Optional[datetime] = None
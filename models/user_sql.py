@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import Column, DateTime
+from sqlmodel import Field, SQLModel
+from repositories.base_repository_pg import live_unique_index
+
+
+# Usuario en Postgres (destino de la migración desde Mongo). El id es el
+# ObjectId de Mongo en hexadecimal, así la copia, el dual-write y la
+# verificación usan la misma clave. Las fechas son UTC sin zona, como en Mongo.
+class UserRow(SQLModel, table=True):
+    __tablename__ = "users"
+    __table_args__ = (
+        live_unique_index("users", "email"),
+        live_unique_index("users", "username"),
+    )
+
+    id: str = Field(primary_key=True, max_length=24)
+    email: str
+    username: str
+    full_name: str
+    role: str = "viewer"
+    hashed_password: str
+    is_active: bool = True
+    token_version: int = 0
+    created_at: datetime = Field(sa_column=Column(DateTime, nullable=False))
+    updated_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime))
+    deleted_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime, index=True)
+    )
+    change_seq: Optional[int] = Field(default=None, index=True)
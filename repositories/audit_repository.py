@@ -0,0 +1,92 @@
+from typing import List, Optional
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import DESCENDING
+from pymongo.errors import BulkWriteError
+from exceptions import DatabaseException
+
+AUDIT_COLLECTION = "audit_log"
+
+# Código de Mongo para clave duplicada
+_DUPLICATE_KEY = 11000
+
+
+class AuditRepository:
+    """
+    Repo del audit trail sobre Mongo. Solo inserta en lote y consulta;
+    los registros de auditoría no se modifican ni se borran.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        """
+        Índices para las consultas de auditoría (por fecha, usuario, actor y acción).
+        """
+        try:
+            await self.collection.create_index([("at", DESCENDING)])
+            await self.collection.create_index([("target_id", 1), ("at", DESCENDING)])
+            await self.collection.create_index([("actor_id", 1), ("at", DESCENDING)])
+            await self.collection.create_index([("action", 1), ("at", DESCENDING)])
+            print("✅ Índices de 'audit_log' OK")
+        except Exception as e:
+            raise DatabaseException(f"No se pudieron crear índices de audit_log: {e}")
+
+    async def insert_many(self, records: List[dict]) -> int:
+        """
+        Inserta un lote en una sola operación (sin orden, para no frenar en el
+        primer error). Los registros traen _id propio, así que reintentar un lote
+        ya escrito solo produce duplicados que se ignoran.
+        """
+        if not records:
+            return 0
+        try:
+            result = await self.collection.insert_many(records, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if all(err.get("code") == _DUPLICATE_KEY for err in errors):
+                return e.details.get("nInserted", 0)
+            raise DatabaseException(f"Error al escribir auditoría: {e}")
+        except Exception as e:
+            raise DatabaseException(f"Error al escribir auditoría: {e}")
+
+    async def query(
+        self,
+        target_id: Optional[str] = None,
+        actor_id: Optional[str] = None,
+        action: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> List[dict]:
+        """
+        Registros más recientes primero, filtrados por los campos indexados.
+        """
+        query: dict = {}
+        if target_id:
+            query["target_id"] = target_id
+        if actor_id:
+            query["actor_id"] = actor_id
+        if action:
+            query["action"] = action
+        if since or until:
+            query["at"] = {}
+            if since:
+                query["at"]["$gte"] = since
+            if until:
+                query["at"]["$lt"] = until
+
+        try:
+            cursor = (
+                self.collection.find(query).sort("at", DESCENDING).skip(skip).limit(limit)
+            )
+            items: List[dict] = []
+            async for doc in cursor:
+                doc["_id"] = str(doc["_id"])
+                items.append(doc)
+            return items
+        except Exception as e:
+            raise DatabaseException(f"Error al consultar auditoría: {e}")
@@ -1,11 +1,80 @@
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 from motor.motor_asyncio import AsyncIOMotorCollection
 from bson import ObjectId, errors
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import ReadPreference, ReturnDocument
+from pymongo.errors import BulkWriteError
+from core.config import settings
+from core.read_routing import read_your_writes
+from core.resilience import mongo_breaker, resilient
 from exceptions import NotFoundException, DatabaseException
 
+# Código de Mongo para clave duplicada
+_DUPLICATE_KEY = 11000
+
+# Colección con los contadores de secuencia (cursor del change feed)
+COUNTERS_COLLECTION = "counters"
+
+# Una reserva de change_seq sin liberar deja de frenar el change feed pasado
+# este tiempo (el proceso que la hizo murió a mitad de la escritura)
+SEQUENCE_LEASE = timedelta(seconds=30)
+
+# Lecturas sin decodificar (volcados)
+_RAW_BSON = CodecOptions(document_class=RawBSONDocument)
+
+# Caché de totales estimados por colección: full_name -> (total, expira_en)
+_count_cache: Dict[str, Tuple[int, float]] = {}
+
+# readPreference para listados y búsquedas (None = siempre el primario)
+_LIST_READ_PREFERENCES = {
+    "primary": None,
+    "primarypreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondarypreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+# Documentos vivos (soft delete). Se usa $type en vez de `None` porque es lo que
+# admiten los índices parciales; así las consultas pueden usar esos índices.
+LIVE_FILTER = {"deleted_at": {"$type": "null"}}
+
 
 class BaseRepositoryMD:
+    # Con soft delete las lecturas y updates del base solo ven documentos con
+    # deleted_at = null, y las bajas marcan deleted_at en lugar de borrar.
+    soft_delete: bool = False
+
+    # Breaker compartido por los repos de Mongo (ver core.resilience)
+    breaker = mongo_breaker
+
     def __init__(self, collection: AsyncIOMotorCollection):
         self.collection = collection
+        preference = _LIST_READ_PREFERENCES.get(
+            settings.MONGO_LIST_READ_PREFERENCE.lower()
+        )
+        self._replica = (
+            collection.with_options(read_preference=preference) if preference else None
+        )
+
+    def _reader(self) -> AsyncIOMotorCollection:
+        """
+        Colección para listados y búsquedas: con réplicas, salvo que el usuario
+        actual haya escrito hace poco (lectura de sus propias escrituras).
+        Las lecturas puntuales y las que preceden a una escritura usan el primario.
+        """
+        if self._replica is not None and read_your_writes.use_replica():
+            return self._replica
+        return self.collection
+
+    def _live(self, query: dict) -> dict:
+        """
+        Añade el filtro de documentos vivos si el repo usa soft delete.
+        """
+        return {**query, **LIVE_FILTER} if self.soft_delete else query
 
     async def _validate_id(self, id: str):
         if id.isdigit():
@@ -15,9 +84,10 @@ class BaseRepositoryMD:
         except errors.InvalidId:
             raise NotFoundException("ID inválido")
 
+    @resilient(retry=True)
     async def find_by_username(self, username: str) -> list[dict]:
         try:
-            cursor = self.collection.find({"username": username})
+            cursor = self._reader().find(self._live({"username": username}))
             results = []
             async for doc in cursor:
                 doc["_id"] = str(doc["_id"])
@@ -26,9 +96,10 @@ class BaseRepositoryMD:
         except Exception as e:
             raise DatabaseException(f"Error al buscar por username: {str(e)}")
 
+    @resilient(retry=True)
     async def find_all(self):
         try:
-            cursor = self.collection.find()
+            cursor = self._reader().find(self._live({}))
             documents = []
             async for document in cursor:
                 document["_id"] = str(document["_id"])
@@ -37,10 +108,110 @@ class BaseRepositoryMD:
         except Exception as e:
             raise DatabaseException(f"Error al obtener documentos: {str(e)}")
 
-    async def find_by_id(self, id: str):
+    async def iter_all(
+        self,
+        query: Optional[dict] = None,
+        projection: Optional[Dict[str, int]] = None,
+        batch_size: int = 500,
+        sort: Optional[List[Tuple[str, int]]] = None,
+        include_deleted: bool = False,
+    ) -> AsyncIterator[dict]:
+        """
+        Recorre los documentos (vivos) que cumplen `query` sin cargarlos todos:
+        el cursor trae lotes de `batch_size` y solo hay uno en memoria a la vez.
+        Para exportaciones, migraciones y otros recorridos grandes.
+        Con `include_deleted` también se recorren las bajas lógicas.
+
+        Uso:
+            async for doc in repo.iter_all(batch_size=1000):
+                ...
+
+        No se reintenta (no se puede repetir a mitad de recorrido): si el
+        cursor falla, se lanza DatabaseException.
+        """
+        query = query or {}
+        cursor = self._reader().find(
+            query if include_deleted else self._live(query), projection=projection
+        ).batch_size(batch_size)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            async for document in cursor:
+                document["_id"] = str(document["_id"])
+                yield document
+        except Exception as e:
+            raise DatabaseException(f"Error al recorrer documentos: {str(e)}")
+        finally:
+            await cursor.close()
+
+    async def iter_raw(self, batch_size: int = 1000) -> AsyncIterator[RawBSONDocument]:
+        """
+        Todos los documentos (incluidas las bajas lógicas) en orden de _id y sin
+        decodificar: cada RawBSONDocument trae los bytes tal como los devuelve
+        el servidor. Para volcados, donde decodificar y volver a codificar cada
+        documento sería el grueso del costo.
+
+        Como iter_all, no se reintenta.
+        """
+        cursor = (
+            self.collection.with_options(codec_options=_RAW_BSON)
+            .find({})
+            .sort("_id", 1)
+            .batch_size(batch_size)
+        )
+        try:
+            async for document in cursor:
+                yield document
+        except Exception as e:
+            raise DatabaseException(f"Error al recorrer documentos: {str(e)}")
+        finally:
+            await cursor.close()
+
+    @resilient()
+    async def insert_raw(self, documents: List[RawBSONDocument]) -> int:
+        """
+        Inserta un lote de documentos crudos (con su _id) sin orden. Los que ya
+        existen se ignoran, así repetir un lote de una restauración interrumpida
+        no falla. Devuelve cuántos se insertaron.
+        """
+        if not documents:
+            return 0
+        try:
+            result = await self.collection.insert_many(documents, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if all(err.get("code") == _DUPLICATE_KEY for err in errors):
+                return e.details.get("nInserted", 0)
+            raise DatabaseException(f"Error al insertar documentos: {e}")
+
+    async def sync_sequence(self) -> int:
+        """
+        Lleva la secuencia de cambios hasta el mayor change_seq de la colección
+        (tras restaurar documentos que ya lo traen, para que los cambios nuevos
+        no reutilicen valores). Usa el índice de change_seq; devuelve el valor.
+        """
+        try:
+            latest = await self.collection.find_one(
+                {"change_seq": {"$exists": True}},
+                projection={"change_seq": 1},
+                sort=[("change_seq", -1)],
+            )
+            seq = latest["change_seq"] if latest else 0
+            await self.collection.database[COUNTERS_COLLECTION].update_one(
+                {"_id": self.collection.name}, {"$max": {"seq": seq}}, upsert=True
+            )
+            return seq
+        except Exception as e:
+            raise DatabaseException(f"Error al actualizar la secuencia: {str(e)}")
+
+    @resilient(retry=True)
+    async def find_by_id(self, id: str, projection: Optional[Dict[str, int]] = None):
         try:
             obj_id = await self._validate_id(id)
-            document = await self.collection.find_one({"_id": obj_id})
+            document = await self.collection.find_one(
+                self._live({"_id": obj_id}), projection=projection
+            )
             if not document:
                 raise NotFoundException("Documento no encontrado")
             document["_id"] = str(document["_id"])
@@ -50,35 +221,251 @@ class BaseRepositoryMD:
         except Exception as e:
             raise DatabaseException(f"Error de base de datos: {str(e)}")
 
+    @resilient(retry=True)
+    async def find_by_ids(self, ids: List[str]) -> Tuple[List[dict], List[str]]:
+        """
+        Busca varios documentos en una sola consulta ($in).
+        Devuelve (documentos en el orden de entrada, ids no encontrados).
+        Los ids inválidos se reportan como no encontrados.
+        """
+        # Cada id se valida una sola vez (los repetidos se ignoran)
+        keys = {}
+        for id in ids:
+            if id in keys:
+                continue
+            try:
+                keys[id] = await self._validate_id(id)
+            except NotFoundException:
+                keys[id] = None
+
+        valid = [key for key in keys.values() if key is not None]
+        if not valid:
+            return [], list(keys)
+
+        try:
+            cursor = self._reader().find(self._live({"_id": {"$in": valid}}))
+            found = {}
+            async for document in cursor:
+                found[document["_id"]] = document
+        except Exception as e:
+            raise DatabaseException(f"Error al buscar por ids: {str(e)}")
+
+        documents: List[dict] = []
+        missing: List[str] = []
+        for id, key in keys.items():
+            document = found.get(key) if key is not None else None
+            if document is None:
+                missing.append(id)
+                continue
+            document["_id"] = str(document["_id"])
+            documents.append(document)
+        return documents, missing
+
+    @resilient(retry=True)
+    async def estimated_count(self) -> int:
+        """
+        Total aproximado de documentos (metadata de la colección, sin escanear).
+        Se cachea COUNT_CACHE_TTL_SECONDS para no consultarlo en cada listado.
+        """
+        key = self.collection.full_name
+        cached = _count_cache.get(key)
+        now = time.monotonic()
+        if cached and cached[1] > now:
+            return cached[0]
+        try:
+            total = await self.collection.estimated_document_count()
+        except Exception as e:
+            raise DatabaseException(f"Error al contar documentos: {str(e)}")
+        _count_cache[key] = (total, now + settings.COUNT_CACHE_TTL_SECONDS)
+        return total
+
+    @asynccontextmanager
+    async def _reserve_sequence(self) -> AsyncIterator[int]:
+        """
+        Reserva el siguiente change_seq de esta colección mientras dura la
+        escritura que lo usa.
+
+        Los valores se reparten antes de escribir, así que las escrituras pueden
+        confirmarse en otro orden. La reserva queda anotada en el contador
+        (`pending`) hasta que termina la escritura: current_sequence() no pasa
+        de la menor reserva en curso y el feed nunca deja atrás un cambio que
+        aún no se ve.
+        """
+        counters = self.collection.database[COUNTERS_COLLECTION]
+        counter = await counters.find_one_and_update(
+            {"_id": self.collection.name},
+            [
+                {"$set": {"seq": {"$add": [{"$ifNull": ["$seq", 0]}, 1]}}},
+                {
+                    "$set": {
+                        "pending": {
+                            "$concatArrays": [
+                                {"$ifNull": ["$pending", []]},
+                                [{"seq": "$seq", "at": datetime.utcnow()}],
+                            ]
+                        }
+                    }
+                },
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        seq = counter["seq"]
+        try:
+            yield seq
+        finally:
+            # Se aprovecha para limpiar reservas vencidas de procesos caídos
+            await counters.update_one(
+                {"_id": self.collection.name},
+                {
+                    "$pull": {
+                        "pending": {
+                            "$or": [
+                                {"seq": seq},
+                                {"at": {"$lt": datetime.utcnow() - SEQUENCE_LEASE}},
+                            ]
+                        }
+                    }
+                },
+            )
+
+    @staticmethod
+    def _committed_sequence(counter: Optional[dict]) -> int:
+        """
+        change_seq hasta el que todas las escrituras ya terminaron: el anterior
+        a la menor reserva vigente, o el último emitido si no hay ninguna.
+        """
+        if not counter:
+            return 0
+        cutoff = datetime.utcnow() - SEQUENCE_LEASE
+        pending = [p["seq"] for p in counter.get("pending") or () if p["at"] > cutoff]
+        return min(pending) - 1 if pending else counter.get("seq", 0)
+
+    @resilient(retry=True)
+    async def current_sequence(self) -> int:
+        """
+        Cursor seguro del change feed: todos los cambios con change_seq menor o
+        igual ya están escritos (0 si nunca hubo cambios).
+        """
+        try:
+            counter = await self.collection.database[COUNTERS_COLLECTION].find_one(
+                {"_id": self.collection.name}
+            )
+        except Exception as e:
+            raise DatabaseException(f"Error al leer la secuencia: {str(e)}")
+        return self._committed_sequence(counter)
+
+    @resilient(retry=True)
+    async def find_changed_since(
+        self, since: int, limit: int = 100, until: Optional[int] = None
+    ) -> List[dict]:
+        """
+        Documentos con change_seq > since (y <= until), en orden de cambio
+        (usa el índice change_seq).
+        """
+        seq_range = {"$gt": since}
+        if until is not None:
+            seq_range["$lte"] = until
+        try:
+            cursor = (
+                self.collection.find({"change_seq": seq_range})
+                .sort("change_seq", 1)
+                .limit(limit)
+            )
+            documents = []
+            async for document in cursor:
+                document["_id"] = str(document["_id"])
+                documents.append(document)
+            return documents
+        except Exception as e:
+            raise DatabaseException(f"Error al obtener cambios: {str(e)}")
+
+    @resilient()
     async def create(self, data: dict):
         try:
             result = await self.collection.insert_one(data)
+            read_your_writes.mark_write()
             return await self.find_by_id(str(result.inserted_id))
         except Exception as e:
             raise DatabaseException(f"Error al crear documento: {str(e)}")
 
+    @resilient()
     async def update(self, id: str, update_data: dict):
         try:
             obj_id = await self._validate_id(id)
             result = await self.collection.update_one(
-                {"_id": obj_id}, {"$set": update_data}
+                self._live({"_id": obj_id}), {"$set": update_data}
             )
             if result.matched_count == 0:
                 raise NotFoundException("Documento a actualizar no encontrado")
+            read_your_writes.mark_write()
             return await self.find_by_id(id)
         except NotFoundException:
             raise
         except Exception as e:
             raise DatabaseException(f"Error al actualizar: {str(e)}")
 
+    @resilient()
     async def delete(self, id: str):
         try:
             obj_id = await self._validate_id(id)
-            result = await self.collection.delete_one({"_id": obj_id})
-            if result.deleted_count == 0:
+            if self.soft_delete:
+                result = await self.collection.update_one(
+                    self._live({"_id": obj_id}),
+                    {"$set": {"deleted_at": datetime.utcnow()}},
+                )
+                found = result.matched_count
+            else:
+                result = await self.collection.delete_one({"_id": obj_id})
+                found = result.deleted_count
+            if found == 0:
                 raise NotFoundException("Documento a eliminar no encontrado")
+            read_your_writes.mark_write()
             return True
         except NotFoundException:
             raise
         except Exception as e:
-            raise DatabaseException(f"Error al eliminar: {str(e)}")
\ No newline at end of file
+            raise DatabaseException(f"Error al eliminar: {str(e)}")
+
+    @resilient()
+    async def purge_deleted(
+        self,
+        older_than: datetime,
+        archive: Optional[AsyncIOMotorCollection] = None,
+        batch_size: int = 500,
+        exclude_fields: Tuple[str, ...] = (),
+        on_batch: Optional[Callable[[int], Awaitable[None]]] = None,
+    ) -> int:
+        """
+        Elimina definitivamente los documentos dados de baja antes de `older_than`,
+        por lotes de `batch_size`. Si se indica `archive`, cada lote se copia ahí
+        antes de borrarlo (sin `exclude_fields`). Devuelve cuántos se purgaron.
+        `on_batch` recibe el total purgado tras cada lote (progreso de tareas).
+        """
+        query = {"deleted_at": {"$lt": older_than}}
+        hidden = {field: 0 for field in exclude_fields} or None
+        purged = 0
+        try:
+            while True:
+                batch = await self.collection.find(query, projection=hidden).limit(
+                    batch_size
+                ).to_list(batch_size)
+                if not batch:
+                    return purged
+                if archive is not None:
+                    try:
+                        await archive.insert_many(batch, ordered=False)
+                    except BulkWriteError as e:
+                        # Lote reintentado tras un fallo: lo ya archivado se ignora
+                        errors = e.details.get("writeErrors", [])
+                        if any(err.get("code") != _DUPLICATE_KEY for err in errors):
+                            raise
+                ids = [doc["_id"] for doc in batch]
+                result = await self.collection.delete_many({"_id": {"$in": ids}, **query})
+                purged += result.deleted_count
+                if on_batch is not None:
+                    await on_batch(purged)
+                if len(batch) < batch_size:
+                    return purged
+        except Exception as e:
+            raise DatabaseException(f"Error al purgar documentos eliminados: {str(e)}")
\ No newline at end of file
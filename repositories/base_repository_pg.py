@@ -1,38 +1,83 @@
-from typing import Type, TypeVar, Generic, Optional, List, Any, Dict
+import time
+from datetime import datetime
+from typing import AsyncIterator, Callable, Type, TypeVar, Generic, Optional, List, Any, Dict, Tuple
 from sqlmodel import SQLModel, select
+from sqlalchemy import Index, bindparam, delete, func, insert, text
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.sql import Executable
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 
+from core.config import settings
+from core.read_routing import read_your_writes
+from core.resilience import postgres_breaker, resilient
 from exceptions import NotFoundException, DatabaseException
+from repositories.change_feed import merge_changes
+from utils.metrics import register_metrics
 
 T = TypeVar("T", bound=SQLModel)
 
+# Caché de totales estimados por tabla: nombre -> (total, expira_en)
+_count_cache: Dict[str, Tuple[int, float]] = {}
 
-def _serialize_model(instance: SQLModel) -> Dict[str, Any]:
+# Sentencias prearmadas por modelo: (modelo, soft_delete, nombre) -> sentencia con
+# bindparams. Se construyen una vez; SQLAlchemy reutiliza su compilación (caché de
+# compilados del engine) y asyncpg el statement preparado de cada conexión.
+_statements: Dict[Tuple[type, bool, str], Executable] = {}
+_statement_stats = {"hits": 0, "misses": 0}
+register_metrics(
+    "sql_statements", lambda: {**_statement_stats, "prebuilt": len(_statements)}
+)
+
+
+def live_unique_index(table: str, column: str) -> Index:
     """
-    Serializa una instancia de SQLModel/Pydantic.
-    - Preferimos model_dump() (Pydantic v2).
-    - Si no existe, usamos dict() (compatibilidad v1).
-    - Si ninguna existe, usamos vars() como último recurso.
+    Índice único parcial (WHERE deleted_at IS NULL) para modelos con soft delete:
+    el valor solo tiene que ser único entre las filas vivas.
+
+    Uso:
+        __table_args__ = (live_unique_index("users", "email"),)
     """
-    if instance is None:
-        return {}
-    if hasattr(instance, "model_dump"):
-        # pydantic v2 / SQLModel más reciente
-        try:
-            return instance.model_dump()  # type: ignore[attr-defined]
-        except Exception:
-            # fallback robusto
-            pass
-    if hasattr(instance, "dict"):
+    return Index(
+        f"uq_{table}_{column}_live",
+        column,
+        unique=True,
+        postgresql_where=text("deleted_at IS NULL"),
+    )
+
+
+class ModelSerializer:
+    """
+    Serializador de un modelo, armado una vez a partir de sus columnas mapeadas.
+    Copia los valores ya cargados del __dict__ de la instancia en vez de pasar
+    por model_dump() en cada fila. `columns` sirve para las lecturas que no
+    necesitan instancias del ORM: un SELECT de esas columnas devuelve filas que
+    ya son el dict final.
+    """
+
+    def __init__(self, model: Type[SQLModel]):
+        self.keys: Tuple[str, ...] = tuple(
+            prop.key for prop in sa_inspect(model).column_attrs
+        )
+        self.columns = tuple(getattr(model, key) for key in self.keys)
+
+    def __call__(self, instance: SQLModel) -> Dict[str, Any]:
+        loaded = instance.__dict__
         try:
-            return instance.dict()
-        except Exception:
-            pass
-    try:
-        return dict(vars(instance))
-    except Exception:
-        return {}
+            return {key: loaded[key] for key in self.keys}
+        except KeyError:
+            # Atributo expirado o sin cargar: se lee por el descriptor del ORM
+            return {key: getattr(instance, key) for key in self.keys}
+
+
+_serializers: Dict[type, ModelSerializer] = {}
+
+
+def serializer_for(model: Type[SQLModel]) -> ModelSerializer:
+    serializer = _serializers.get(model)
+    if serializer is None:
+        serializer = _serializers[model] = ModelSerializer(model)
+    return serializer
 
 
 class BaseRepositoryPG(Generic[T]):
@@ -41,9 +86,99 @@ class BaseRepositoryPG(Generic[T]):
     Mantiene API similar a la versión Mongo: find_all, find_by_id, create, update, delete, etc.
     """
 
-    def __init__(self, model: Type[T], session: AsyncSession):
+    # Change feed (opcional). Si el modelo tiene columna `change_seq`, cada alta o
+    # modificación toma el siguiente valor de esta secuencia de Postgres, y las bajas
+    # se registran en `tombstone_model` (columnas id, change_seq, deleted_at).
+    change_seq_sequence: Optional[str] = None
+    tombstone_model: Optional[Type[SQLModel]] = None
+
+    # Soft delete (opcional). Requiere columna `deleted_at`: las lecturas y updates
+    # solo ven filas con deleted_at IS NULL y delete() la marca en vez de borrar.
+    soft_delete: bool = False
+
+    # Breaker compartido por los repos de Postgres (ver core.resilience)
+    breaker = postgres_breaker
+
+    def __init__(
+        self,
+        model: Type[T],
+        session: AsyncSession,
+        read_session: Optional[AsyncSession] = None,
+    ):
         self.model = model
         self.session = session
+        self._serialize = serializer_for(model)
+        # Sesión contra la réplica para listados y búsquedas (opcional)
+        self.read_session = read_session
+
+    def _reader(self) -> AsyncSession:
+        """
+        Sesión para listados y búsquedas: la réplica, salvo que el usuario actual
+        haya escrito hace poco (lectura de sus propias escrituras).
+        """
+        if self.read_session is not None and read_your_writes.use_replica():
+            return self.read_session
+        return self.session
+
+    async def _recover(self):
+        """
+        Antes de reintentar una lectura: descarta la transacción de la conexión
+        perdida para que la sesión pida una nueva al pool.
+        """
+        for session in (self.session, self.read_session):
+            if session is None:
+                continue
+            try:
+                await session.rollback()
+            except Exception:
+                pass
+
+    async def _stamp_change(self, instance: SQLModel):
+        """
+        Asigna el siguiente change_seq (se evalúa en el INSERT/UPDATE).
+
+        Antes toma un advisory lock de transacción por secuencia: las escrituras
+        que avanzan el change feed se confirman de una en una, así el orden de
+        change_seq es el de commit y el feed no salta cambios aún no visibles.
+        """
+        if self.change_seq_sequence:
+            await self.session.execute(
+                select(func.pg_advisory_xact_lock(func.hashtext(self.change_seq_sequence)))
+            )
+            instance.change_seq = func.nextval(self.change_seq_sequence)
+
+    def _statement(self, name: str, build: Callable[[], Executable]) -> Executable:
+        """
+        Sentencia `name` de este modelo, construida con `build` la primera vez.
+        Los valores van como bindparams y se pasan al ejecutarla.
+        """
+        key = (self.model, self.soft_delete, name)
+        stmt = _statements.get(key)
+        if stmt is None:
+            _statement_stats["misses"] += 1
+            stmt = _statements[key] = build()
+        else:
+            _statement_stats["hits"] += 1
+        return stmt
+
+    def _rows(self):
+        """
+        SELECT de las columnas del modelo (sin instancias del ORM ni identity map)
+        para lecturas que solo devuelven dicts.
+        """
+        return self._live(select(*self._serialize.columns))
+
+    def _by_id(self) -> Executable:
+        return self._statement(
+            "by_id",
+            lambda: self._live(select(self.model).where(self.model.id == bindparam("pk"))),
+        )
+
+    def _live(self, q):
+        """
+        Añade el filtro de filas vivas si el repo usa soft delete.
+        """
+        return q.where(self.model.deleted_at.is_(None)) if self.soft_delete else q
 
     async def _validate_id(self, id: str) -> int:
         """
@@ -55,6 +190,7 @@ class BaseRepositoryPG(Generic[T]):
         except (ValueError, TypeError):
             raise NotFoundException("ID inválido")
 
+    @resilient(retry=True)
     async def find_by_username(self, username: str) -> List[dict]:
         """
         Busca por el campo 'username' (asume que el modelo tiene el atributo).
@@ -64,52 +200,223 @@ class BaseRepositoryPG(Generic[T]):
             raise DatabaseException("El modelo no tiene atributo 'username'")
 
         try:
-            q = select(self.model).where(self.model.username == username)
-            result = await self.session.execute(q)
-            items = result.scalars().all()
-            return [_serialize_model(item) for item in items]
+            q = self._statement(
+                "rows_by_username",
+                lambda: self._rows().where(self.model.username == bindparam("username")),
+            )
+            result = await self._reader().execute(q, {"username": username})
+            return [dict(row) for row in result.mappings()]
         except SQLAlchemyError as e:
             raise DatabaseException(f"Error al buscar por username: {str(e)}")
 
-    async def find_all(self) -> List[dict]:
+    def _columns(self, fields: List[str]) -> list:
+        """
+        Columnas del modelo para un SELECT parcial; valida que existan.
+        """
+        unknown = [f for f in fields if f not in self.model.__table__.columns]
+        if unknown:
+            raise DatabaseException(f"Columnas desconocidas: {', '.join(unknown)}")
+        return [self.model.__table__.columns[f] for f in fields]
+
+    @resilient(retry=True)
+    async def find_all(self, fields: Optional[List[str]] = None) -> List[dict]:
         """
         Devuelve todos los registros de la tabla como lista de dicts.
+        Con `fields` solo se seleccionan esas columnas.
         """
         try:
-            q = select(self.model)
-            result = await self.session.execute(q)
-            items = result.scalars().all()
-            return [_serialize_model(item) for item in items]
+            if fields:
+                q = self._live(select(*self._columns(fields)))
+                result = await self._reader().execute(q)
+                return [dict(row) for row in result.mappings()]
+            result = await self._reader().execute(self._statement("rows", self._rows))
+            return [dict(row) for row in result.mappings()]
         except SQLAlchemyError as e:
             raise DatabaseException(f"Error al obtener documentos: {str(e)}")
 
-    async def find_by_id(self, id: str) -> dict:
+    async def iter_all(
+        self, fields: Optional[List[str]] = None, batch_size: int = 1000
+    ) -> AsyncIterator[dict]:
+        """
+        Recorre la tabla con un cursor del servidor (session.stream + yield_per):
+        asyncpg trae `batch_size` filas por vez y solo ese lote está en memoria.
+        Para exportaciones, migraciones y otros recorridos grandes.
+
+        Uso:
+            async for row in repo.iter_all(batch_size=5000):
+                ...
+
+        No se reintenta (no se puede repetir a mitad de recorrido): si el
+        cursor falla, se lanza DatabaseException.
+        """
+        q = self._live(select(*self._columns(fields))) if fields else self._statement(
+            "rows", self._rows
+        )
+        try:
+            result = await self._reader().stream(
+                q.execution_options(yield_per=batch_size)
+            )
+            try:
+                async for row in result.mappings():
+                    yield dict(row)
+            finally:
+                await result.close()
+        except SQLAlchemyError as e:
+            raise DatabaseException(f"Error al recorrer registros: {str(e)}")
+
+    @resilient(retry=True)
+    async def find_by_id(self, id: str, fields: Optional[List[str]] = None) -> dict:
         """
         Busca por id (primary key). Devuelve dict del registro o lanza NotFoundException.
+        Con `fields` solo se seleccionan esas columnas.
         """
         try:
             pk = await self._validate_id(id)
-            q = select(self.model).where(self.model.id == pk)
-            result = await self.session.execute(q)
+            if fields:
+                q = self._live(select(*self._columns(fields)).where(self.model.id == pk))
+                row = (await self.session.execute(q)).mappings().first()
+                if not row:
+                    raise NotFoundException("Registro no encontrado")
+                return dict(row)
+            result = await self.session.execute(self._by_id(), {"pk": pk})
             item = result.scalars().first()
             if not item:
                 raise NotFoundException("Registro no encontrado")
-            return _serialize_model(item)
+            return self._serialize(item)
         except NotFoundException:
             raise
         except SQLAlchemyError as e:
             raise DatabaseException(f"Error de base de datos: {str(e)}")
 
+    @resilient(retry=True)
+    async def find_by_ids(self, ids: List[str]) -> Tuple[List[dict], List[str]]:
+        """
+        Busca varios registros por id en una sola consulta (WHERE id IN (...)).
+        Devuelve (registros en el orden de entrada, ids no encontrados).
+        """
+        # Cada id se valida una sola vez (los repetidos se ignoran)
+        keys: Dict[str, Optional[int]] = {}
+        for id in ids:
+            if id in keys:
+                continue
+            try:
+                keys[id] = await self._validate_id(id)
+            except NotFoundException:
+                keys[id] = None
+
+        valid = [key for key in keys.values() if key is not None]
+        if not valid:
+            return [], list(keys)
+
+        try:
+            q = self._statement(
+                "rows_by_ids",
+                lambda: self._rows().where(
+                    self.model.id.in_(bindparam("ids", expanding=True))
+                ),
+            )
+            result = await self._reader().execute(q, {"ids": valid})
+            found = {row["id"]: dict(row) for row in result.mappings()}
+        except SQLAlchemyError as e:
+            raise DatabaseException(f"Error al buscar por ids: {str(e)}")
+
+        items: List[dict] = []
+        missing: List[str] = []
+        for id, pk in keys.items():
+            item = found.get(pk) if pk is not None else None
+            if item is None:
+                missing.append(id)
+                continue
+            items.append(item)
+        return items, missing
+
+    @resilient(retry=True)
+    async def estimated_count(self) -> int:
+        """
+        Total aproximado de filas usando las estadísticas del planner (pg_class.reltuples).
+        Si la tabla nunca fue analizada, cae a un COUNT(*) exacto.
+        Se cachea COUNT_CACHE_TTL_SECONDS.
+        """
+        table = self.model.__tablename__
+        cached = _count_cache.get(table)
+        now = time.monotonic()
+        if cached and cached[1] > now:
+            return cached[0]
+        try:
+            result = await self.session.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:t)"),
+                {"t": table},
+            )
+            total = result.scalar()
+            if total is None or total < 0:
+                result = await self.session.execute(
+                    select(func.count()).select_from(self.model)
+                )
+                total = result.scalar_one()
+        except SQLAlchemyError as e:
+            raise DatabaseException(f"Error al contar registros: {str(e)}")
+        _count_cache[table] = (int(total), now + settings.COUNT_CACHE_TTL_SECONDS)
+        return int(total)
+
+    @resilient(retry=True)
+    async def find_changed_since(
+        self, since: int, limit: int = 100
+    ) -> Tuple[List[dict], bool]:
+        """
+        Registros con change_seq > since (y bajas si hay tombstone_model), en orden
+        de cambio. Las bajas se devuelven como {"id", "change_seq", "deleted": True}.
+        Devuelve (cambios, hay_más).
+        """
+        if not hasattr(self.model, "change_seq"):
+            raise DatabaseException("El modelo no tiene atributo 'change_seq'")
+
+        try:
+            q = (
+                select(self.model)
+                .where(self.model.change_seq > since)
+                .order_by(self.model.change_seq)
+                .limit(limit)
+            )
+            result = await self.session.execute(q)
+            changed = [
+                {"id": item.id, "change_seq": item.change_seq, "deleted": True}
+                if getattr(item, "deleted_at", None) is not None
+                else self._serialize(item)
+                for item in result.scalars().all()
+            ]
+
+            deleted: List[dict] = []
+            if self.tombstone_model is not None:
+                tm = self.tombstone_model
+                q = (
+                    select(tm.id, tm.change_seq)
+                    .where(tm.change_seq > since)
+                    .order_by(tm.change_seq)
+                    .limit(limit)
+                )
+                result = await self.session.execute(q)
+                deleted = [
+                    {"id": row.id, "change_seq": row.change_seq, "deleted": True}
+                    for row in result
+                ]
+        except SQLAlchemyError as e:
+            raise DatabaseException(f"Error al obtener cambios: {str(e)}")
+
+        return merge_changes(changed, deleted, limit)
+
+    @resilient()
     async def create(self, data: dict) -> dict:
         """
         Crea un registro a partir de un dict y devuelve el objeto creado como dict.
         """
         try:
             instance: T = self.model(**data)
+            await self._stamp_change(instance)
             self.session.add(instance)
             await self.session.commit()
+            read_your_writes.mark_write()
             await self.session.refresh(instance)
-            return _serialize_model(instance)
+            return self._serialize(instance)
         except SQLAlchemyError as e:
             try:
                 await self.session.rollback()
@@ -117,14 +424,14 @@ class BaseRepositoryPG(Generic[T]):
                 pass
             raise DatabaseException(f"Error al crear registro: {str(e)}")
 
+    @resilient()
     async def update(self, id: str, update_data: dict) -> dict:
         """
         Actualiza un registro por id con los campos en update_data y devuelve el registro actualizado.
         """
         try:
             pk = await self._validate_id(id)
-            q = select(self.model).where(self.model.id == pk)
-            result = await self.session.execute(q)
+            result = await self.session.execute(self._by_id(), {"pk": pk})
             instance: Optional[T] = result.scalars().first()
             if not instance:
                 raise NotFoundException("Registro a actualizar no encontrado")
@@ -134,10 +441,12 @@ class BaseRepositoryPG(Generic[T]):
                 if hasattr(instance, k):
                     setattr(instance, k, v)
 
+            await self._stamp_change(instance)
             self.session.add(instance)
             await self.session.commit()
+            read_your_writes.mark_write()
             await self.session.refresh(instance)
-            return _serialize_model(instance)
+            return self._serialize(instance)
         except NotFoundException:
             raise
         except SQLAlchemyError as e:
@@ -147,21 +456,32 @@ class BaseRepositoryPG(Generic[T]):
                 pass
             raise DatabaseException(f"Error al actualizar: {str(e)}")
 
+    @resilient()
     async def delete(self, id: str) -> bool:
         """
         Elimina un registro por id. Devuelve True si fue eliminado, lanza NotFoundException si no existe.
+        Con soft_delete solo marca deleted_at (la fila queda para el change feed y la purga).
         """
         try:
             pk = await self._validate_id(id)
-            q = select(self.model).where(self.model.id == pk)
-            result = await self.session.execute(q)
+            result = await self.session.execute(self._by_id(), {"pk": pk})
             instance: Optional[T] = result.scalars().first()
             if not instance:
                 raise NotFoundException("Registro a eliminar no encontrado")
 
-            # delete no es awaitable
-            self.session.delete(instance)
+            if self.soft_delete:
+                instance.deleted_at = datetime.utcnow()
+                await self._stamp_change(instance)
+                self.session.add(instance)
+            else:
+                # delete es awaitable en AsyncSession
+                await self.session.delete(instance)
+                if self.tombstone_model is not None:
+                    tombstone = self.tombstone_model(id=pk, deleted_at=datetime.utcnow())
+                    await self._stamp_change(tombstone)
+                    self.session.add(tombstone)
             await self.session.commit()
+            read_your_writes.mark_write()
             return True
         except NotFoundException:
             raise
@@ -171,3 +491,54 @@ class BaseRepositoryPG(Generic[T]):
             except Exception:
                 pass
             raise DatabaseException(f"Error al eliminar: {str(e)}")
+
+    @resilient()
+    async def purge_deleted(
+        self,
+        older_than: datetime,
+        archive_model: Optional[Type[SQLModel]] = None,
+        batch_size: int = 500,
+    ) -> int:
+        """
+        Borra definitivamente las filas dadas de baja antes de `older_than`, por lotes
+        de `batch_size` (una transacción por lote). Si se indica `archive_model`, cada
+        lote se copia antes con INSERT ... SELECT (solo las columnas que tenga el
+        modelo de archivo). Devuelve cuántas filas se purgaron.
+        """
+        columns = None
+        if archive_model is not None:
+            columns = [
+                c.name
+                for c in archive_model.__table__.columns
+                if c.name in self.model.__table__.columns
+            ]
+
+        purged = 0
+        try:
+            while True:
+                q = (
+                    select(self.model.id)
+                    .where(self.model.deleted_at < older_than)
+                    .limit(batch_size)
+                )
+                ids = list((await self.session.execute(q)).scalars().all())
+                if not ids:
+                    return purged
+                if columns:
+                    source = select(
+                        *[self.model.__table__.columns[c] for c in columns]
+                    ).where(self.model.id.in_(ids))
+                    await self.session.execute(
+                        insert(archive_model).from_select(columns, source)
+                    )
+                await self.session.execute(delete(self.model).where(self.model.id.in_(ids)))
+                await self.session.commit()
+                purged += len(ids)
+                if len(ids) < batch_size:
+                    return purged
+        except SQLAlchemyError as e:
+            try:
+                await self.session.rollback()
+            except Exception:
+                pass
+            raise DatabaseException(f"Error al purgar registros eliminados: {str(e)}")
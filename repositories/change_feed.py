@@ -0,0 +1,24 @@
+from typing import List, Optional, Tuple
+
+
+def merge_changes(
+    changed: List[dict], deleted: List[dict], limit: int
+) -> Tuple[List[dict], bool]:
+    """
+    Une altas/modificaciones y bajas (cada lista ordenada por change_seq y
+    limitada a `limit`) en una sola página. Devuelve (cambios, hay_más).
+
+    Si una de las dos fuentes llegó al límite, solo es seguro avanzar hasta su
+    último change_seq: más allá podría faltar algún cambio de esa fuente.
+    """
+    horizon: Optional[int] = None
+    for source in (changed, deleted):
+        if len(source) == limit:
+            last = source[-1]["change_seq"]
+            horizon = last if horizon is None else min(horizon, last)
+
+    merged = sorted(changed + deleted, key=lambda doc: doc["change_seq"])
+    if horizon is not None:
+        merged = [doc for doc in merged if doc["change_seq"] <= horizon]
+    has_more = horizon is not None or len(merged) > limit
+    return merged[:limit], has_more
@@ -0,0 +1,213 @@
+from typing import List, Optional
+from datetime import datetime, timedelta
+from bson import ObjectId, errors
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from core.config import settings
+from exceptions import ConflictException, DatabaseException
+from models.job import JobStatus
+
+JOBS_COLLECTION = "jobs"
+
+
+def _public(doc: Optional[dict]) -> Optional[dict]:
+    if doc is None:
+        return None
+    doc["_id"] = str(doc["_id"])
+    return doc
+
+
+def _object_id(job_id: str) -> Optional[ObjectId]:
+    try:
+        return ObjectId(job_id)
+    except (errors.InvalidId, TypeError):
+        return None
+
+
+class JobRepository:
+    """
+    Repo de tareas en segundo plano sobre Mongo (colección `jobs`).
+
+    Las tareas se reparten entre procesos con claim (find_one_and_update
+    atómico). Las de un tipo exclusivo llevan `active_key` mientras están
+    encoladas o en curso; un índice único sparse impide que haya dos activas.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        try:
+            await self.collection.create_index([("status", 1), ("created_at", 1)])
+            await self.collection.create_index([("created_by", 1), ("created_at", DESCENDING)])
+            await self.collection.create_index("active_key", unique=True, sparse=True)
+            await self.collection.create_index(
+                "finished_at", expireAfterSeconds=settings.JOB_RETENTION_DAYS * 86400
+            )
+            print("✅ Índices de 'jobs' OK")
+        except Exception as e:
+            raise DatabaseException(f"No se pudieron crear índices de jobs: {e}")
+
+    async def create(self, job: dict) -> dict:
+        try:
+            await self.collection.insert_one(job)
+        except DuplicateKeyError:
+            raise ConflictException("Ya hay una tarea de este tipo encolada o en curso")
+        except Exception as e:
+            raise DatabaseException(f"Error al crear la tarea: {e}")
+        return _public(job)
+
+    async def get(self, job_id: str, tenant: Optional[str] = None) -> Optional[dict]:
+        oid = _object_id(job_id)
+        if oid is None:
+            return None
+        try:
+            return _public(await self.collection.find_one({"_id": oid, "tenant": tenant}))
+        except Exception as e:
+            raise DatabaseException(f"Error al obtener la tarea: {e}")
+
+    async def list(
+        self,
+        tenant: Optional[str] = None,
+        created_by: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[dict]:
+        query: dict = {"tenant": tenant}
+        if created_by:
+            query["created_by"] = created_by
+        if status:
+            query["status"] = status
+        try:
+            cursor = self.collection.find(query).sort("created_at", DESCENDING).limit(limit)
+            return [_public(doc) async for doc in cursor]
+        except Exception as e:
+            raise DatabaseException(f"Error al listar tareas: {e}")
+
+    async def count_queued(self) -> int:
+        try:
+            return await self.collection.count_documents({"status": JobStatus.QUEUED.value})
+        except Exception as e:
+            raise DatabaseException(f"Error al contar tareas: {e}")
+
+    async def claim(self, worker: str) -> Optional[dict]:
+        """
+        Toma la tarea encolada más antigua y la marca en curso para `worker`.
+        """
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"status": JobStatus.QUEUED.value},
+            {
+                "$set": {
+                    "status": JobStatus.RUNNING.value,
+                    "worker": worker,
+                    "started_at": now,
+                    "heartbeat_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def save_progress(
+        self, job_id, progress: dict, checkpoint: Optional[dict] = None
+    ) -> bool:
+        """
+        Guarda el progreso (y el checkpoint, si lo hay). Devuelve True si se
+        pidió cancelar la tarea, también desde otro proceso.
+        """
+        update = {"progress": progress, "heartbeat_at": datetime.utcnow()}
+        if checkpoint is not None:
+            update["checkpoint"] = checkpoint
+        doc = await self.collection.find_one_and_update(
+            {"_id": job_id},
+            {"$set": update},
+            projection={"cancel_requested": 1},
+        )
+        return bool(doc and doc.get("cancel_requested"))
+
+    async def finish(
+        self,
+        job_id,
+        status: JobStatus,
+        progress: dict,
+        result: Optional[dict] = None,
+        error: Optional[str] = None,
+    ):
+        await self.collection.update_one(
+            {"_id": job_id},
+            {
+                "$set": {
+                    "status": status.value,
+                    "progress": progress,
+                    "result": result,
+                    "error": error,
+                    "finished_at": datetime.utcnow(),
+                },
+                "$unset": {"active_key": "", "worker": ""},
+            },
+        )
+
+    async def requeue(self, job_id, progress: dict, checkpoint: Optional[dict] = None):
+        """
+        Devuelve a la cola una tarea interrumpida (cierre del proceso); se
+        reanuda desde su último checkpoint.
+        """
+        update = {"status": JobStatus.QUEUED.value, "progress": progress}
+        if checkpoint is not None:
+            update["checkpoint"] = checkpoint
+        await self.collection.update_one(
+            {"_id": job_id}, {"$set": update, "$unset": {"worker": ""}}
+        )
+
+    async def request_cancel(self, job_id: str, tenant: Optional[str] = None) -> Optional[dict]:
+        """
+        Una tarea encolada se cancela al momento; una en curso queda marcada y
+        se detiene en su siguiente reporte de progreso.
+        """
+        oid = _object_id(job_id)
+        if oid is None:
+            return None
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": oid, "tenant": tenant, "status": JobStatus.QUEUED.value},
+                {
+                    "$set": {
+                        "status": JobStatus.CANCELLED.value,
+                        "cancel_requested": True,
+                        "finished_at": datetime.utcnow(),
+                    },
+                    "$unset": {"active_key": ""},
+                },
+                return_document=ReturnDocument.AFTER,
+            )
+            if doc is None:
+                doc = await self.collection.find_one_and_update(
+                    {"_id": oid, "tenant": tenant, "status": JobStatus.RUNNING.value},
+                    {"$set": {"cancel_requested": True}},
+                    return_document=ReturnDocument.AFTER,
+                )
+            if doc is None:
+                doc = await self.collection.find_one({"_id": oid, "tenant": tenant})
+            return _public(doc)
+        except Exception as e:
+            raise DatabaseException(f"Error al cancelar la tarea: {e}")
+
+    async def heartbeat(self, job_ids: List) -> None:
+        if job_ids:
+            await self.collection.update_many(
+                {"_id": {"$in": job_ids}}, {"$set": {"heartbeat_at": datetime.utcnow()}}
+            )
+
+    async def requeue_stale(self, stale_seconds: float) -> int:
+        """
+        Reencola las tareas en curso sin latido reciente (su proceso murió).
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+        result = await self.collection.update_many(
+            {"status": JobStatus.RUNNING.value, "heartbeat_at": {"$lt": cutoff}},
+            {"$set": {"status": JobStatus.QUEUED.value}, "$unset": {"worker": ""}},
+        )
+        return result.modified_count
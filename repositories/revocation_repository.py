@@ -0,0 +1,49 @@
+from typing import List
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorCollection
+from exceptions import DatabaseException
+
+REVOKED_TOKENS_COLLECTION = "revoked_tokens"
+
+
+class RevocationRepository:
+    """
+    Tokens revocados (logout, rotación de refresh tokens). Cada registro se
+    expira por TTL cuando el propio token expira: a partir de ahí ya no hace
+    falta recordarlo.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        try:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+            print("✅ Índices de 'revoked_tokens' OK")
+        except Exception as e:
+            raise DatabaseException(f"No se pudieron crear índices de revoked_tokens: {e}")
+
+    async def revoke(self, jti: str, user_id: str, expires_at: datetime):
+        try:
+            await self.collection.update_one(
+                {"_id": jti},
+                {
+                    "$set": {"user_id": user_id, "expires_at": expires_at},
+                    "$setOnInsert": {"revoked_at": datetime.utcnow()},
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            raise DatabaseException(f"Error al revocar token: {e}")
+
+    async def list_active(self) -> List[str]:
+        """
+        jti de las revocaciones cuyo token aún no expiró (solo se proyecta _id).
+        """
+        try:
+            cursor = self.collection.find(
+                {"expires_at": {"$gt": datetime.utcnow()}}, projection={"_id": 1}
+            )
+            return [doc["_id"] async for doc in cursor]
+        except Exception as e:
+            raise DatabaseException(f"Error al leer tokens revocados: {e}")
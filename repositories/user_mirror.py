@@ -0,0 +1,58 @@
+from typing import Callable, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from motor.motor_asyncio import AsyncIOMotorCollection
+from repositories.user_repository_pg import UserRepositoryPG
+from utils.metrics import register_metrics
+
+
+class UserMirror:
+    """
+    Dual-write de usuarios a Postgres durante la migración desde Mongo.
+
+    Mongo sigue siendo la fuente de verdad: después de cada escritura de
+    UserRepository se relee el documento del primario (incluidas las bajas
+    lógicas) y se hace upsert de la fila en Postgres. Releer en vez de copiar
+    el update hace que el espejo siempre refleje el estado final del
+    documento, y el change_seq evita que una escritura que llega tarde pise
+    otra más nueva.
+
+    Un fallo del espejo no falla la petición: se cuenta y se registra, y
+    `python -m cli.migrate_users catchup` lo corrige desde el change feed.
+    """
+
+    def __init__(self):
+        self.session_factory: Optional[Callable[[], AsyncSession]] = None
+        self.stats = {"mirrored": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.session_factory is not None
+
+    def start(self, session_factory: Callable[[], AsyncSession]):
+        self.session_factory = session_factory
+        print("🔁 Dual-write de usuarios a Postgres activado")
+
+    def stop(self):
+        self.session_factory = None
+
+    async def mirror(self, collection: AsyncIOMotorCollection, _id) -> None:
+        if self.session_factory is None:
+            return
+        try:
+            doc = await collection.find_one({"_id": _id})
+            if doc is None:
+                return
+            async with self.session_factory() as session:
+                await UserRepositoryPG(session).upsert_many([doc])
+            self.stats["mirrored"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"⚠️ Dual-write: no se pudo copiar el usuario {_id} a Postgres: {e}")
+
+    def metrics(self) -> dict:
+        return {**self.stats, "enabled": self.enabled}
+
+
+# Espejo del proceso (se activa en el lifespan con USER_DUAL_WRITE)
+user_mirror = UserMirror()
+register_metrics("user_mirror", user_mirror.metrics)
@@ -1,19 +1,61 @@
-from typing import Optional, List
-from datetime import datetime
+from typing import Awaitable, Callable, Optional, List, Sequence, Tuple
+from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorCollection
-from repositories.base_repository_md import BaseRepositoryMD
+from repositories.base_repository_md import BaseRepositoryMD, LIVE_FILTER
+from repositories.change_feed import merge_changes
+from repositories.user_mirror import user_mirror
+from repositories.user_stats_repository import (
+    UserStatsRepository,
+    USER_STATS_COLLECTION,
+)
 from pymongo.errors import DuplicateKeyError
-from exceptions import ConflictException, DatabaseException
+from core.config import settings
+from core.read_routing import read_your_writes
+from core.resilience import resilient
+from exceptions import ConflictException, DatabaseException, NotFoundException
+from utils.metrics import register_metrics
+from utils.single_flight import SingleFlight
+from utils.fieldsets import projection
+
+# Campos que afectan a las estadísticas materializadas
+_STATS_FIELDS = {"role": 1, "is_active": 1}
+
+# Bajas de usuarios para el change feed anteriores al soft delete (se expiran por TTL)
+USER_TOMBSTONES_COLLECTION = "user_tombstones"
+
+# Usuarios purgados tras el periodo de retención (trazabilidad LIMS)
+USERS_ARCHIVE_COLLECTION = "users_archive"
+
+# Proyección mínima para validadores HTTP (ETag / Last-Modified)
+_VERSION_FIELDS = {"updated_at": 1, "created_at": 1}
+
+# Lecturas concurrentes idénticas (get_by_id, list) comparten una sola consulta
+user_reads = SingleFlight("user_reads")
+register_metrics("single_flight.user_reads", user_reads.stats)
 
 
 class UserRepository(BaseRepositoryMD):
     """
     Repo de usuarios sobre Mongo. Devuelve dicts JSON-friendly.
     El service se encarga del hash y de mapear a modelos Pydantic.
+
+    Las bajas son lógicas (deleted_at); email y username solo son únicos entre
+    usuarios vivos gracias a índices parciales.
     """
 
-    def __init__(self, collection: AsyncIOMotorCollection):
+    soft_delete = True
+
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        stats_repo: Optional[UserStatsRepository] = None,
+    ):
         super().__init__(collection)
+        self.stats = stats_repo or UserStatsRepository(
+            collection.database[USER_STATS_COLLECTION]
+        )
+        self.tombstones = collection.database[USER_TOMBSTONES_COLLECTION]
+        self.archive = collection.database[USERS_ARCHIVE_COLLECTION]
 
     async def ensure_indexes(self):
         """
@@ -21,19 +63,55 @@ class UserRepository(BaseRepositoryMD):
         Debe llamarse al iniciar la aplicación.
         """
         try:
-            await self.collection.create_index("email", unique=True)
-            await self.collection.create_index("username", unique=True)
-            print("✅ Índices de 'users' OK (email y username únicos)")
+            # Documentos anteriores al soft delete: deleted_at explícito para que
+            # entren en los índices parciales
+            await self.collection.update_many(
+                {"deleted_at": {"$exists": False}}, {"$set": {"deleted_at": None}}
+            )
+            # Unicidad solo entre usuarios vivos (reemplaza los índices únicos completos)
+            existing = await self.collection.index_information()
+            for field in ("email", "username"):
+                legacy = existing.get(f"{field}_1")
+                if legacy and "partialFilterExpression" not in legacy:
+                    await self.collection.drop_index(f"{field}_1")
+                await self.collection.create_index(
+                    field, unique=True, partialFilterExpression=LIVE_FILTER
+                )
+            # Purga de bajas antiguas
+            await self.collection.create_index(
+                "deleted_at", partialFilterExpression={"deleted_at": {"$type": "date"}}
+            )
+            # Cursor del change feed
+            await self.collection.create_index("change_seq", sparse=True)
+            # Sincronización incremental de versiones de token (solo las invalidadas)
+            await self.collection.create_index(
+                [("token_version", 1), ("updated_at", 1)],
+                partialFilterExpression={"token_version": {"$gt": 0}},
+            )
+            await self.tombstones.create_index("change_seq")
+            await self.tombstones.create_index(
+                "deleted_at",
+                expireAfterSeconds=settings.USER_TOMBSTONE_TTL_DAYS * 86400,
+            )
+            print("✅ Índices de 'users' OK (email y username únicos entre vivos, change_seq)")
         except Exception as e:
             raise DatabaseException(f"No se pudieron crear índices de users: {e}")
 
+    @resilient()
     async def create_with_unique_check(self, data: dict) -> dict:
         """
         Inserta un usuario; 'data' debe traer 'hashed_password' ya preparado por el service.
         Captura duplicados por índice único (email o username).
         """
         try:
-            result = await self.collection.insert_one(data)
+            async with self._reserve_sequence() as seq:
+                data["change_seq"] = seq
+                data.setdefault("deleted_at", None)
+                result = await self.collection.insert_one(data)
+            read_your_writes.mark_write()
+            user_reads.forget("list", self.collection.full_name)
+            await self.stats.record_change(None, data)
+            await self._mirror(str(result.inserted_id))
             # Se usa utilidades del base para devolver JSON-friendly
             return await self.find_by_id(str(result.inserted_id))
         except DuplicateKeyError as e:
@@ -52,12 +130,13 @@ class UserRepository(BaseRepositoryMD):
         except Exception as e:
             raise DatabaseException(f"Error al crear usuario: {e}")
 
+    @resilient(retry=True)
     async def get_by_email(self, email: str) -> Optional[dict]:
         """
         Devuelve un dict JSON-friendly o None.
         """
         try:
-            doc = await self.collection.find_one({"email": email})
+            doc = await self.collection.find_one(self._live({"email": email}))
             if not doc:
                 return None
             doc["_id"] = str(doc["_id"])
@@ -65,33 +144,126 @@ class UserRepository(BaseRepositoryMD):
         except Exception as e:
             raise DatabaseException(f"Error al buscar por email: {e}")
 
-    async def get_by_id(self, user_id: str) -> Optional[dict]:
+    @resilient(retry=True)
+    async def get_by_id(
+        self, user_id: str, fields: Optional[Sequence[str]] = None
+    ) -> Optional[dict]:
         """
         Alias de find_by_id del base (valida id y convierte _id→str).
+        Con `fields` solo se leen esos campos (más los de versión).
+        Las llamadas concurrentes con el mismo id comparten la consulta.
         """
-        return await self.find_by_id(user_id)
+        proj = projection(fields) if fields else None
+        return await user_reads.do(
+            ("get_by_id", self.collection.full_name, user_id, tuple(fields or ())),
+            lambda: self.find_by_id(user_id, projection=proj),
+        )
 
-    async def list(self, skip: int = 0, limit: int = 100) -> List[dict]:
+    @resilient(retry=True)
+    async def list(
+        self, skip: int = 0, limit: int = 100, fields: Optional[Sequence[str]] = None
+    ) -> List[dict]:
         """
         Paginación básica.
+        Con `fields` solo se leen esos campos (más los de versión).
+        Las llamadas concurrentes con la misma página (y el mismo destino,
+        réplica o primario) comparten la consulta.
+        """
+        proj = projection(fields) if fields else None
+        reader = self._reader()
+
+        async def fetch() -> List[dict]:
+            try:
+                cursor = (
+                    reader.find(self._live({}), projection=proj)
+                    .skip(skip)
+                    .limit(limit)
+                )
+                items: List[dict] = []
+                async for doc in cursor:
+                    doc["_id"] = str(doc["_id"])
+                    items.append(doc)
+                return items
+            except Exception as e:
+                raise DatabaseException(f"Error al listar usuarios: {e}")
+
+        return await user_reads.do(
+            (
+                "list",
+                self.collection.full_name,
+                skip,
+                limit,
+                tuple(fields or ()),
+                reader is self.collection,
+            ),
+            fetch,
+        )
+
+    @resilient(retry=True)
+    async def get_version(self, user_id: str) -> dict:
+        """
+        Solo _id, updated_at y created_at de un usuario (para peticiones condicionales).
+        """
+        try:
+            obj_id = await self._validate_id(user_id)
+            doc = await self.collection.find_one(
+                self._live({"_id": obj_id}), projection=_VERSION_FIELDS
+            )
+            if not doc:
+                raise NotFoundException("Documento no encontrado")
+            doc["_id"] = str(doc["_id"])
+            return doc
+        except NotFoundException:
+            raise
+        except Exception as e:
+            raise DatabaseException(f"Error al leer versión de usuario: {e}")
+
+    @resilient(retry=True)
+    async def list_versions(self, skip: int = 0, limit: int = 100) -> List[dict]:
+        """
+        Igual que list() pero proyectando solo _id, updated_at y created_at.
         """
         try:
-            cursor = self.collection.find().skip(skip).limit(limit)
+            cursor = (
+                self._reader()
+                .find(self._live({}), projection=_VERSION_FIELDS)
+                .skip(skip)
+                .limit(limit)
+            )
             items: List[dict] = []
             async for doc in cursor:
                 doc["_id"] = str(doc["_id"])
                 items.append(doc)
             return items
         except Exception as e:
-            raise DatabaseException(f"Error al listar usuarios: {e}")
+            raise DatabaseException(f"Error al listar versiones de usuarios: {e}")
+
+    def _forget_reads(self, user_id: str):
+        """
+        Tras una escritura, las lecturas en curso ya no deben compartirse y el
+        usuario actual vuelve a leer del primario durante un momento.
+        """
+        read_your_writes.mark_write()
+        user_reads.forget("get_by_id", self.collection.full_name, user_id)
+        user_reads.forget("list", self.collection.full_name)
+
+    async def _mirror(self, user_id: str):
+        """
+        Con dual-write activo, copia el estado final del usuario a Postgres.
+        """
+        if user_mirror.enabled:
+            await user_mirror.mirror(self.collection, await self._validate_id(user_id))
 
+    @resilient(retry=True)
     async def get_by_username(self, username: str) -> Optional[dict]:
         """
         Devuelve un dict JSON-friendly o None.
         Busca por username (case-insensitive).
         """
         try:
-            doc = await self.collection.find_one({"username": username.lower()})
+            doc = await self.collection.find_one(
+                self._live({"username": username.lower()})
+            )
             if not doc:
                 return None
             doc["_id"] = str(doc["_id"])
@@ -99,6 +271,7 @@ class UserRepository(BaseRepositoryMD):
         except Exception as e:
             raise DatabaseException(f"Error al buscar por username: {e}")
 
+    @resilient(retry=True)
     async def get_by_username_or_email(self, username_or_email: str) -> Optional[dict]:
         """
         Busca un usuario por username O email.
@@ -107,12 +280,14 @@ class UserRepository(BaseRepositoryMD):
         try:
             # Intentamos buscar por ambos campos
             doc = await self.collection.find_one(
-                {
-                    "$or": [
-                        {"email": username_or_email},
-                        {"username": username_or_email.lower()},
-                    ]
-                }
+                self._live(
+                    {
+                        "$or": [
+                            {"email": username_or_email},
+                            {"username": username_or_email.lower()},
+                        ]
+                    }
+                )
             )
             if not doc:
                 return None
@@ -121,17 +296,44 @@ class UserRepository(BaseRepositoryMD):
         except Exception as e:
             raise DatabaseException(f"Error al buscar usuario: {e}")
 
+    @resilient()
     async def update_user(self, user_id: str, update_data: dict) -> dict:
         """
         Actualiza un usuario.
         Solo actualiza los campos presentes en update_data.
         """
         try:
-            # Añadimos timestamp de actualización
+            # Añadimos timestamp de actualización y posición en el change feed
             update_data["updated_at"] = datetime.utcnow()
 
-            # Usamos el método update del base
-            return await self.update(user_id, update_data)
+            if not _STATS_FIELDS.keys() & update_data.keys():
+                # Usamos el método update del base
+                async with self._reserve_sequence() as seq:
+                    update_data["change_seq"] = seq
+                    updated = await self.update(user_id, update_data)
+                self._forget_reads(user_id)
+                await self._mirror(user_id)
+                return updated
+
+            # Cambia rol o estado: necesitamos el estado previo para las estadísticas
+            obj_id = await self._validate_id(user_id)
+            async with self._reserve_sequence() as seq:
+                update_data["change_seq"] = seq
+                before = await self.collection.find_one_and_update(
+                    self._live({"_id": obj_id}),
+                    {"$set": update_data},
+                    projection=_STATS_FIELDS,
+                )
+            if not before:
+                raise NotFoundException("Documento a actualizar no encontrado")
+            self._forget_reads(user_id)
+            after = dict(before)
+            after.update({k: update_data[k] for k in _STATS_FIELDS if k in update_data})
+            await self.stats.record_change(before, after)
+            await self._mirror(user_id)
+            return await self.find_by_id(user_id)
+        except NotFoundException:
+            raise
         except DuplicateKeyError as e:
             error_msg = str(e)
             if "email" in error_msg:
@@ -143,16 +345,121 @@ class UserRepository(BaseRepositoryMD):
         except Exception as e:
             raise DatabaseException(f"Error al actualizar usuario: {e}")
 
+    @resilient()
     async def delete_user(self, user_id: str) -> bool:
         """
-        Elimina un usuario permanentemente.
+        Da de baja un usuario (soft delete): marca deleted_at y avanza change_seq
+        para que los clientes con sync delta se enteren. El documento se conserva
+        hasta que purge_deleted_users() lo archiva.
         Retorna True si se eliminó correctamente.
         """
         try:
-            return await self.delete(user_id)
+            obj_id = await self._validate_id(user_id)
+            async with self._reserve_sequence() as seq:
+                before = await self.collection.find_one_and_update(
+                    self._live({"_id": obj_id}),
+                    {"$set": {"deleted_at": datetime.utcnow(), "change_seq": seq}},
+                    projection=_STATS_FIELDS,
+                )
+            if not before:
+                raise NotFoundException("Documento a eliminar no encontrado")
+            self._forget_reads(user_id)
+            await self.stats.record_change(before, None)
+            await self._mirror(user_id)
+            return True
+        except NotFoundException:
+            raise
         except Exception as e:
             raise DatabaseException(f"Error al eliminar usuario: {e}")
 
+    @resilient(retry=True)
+    async def get_token_versions(
+        self, since: Optional[datetime] = None
+    ) -> List[Tuple[str, int]]:
+        """
+        Devuelve (id, token_version) de los usuarios cuyo token fue invalidado
+        alguna vez. Solo proyecta esos dos campos.
+        Con `since` solo los actualizados desde entonces (sincronización incremental).
+        """
+        query = {"token_version": {"$gt": 0}}
+        if since is not None:
+            query["updated_at"] = {"$gte": since}
+        try:
+            cursor = self.collection.find(
+                self._live(query), projection={"token_version": 1}
+            )
+            return [(str(doc["_id"]), doc["token_version"]) async for doc in cursor]
+        except Exception as e:
+            raise DatabaseException(f"Error al leer versiones de token: {e}")
+
+    @resilient(retry=True)
+    async def get_changes(self, since: int, limit: int = 100) -> Tuple[List[dict], bool]:
+        """
+        Altas/cambios y bajas posteriores a `since`, ordenados por change_seq.
+        Las bajas se devuelven como {"_id", "change_seq", "deleted": True}.
+        Devuelve (cambios, hay_más).
+
+        No pasa de current_sequence(): un cambio con change_seq mayor pero aún
+        sin escribir del todo haría saltar al cliente por encima de otro anterior.
+        """
+        until = await self.current_sequence()
+        if until <= since:
+            return [], False
+        changed = [
+            {"_id": doc["_id"], "change_seq": doc["change_seq"], "deleted": True}
+            if doc.get("deleted_at")
+            else doc
+            for doc in await self.find_changed_since(since, limit, until)
+        ]
+        # Bajas físicas de antes del soft delete (hasta que expiren por TTL)
+        try:
+            cursor = (
+                self.tombstones.find({"change_seq": {"$gt": since, "$lte": until}})
+                .sort("change_seq", 1)
+                .limit(limit)
+            )
+            deleted = []
+            async for doc in cursor:
+                deleted.append(
+                    {"_id": str(doc["_id"]), "change_seq": doc["change_seq"], "deleted": True}
+                )
+        except Exception as e:
+            raise DatabaseException(f"Error al obtener bajas de usuarios: {e}")
+
+        return merge_changes(changed, deleted, limit)
+
+    async def purge_deleted_users(
+        self, on_batch: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> int:
+        """
+        Archiva en users_archive (sin hash de contraseña) y borra los usuarios
+        dados de baja hace más de USER_TOMBSTONE_TTL_DAYS, por lotes.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=settings.USER_TOMBSTONE_TTL_DAYS)
+        purged = await self.purge_deleted(
+            cutoff,
+            archive=self.archive,
+            batch_size=settings.USER_PURGE_BATCH_SIZE,
+            exclude_fields=("hashed_password",),
+            on_batch=on_batch,
+        )
+        if purged:
+            print(f"🧹 {purged} usuarios eliminados archivados en '{USERS_ARCHIVE_COLLECTION}'")
+        return purged
+
+    async def get_stats(self) -> dict:
+        """
+        Estadísticas materializadas de usuarios (lectura O(1)).
+        """
+        return await self.stats.get()
+
+    async def reconcile_stats(self) -> dict:
+        """
+        Recalcula las estadísticas desde la colección (corrige desviaciones).
+        """
+        return await self.stats.reconcile(self.collection)
+
+    @resilient(retry=True)
     async def email_exists(
         self, email: str, exclude_user_id: Optional[str] = None
     ) -> bool:
@@ -160,7 +467,7 @@ class UserRepository(BaseRepositoryMD):
         Verifica si existe un usuario con ese email.
         exclude_user_id: ID de usuario a excluir (útil para updates).
         """
-        query = {"email": email}
+        query = self._live({"email": email})
         if exclude_user_id:
             from bson import ObjectId
 
@@ -169,6 +476,7 @@ class UserRepository(BaseRepositoryMD):
         count = await self.collection.count_documents(query)
         return count > 0
 
+    @resilient(retry=True)
     async def username_exists(
         self, username: str, exclude_user_id: Optional[str] = None
     ) -> bool:
@@ -176,7 +484,7 @@ class UserRepository(BaseRepositoryMD):
         Verifica si existe un usuario con ese username.
         exclude_user_id: ID de usuario a excluir (útil para updates).
         """
-        query = {"username": username.lower()}
+        query = self._live({"username": username.lower()})
         if exclude_user_id:
             from bson import ObjectId
 
@@ -0,0 +1,137 @@
+from typing import AsyncIterator, Iterable, Optional
+from bson import ObjectId
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.resilience import resilient
+from exceptions import DatabaseException, NotFoundException
+from models.user_sql import UserRow
+from repositories.base_repository_pg import BaseRepositoryPG
+
+# Columnas que se copian desde el documento de Mongo (además del id)
+USER_COLUMNS = (
+    "email",
+    "username",
+    "full_name",
+    "role",
+    "hashed_password",
+    "is_active",
+    "token_version",
+    "created_at",
+    "updated_at",
+    "deleted_at",
+    "change_seq",
+)
+
+# asyncpg admite hasta 32767 parámetros por sentencia
+_MAX_ROWS_PER_INSERT = 32767 // (len(USER_COLUMNS) + 1)
+
+
+def row_from_document(doc: dict) -> dict:
+    """
+    Documento de usuario de Mongo -> fila de `users` en Postgres.
+    """
+    return {
+        "id": str(doc["_id"]),
+        "email": doc["email"],
+        "username": doc["username"],
+        "full_name": doc.get("full_name") or doc["username"],
+        "role": doc.get("role") or "viewer",
+        "hashed_password": doc["hashed_password"],
+        "is_active": doc.get("is_active", True),
+        "token_version": doc.get("token_version", 0),
+        "created_at": doc["created_at"],
+        "updated_at": doc.get("updated_at"),
+        "deleted_at": doc.get("deleted_at"),
+        "change_seq": doc.get("change_seq"),
+    }
+
+
+class UserRepositoryPG(BaseRepositoryPG[UserRow]):
+    """
+    Repo de usuarios sobre Postgres (tabla `users`, ids de Mongo).
+    Se usa como destino de la migración y del dual-write durante el cambio.
+    """
+
+    soft_delete = True
+
+    def __init__(self, session: AsyncSession, read_session: Optional[AsyncSession] = None):
+        super().__init__(UserRow, session, read_session)
+
+    async def _validate_id(self, id: str) -> str:
+        if not ObjectId.is_valid(id):
+            raise NotFoundException("ID inválido")
+        return str(id)
+
+    @resilient()
+    async def upsert_many(self, docs: Iterable[dict], overwrite: bool = True) -> int:
+        """
+        Inserta documentos de Mongo con INSERT multi-fila (uno por cada
+        _MAX_ROWS_PER_INSERT filas) y un solo commit.
+
+        - overwrite=True (dual-write y puesta al día): si la fila ya existe se
+          reemplaza, salvo que la de Postgres tenga un change_seq más nuevo
+          (así una escritura que llega tarde no pisa una posterior).
+        - overwrite=False (copia inicial): las filas existentes se dejan, de
+          modo que repetir un lote tras una interrupción no duplica nada.
+
+        Devuelve cuántas filas se insertaron o actualizaron.
+        """
+        rows = [row_from_document(doc) for doc in docs]
+        if not rows:
+            return 0
+        written = 0
+        try:
+            for i in range(0, len(rows), _MAX_ROWS_PER_INSERT):
+                stmt = pg_insert(UserRow).values(rows[i : i + _MAX_ROWS_PER_INSERT])
+                if overwrite:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[UserRow.id],
+                        set_={c: stmt.excluded[c] for c in USER_COLUMNS},
+                        where=or_(
+                            UserRow.change_seq.is_(None),
+                            stmt.excluded.change_seq.is_(None),
+                            UserRow.change_seq <= stmt.excluded.change_seq,
+                        ),
+                    )
+                else:
+                    stmt = stmt.on_conflict_do_nothing()
+                result = await self.session.execute(stmt)
+                written += result.rowcount
+            await self.session.commit()
+            return written
+        except SQLAlchemyError as e:
+            try:
+                await self.session.rollback()
+            except Exception:
+                pass
+            raise DatabaseException(f"Error al copiar usuarios: {str(e)}")
+
+    @resilient(retry=True)
+    async def count_all(self) -> int:
+        """
+        Total exacto de filas, incluidas las bajas lógicas (para verificar la copia).
+        """
+        try:
+            result = await self.session.execute(select(func.count()).select_from(UserRow))
+            return result.scalar_one()
+        except SQLAlchemyError as e:
+            raise DatabaseException(f"Error al contar usuarios: {str(e)}")
+
+    async def iter_by_id(self, batch_size: int = 5000) -> AsyncIterator[dict]:
+        """
+        Todas las filas (incluidas las bajas) en orden de id, con cursor del
+        servidor. Con collation "C" es el mismo orden que _id en Mongo (los
+        bytes del ObjectId, en hex).
+        """
+        q = select(*self._serialize.columns).order_by(UserRow.id.collate("C"))
+        try:
+            result = await self.session.stream(q.execution_options(yield_per=batch_size))
+            try:
+                async for row in result.mappings():
+                    yield dict(row)
+            finally:
+                await result.close()
+        except SQLAlchemyError as e:
+            raise DatabaseException(f"Error al recorrer usuarios: {str(e)}")
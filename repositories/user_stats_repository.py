@@ -0,0 +1,122 @@
+from typing import Optional
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorCollection
+from models.user import UserRole
+from exceptions import DatabaseException
+from repositories.base_repository_md import LIVE_FILTER
+
+USER_STATS_COLLECTION = "user_stats"
+USER_STATS_ID = "users"
+
+
+class UserStatsRepository:
+    """
+    Contadores materializados de usuarios (total, activos/inactivos y por rol).
+    Se guardan en un único documento que se actualiza con $inc en cada escritura,
+    de modo que leer las estadísticas cuesta un find_one por _id.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    @staticmethod
+    def _deltas(before: Optional[dict], after: Optional[dict]) -> dict:
+        """
+        Calcula los $inc necesarios para pasar del estado `before` al `after`.
+        None significa que el usuario no existía (alta) o dejó de existir (baja).
+        """
+        inc: dict = {}
+
+        def add(state: Optional[dict], sign: int):
+            if state is None:
+                return
+            status = "active" if state.get("is_active", True) else "inactive"
+            for field in ("total", status, f"roles.{state.get('role')}"):
+                inc[field] = inc.get(field, 0) + sign
+
+        add(before, -1)
+        add(after, 1)
+        return {k: v for k, v in inc.items() if v != 0}
+
+    async def record_change(self, before: Optional[dict], after: Optional[dict]):
+        """
+        Aplica incrementalmente el cambio de un usuario a los contadores.
+        Un fallo aquí no debe romper la escritura del usuario: la reconciliación
+        periódica corrige cualquier desviación.
+        """
+        inc = self._deltas(before, after)
+        if not inc:
+            return
+        try:
+            await self.collection.update_one(
+                {"_id": USER_STATS_ID},
+                {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"⚠️ No se pudieron actualizar las estadísticas de usuarios: {e}")
+
+    async def get(self) -> dict:
+        """
+        Devuelve los contadores actuales (ceros si aún no existen).
+        """
+        try:
+            doc = await self.collection.find_one({"_id": USER_STATS_ID})
+        except Exception as e:
+            raise DatabaseException(f"Error al obtener estadísticas: {e}")
+        doc = doc or {}
+        roles = doc.get("roles") or {}
+        return {
+            "total": doc.get("total", 0),
+            "active": doc.get("active", 0),
+            "inactive": doc.get("inactive", 0),
+            "by_role": {role.value: roles.get(role.value, 0) for role in UserRole},
+            "updated_at": doc.get("updated_at"),
+            "reconciled_at": doc.get("reconciled_at"),
+        }
+
+    async def reconcile(self, users_collection: AsyncIOMotorCollection) -> dict:
+        """
+        Recalcula los contadores desde los usuarios vivos con una agregación
+        y sobrescribe el documento materializado.
+        """
+        try:
+            cursor = users_collection.aggregate(
+                [
+                    {"$match": LIVE_FILTER},
+                    {
+                        "$group": {
+                            "_id": {"role": "$role", "is_active": "$is_active"},
+                            "n": {"$sum": 1},
+                        }
+                    }
+                ]
+            )
+            total = active = inactive = 0
+            roles: dict = {}
+            async for row in cursor:
+                n = row["n"]
+                total += n
+                if row["_id"].get("is_active", True):
+                    active += n
+                else:
+                    inactive += n
+                role = row["_id"].get("role")
+                roles[role] = roles.get(role, 0) + n
+
+            now = datetime.utcnow()
+            await self.collection.replace_one(
+                {"_id": USER_STATS_ID},
+                {
+                    "total": total,
+                    "active": active,
+                    "inactive": inactive,
+                    "roles": roles,
+                    "updated_at": now,
+                    "reconciled_at": now,
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            raise DatabaseException(f"Error al reconciliar estadísticas: {e}")
+        return await self.get()
@@ -0,0 +1,165 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from bson import ObjectId, json_util
+from core.config import settings
+from models.audit import AuditAction
+from repositories.audit_repository import AuditRepository
+from utils.metrics import register_metrics
+
+
+class AuditLogger:
+    """
+    Audit trail asíncrono y por lotes.
+
+    record() no hace I/O: encola el registro en una cola acotada. Una tarea de
+    fondo agrupa los registros y los escribe con insert_many cuando se junta
+    `batch_size` o pasa `flush_interval` segundos. Si la base de datos falla o
+    la cola se llena, los registros se guardan en un archivo local (JSON Lines)
+    que se reenvía en cuanto una escritura vuelve a funcionar.
+    """
+
+    def __init__(
+        self, queue_size: int, batch_size: int, flush_interval: float, spill_path: str
+    ):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.repo: Optional[AuditRepository] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[dict] = []  # lote en curso (stop() lo escribe si nos cancelan)
+        self.stats = {
+            "recorded": 0,
+            "written": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "flush_errors": 0,
+        }
+
+    def record(
+        self,
+        action: AuditAction,
+        actor_id: Optional[str] = None,
+        target_id: Optional[str] = None,
+        details: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Registra una acción sin esperar a la base de datos.
+        """
+        record = {
+            "_id": ObjectId(),
+            "action": action.value,
+            "actor_id": actor_id,
+            "target_id": target_id,
+            "at": datetime.utcnow(),
+            "details": details or {},
+        }
+        self.stats["recorded"] += 1
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self._spill([record])
+
+    async def start(self, repo: AuditRepository):
+        self.repo = repo
+        self._task = asyncio.create_task(self._run(), name="audit-flusher")
+
+    async def stop(self):
+        """
+        Detiene el flusher y escribe todo lo pendiente (o lo vuelca al archivo).
+        """
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        pending = self._batch
+        self._batch = []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for i in range(0, len(pending), self.batch_size):
+            await self._write(pending[i : i + self.batch_size])
+
+    async def _run(self):
+        while True:
+            await self._fill_batch()
+            await self._write(self._batch)
+            self._batch = []
+
+    async def _fill_batch(self):
+        """
+        Junta en self._batch hasta `batch_size` registros o hasta que pase
+        `flush_interval` desde el primero. Lo ya sacado de la cola queda en
+        self._batch, así stop() no lo pierde si cancela a mitad.
+        """
+        loop = asyncio.get_running_loop()
+        self._batch.append(await self.queue.get())
+        deadline = loop.time() + self.flush_interval
+        while len(self._batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                self._batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _write(self, batch: List[dict]):
+        if not batch:
+            return
+        try:
+            await self.repo.insert_many(batch)
+            self.stats["written"] += len(batch)
+        except Exception as e:
+            self.stats["flush_errors"] += 1
+            print(f"⚠️ Auditoría: escritura fallida, se guarda en {self.spill_path}: {e}")
+            self._spill(batch)
+            return
+        await self._replay_spill()
+
+    # --- archivo local de respaldo ---
+
+    def _spill(self, records: List[dict]):
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json_util.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.stats["spilled"] += len(records)
+
+    async def _replay_spill(self):
+        """
+        Reenvía a la base de datos lo guardado en el archivo de respaldo.
+        Se mueve primero a `.replay` para no mezclarlo con nuevos volcados.
+        """
+        replay_path = self.spill_path + ".replay"
+        if not os.path.exists(replay_path):
+            if not os.path.exists(self.spill_path):
+                return
+            os.replace(self.spill_path, replay_path)
+
+        try:
+            with open(replay_path, encoding="utf-8") as f:
+                records = [json_util.loads(line) for line in f if line.strip()]
+            for i in range(0, len(records), self.batch_size):
+                await self.repo.insert_many(records[i : i + self.batch_size])
+            os.remove(replay_path)
+            self.stats["replayed"] += len(records)
+        except Exception as e:
+            # Se reintentará tras la próxima escritura correcta
+            print(f"⚠️ Auditoría: no se pudo reenviar {replay_path}: {e}")
+
+    def metrics(self) -> dict:
+        return {**self.stats, "queued": self.queue.qsize()}
+
+
+# Audit trail compartido por el proceso (se inicia en el lifespan)
+audit_log = AuditLogger(
+    queue_size=settings.AUDIT_QUEUE_SIZE,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_SECONDS,
+    spill_path=settings.AUDIT_SPILL_PATH,
+)
+register_metrics("audit", audit_log.metrics)
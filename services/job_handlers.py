@@ -0,0 +1,46 @@
+from typing import Optional
+from core.database import db
+from models.job import JobKind
+from repositories.user_repository import UserRepository
+from services.job_runner import JobContext, job_runner
+from utils.authorization import Permission
+
+
+def _users() -> UserRepository:
+    # Se resuelve al ejecutar: la base es la del laboratorio de la tarea
+    return UserRepository(db.mongo.db["users"])
+
+
+async def purge_deleted_users(job: JobContext) -> Optional[dict]:
+    """
+    Archiva y borra los usuarios dados de baja hace más de
+    USER_TOMBSTONE_TTL_DAYS. Se puede cancelar entre lotes; cada lote es
+    idempotente, así que al reanudarse continúa con lo que quede.
+    """
+
+    async def on_batch(purged: int):
+        await job.progress(purged, message="usuarios purgados")
+
+    return {"purged": await _users().purge_deleted_users(on_batch=on_batch)}
+
+
+async def reconcile_user_stats(job: JobContext) -> Optional[dict]:
+    """
+    Recalcula las estadísticas materializadas de usuarios.
+    """
+    await job.progress(0, total=1, message="recalculando estadísticas")
+    return await _users().reconcile_stats()
+
+
+job_runner.register(
+    JobKind.PURGE_DELETED_USERS,
+    purge_deleted_users,
+    Permission.USERS_DELETE,
+    exclusive=True,
+)
+job_runner.register(
+    JobKind.RECONCILE_USER_STATS,
+    reconcile_user_stats,
+    Permission.USERS_MANAGE,
+    exclusive=True,
+)
@@ -0,0 +1,270 @@
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+from bson import ObjectId
+from core.config import settings
+from core.database import tenant_router
+from core.tenancy import current_tenant, use_tenant
+from exceptions import TooManyRequestsException
+from models.job import JobKind, JobStatus
+from repositories.job_repository import JobRepository
+from utils.authorization import Permission
+from utils.metrics import register_metrics
+from utils.periodic import run_periodically
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """
+    Lo que recibe el handler de una tarea: sus parámetros, el checkpoint de un
+    intento anterior (si se interrumpió) y progress() para informar avance.
+    """
+
+    def __init__(self, runner: "JobRunner", job: dict):
+        self.runner = runner
+        self.id = job["_id"]
+        self.params: dict = job.get("params") or {}
+        self.checkpoint: Optional[dict] = job.get("checkpoint")
+        self.tenant: Optional[str] = job.get("tenant")
+        self.progress_state: dict = job.get("progress") or {"done": 0}
+        self.cancel_requested = False
+        self._saved_at = 0.0
+
+    async def progress(
+        self,
+        done: int,
+        total: Optional[int] = None,
+        message: Optional[str] = None,
+        checkpoint: Optional[dict] = None,
+    ):
+        """
+        Informa el avance. Se guarda como mucho cada JOB_PROGRESS_SECONDS
+        (siempre que traiga checkpoint). Si se pidió cancelar la tarea lanza
+        JobCancelled: es el punto donde un handler puede detenerse.
+        """
+        self.progress_state = {"done": done, "total": total, "message": message}
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+        now = time.monotonic()
+        if checkpoint is not None or now - self._saved_at >= self.runner.progress_seconds:
+            self._saved_at = now
+            if await self.runner.repo.save_progress(self.id, self.progress_state, checkpoint):
+                self.cancel_requested = True
+        if self.cancel_requested:
+            raise JobCancelled()
+
+
+Handler = Callable[[JobContext], Awaitable[Optional[dict]]]
+
+
+class JobRunner:
+    """
+    Tareas largas (purgas, reconciliaciones...) fuera de la petición HTTP.
+
+    - submit() guarda la tarea en la colección `jobs` y responde enseguida;
+      el cliente consulta el estado en GET /jobs/{id}.
+    - `workers` tareas de fondo por proceso toman tareas encoladas (de
+      cualquier proceso) y ejecutan su handler; así la concurrencia queda
+      acotada aunque lleguen muchas peticiones.
+    - Cancelar es cooperativo: el handler se detiene en su siguiente
+      progress().
+    - Al cerrar se deja de tomar tareas y se espera a las que están en curso
+      hasta `shutdown_grace` segundos; las que no terminan se interrumpen y
+      vuelven a la cola con su último checkpoint. Las de un proceso que murió
+      se reencolan al dejar de latir (JOB_STALE_SECONDS).
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queued: int,
+        poll_seconds: float,
+        progress_seconds: float,
+        shutdown_grace: float,
+    ):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.poll_seconds = poll_seconds
+        self.progress_seconds = progress_seconds
+        self.shutdown_grace = shutdown_grace
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.repo: Optional[JobRepository] = None
+        self.handlers: Dict[str, Handler] = {}
+        self.permissions: Dict[str, Permission] = {}
+        self.exclusive: Dict[str, bool] = {}
+        self._running: Dict[ObjectId, JobContext] = {}
+        self._workers: List[asyncio.Task] = []
+        self._maintenance: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.stats = {
+            "submitted": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "interrupted": 0,
+            "requeued_stale": 0,
+        }
+
+    def register(
+        self,
+        kind: JobKind,
+        handler: Handler,
+        permission: Permission,
+        exclusive: bool = False,
+    ):
+        """
+        Asocia un tipo de tarea con su handler y el permiso para lanzarla.
+        Con `exclusive` solo puede haber una encolada o en curso por laboratorio.
+        """
+        self.handlers[kind.value] = handler
+        self.permissions[kind.value] = permission
+        self.exclusive[kind.value] = exclusive
+
+    async def start(self, repo: JobRepository):
+        self.repo = repo
+        self._stopping = False
+        self.stats["requeued_stale"] += await repo.requeue_stale(settings.JOB_STALE_SECONDS)
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._maintenance = run_periodically(
+            self._heartbeat, settings.JOB_HEARTBEAT_SECONDS, "jobs-heartbeat"
+        )
+
+    async def stop(self):
+        """
+        Deja de tomar tareas, espera a las que están en curso (hasta
+        `shutdown_grace`) y reencola las que no terminaron.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._maintenance:
+            self._maintenance.cancel()
+            await asyncio.gather(self._maintenance, return_exceptions=True)
+            self._maintenance = None
+        if not self._workers:
+            return
+        _, pending = await asyncio.wait(self._workers, timeout=self.shutdown_grace)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, kind: JobKind, params: dict, created_by: Optional[str]) -> dict:
+        if await self.repo.count_queued() >= self.max_queued:
+            raise TooManyRequestsException(
+                "Hay demasiadas tareas pendientes; inténtalo más tarde",
+                retry_after=int(self.poll_seconds * 5),
+            )
+        tenant = current_tenant()
+        job = {
+            "_id": ObjectId(),
+            "kind": kind.value,
+            "status": JobStatus.QUEUED.value,
+            "params": params,
+            "progress": {"done": 0},
+            "cancel_requested": False,
+            "attempts": 0,
+            "tenant": tenant,
+            "created_by": created_by,
+            "created_at": datetime.utcnow(),
+        }
+        if self.exclusive.get(kind.value):
+            job["active_key"] = f"{tenant or ''}:{kind.value}"
+        job = await self.repo.create(job)
+        self.stats["submitted"] += 1
+        self._wakeup.set()
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[dict]:
+        job = await self.repo.request_cancel(job_id, current_tenant())
+        if job is not None:
+            # Si corre en este proceso no hace falta esperar al próximo guardado
+            context = self._running.get(ObjectId(job["_id"]))
+            if context is not None:
+                context.cancel_requested = True
+        return job
+
+    async def _work(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                job = await self.repo.claim(self.worker_id)
+            except Exception as e:
+                print(f"⚠️ Tareas: no se pudo leer la cola: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict):
+        context = JobContext(self, job)
+        self._running[context.id] = context
+        tenant_stats = tenant_router.stats_for(context.tenant) if context.tenant else None
+        if tenant_stats:
+            tenant_stats.in_flight += 1  # su pool no se cierra mientras corre
+        try:
+            handler = self.handlers.get(job["kind"])
+            if handler is None:
+                raise ValueError(f"Tipo de tarea desconocido: {job['kind']}")
+            with use_tenant(context.tenant):
+                if context.tenant:
+                    await tenant_router.prepare(context.tenant)
+                result = await handler(context)
+            await self.repo.finish(
+                context.id, JobStatus.SUCCEEDED, context.progress_state, result=result
+            )
+            self.stats["succeeded"] += 1
+        except JobCancelled:
+            await self.repo.finish(context.id, JobStatus.CANCELLED, context.progress_state)
+            self.stats["cancelled"] += 1
+        except asyncio.CancelledError:
+            # Cierre del proceso: vuelve a la cola con su checkpoint
+            await self.repo.requeue(context.id, context.progress_state, context.checkpoint)
+            self.stats["interrupted"] += 1
+            print(f"⏸️ Tarea {context.id} interrumpida por el cierre; se reanudará")
+            raise
+        except Exception as e:
+            await self.repo.finish(
+                context.id, JobStatus.FAILED, context.progress_state, error=str(e)
+            )
+            self.stats["failed"] += 1
+            print(f"⚠️ Tarea {context.id} ({job['kind']}) falló: {e}")
+        finally:
+            self._running.pop(context.id, None)
+            if tenant_stats:
+                tenant_stats.in_flight -= 1
+
+    async def _heartbeat(self):
+        await self.repo.heartbeat(list(self._running))
+        self.stats["requeued_stale"] += await self.repo.requeue_stale(settings.JOB_STALE_SECONDS)
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "workers": len(self._workers),
+            "running": len(self._running),
+        }
+
+
+# Ejecutor de tareas del proceso (se inicia en el lifespan)
+job_runner = JobRunner(
+    workers=settings.JOB_WORKERS,
+    max_queued=settings.JOB_MAX_QUEUED,
+    poll_seconds=settings.JOB_POLL_SECONDS,
+    progress_seconds=settings.JOB_PROGRESS_SECONDS,
+    shutdown_grace=settings.JOB_SHUTDOWN_GRACE_SECONDS,
+)
+register_metrics("jobs", job_runner.metrics)
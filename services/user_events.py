@@ -0,0 +1,210 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Protocol, Set
+from core.config import settings
+from utils.metrics import register_metrics
+
+EventHandler = Callable[[dict], Awaitable[None]]
+
+
+class EventRelay(Protocol):
+    """
+    Transporte opcional para repartir eventos entre workers/procesos.
+    El broadcaster publica cada evento local y recibe los de otros workers.
+    """
+
+    async def publish(self, event: dict) -> None: ...
+
+    async def start(self, on_event: EventHandler) -> None: ...
+
+    async def stop(self) -> None: ...
+
+
+class Subscription:
+    """
+    Suscriptor con cola acotada. Si se llena (cliente lento) se descarta:
+    `dropped` pasa a True y el stream se cierra para que el cliente reconecte.
+    """
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """
+        Siguiente evento, o None si no llegó ninguno en `timeout` segundos.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroadcaster:
+    """
+    Reparte eventos de usuarios a todos los suscriptores del proceso.
+    publish() nunca bloquea: encola con put_nowait en cada suscriptor.
+    """
+
+    def __init__(self, queue_size: int, relay: Optional[EventRelay] = None):
+        self.queue_size = queue_size
+        self.relay = relay
+        self.origin = uuid.uuid4().hex  # para ignorar el eco de nuestros propios eventos
+        self._subscribers: Set[Subscription] = set()
+        self.published = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    async def publish(self, event_type: str, data: dict, event_id: Optional[int] = None):
+        event = {
+            "type": event_type,
+            "id": event_id,
+            "data": data,
+            "at": datetime.utcnow().isoformat(),
+            "origin": self.origin,
+        }
+        self.published += 1
+        self._fanout(event)
+        if self.relay is not None:
+            try:
+                await self.relay.publish(event)
+            except Exception as e:
+                print(f"⚠️ No se pudo reenviar el evento al relay: {e}")
+
+    async def _on_relay_event(self, event: dict):
+        if event.get("origin") != self.origin:
+            self._fanout(event)
+
+    def _fanout(self, event: dict):
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def _drop(self, subscription: Subscription):
+        subscription.dropped = True
+        self._subscribers.discard(subscription)
+        self.dropped_subscribers += 1
+
+    async def start(self):
+        if self.relay is not None:
+            await self.relay.start(self._on_relay_event)
+
+    async def stop(self):
+        if self.relay is not None:
+            await self.relay.stop()
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped_subscribers,
+            "relay": type(self.relay).__name__ if self.relay else None,
+        }
+
+
+class LocalEventRelay:
+    """
+    Relay en memoria: conecta varios broadcasters del mismo proceso como si
+    fueran workers distintos. Sirve para tests y desarrollo local.
+    """
+
+    def __init__(self):
+        self._handlers: List[EventHandler] = []
+
+    async def publish(self, event: dict) -> None:
+        for handler in list(self._handlers):
+            await handler(event)
+
+    async def start(self, on_event: EventHandler) -> None:
+        self._handlers.append(on_event)
+
+    async def stop(self) -> None:
+        self._handlers.clear()
+
+
+class MongoCappedRelay:
+    """
+    Relay entre workers sobre una colección capped de Mongo leída con un
+    cursor tailable (no requiere replica set ni servicios adicionales).
+    """
+
+    def __init__(self, database, collection_name: str = "user_events", size_bytes: int = 4 * 1024 * 1024):
+        self.database = database
+        self.collection_name = collection_name
+        self.size_bytes = size_bytes
+        self._task: Optional[asyncio.Task] = None
+
+    async def _collection(self):
+        names = await self.database.list_collection_names()
+        if self.collection_name not in names:
+            try:
+                await self.database.create_collection(
+                    self.collection_name, capped=True, size=self.size_bytes
+                )
+            except Exception:
+                pass  # otro worker la creó a la vez
+        return self.database[self.collection_name]
+
+    async def publish(self, event: dict) -> None:
+        collection = await self._collection()
+        await collection.insert_one({"event": json.dumps(event, default=str)})
+
+    async def start(self, on_event: EventHandler) -> None:
+        collection = await self._collection()
+        # Empezamos después del último evento existente
+        last = await collection.find_one(sort=[("$natural", -1)])
+        last_id = last["_id"] if last else None
+        self._task = asyncio.create_task(self._tail(collection, last_id, on_event))
+
+    async def _tail(self, collection, last_id, on_event: EventHandler):
+        from pymongo import CursorType
+
+        while True:
+            query: Dict = {"_id": {"$gt": last_id}} if last_id else {}
+            cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+            try:
+                async for doc in cursor:
+                    last_id = doc["_id"]
+                    await on_event(json.loads(doc["event"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Relay de eventos interrumpido: {e}")
+            await asyncio.sleep(1)
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def format_sse(event: dict) -> str:
+    """
+    Serializa un evento en formato text/event-stream.
+    """
+    lines = []
+    if event.get("id") is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    payload = {k: v for k, v in event.items() if k != "origin"}
+    lines.append(f"data: {json.dumps(payload, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+# Broadcaster compartido por el proceso (el relay se configura en el lifespan)
+user_events = EventBroadcaster(settings.USER_EVENTS_QUEUE_SIZE)
+register_metrics("user_events", user_events.stats)
@@ -1,10 +1,45 @@
-from typing import List
-from datetime import datetime
-from models.user import User, UserCreate, UserLogin, UserUpdate, Token, UserResponse
+from typing import List, Optional, Sequence, Tuple
+from datetime import datetime, timedelta, timezone
+from models.user import (
+    User,
+    UserCreate,
+    UserLogin,
+    UserUpdate,
+    Token,
+    UserResponse,
+    UserBatchGetResponse,
+    UserStats,
+    UserChange,
+    UserChangesResponse,
+    TokenData,
+)
 from repositories.user_repository import UserRepository
+from repositories.revocation_repository import (
+    RevocationRepository,
+    REVOKED_TOKENS_COLLECTION,
+)
 from utils.hash_and_verify_password import hash_password, verify_password
-from utils.auth_manager import create_access_token
-from exceptions import ConflictException, NotFoundException, UnauthorizedException
+from utils.auth_manager import (
+    create_access_token,
+    create_refresh_token,
+    verify_refresh_token,
+)
+from utils.token_versions import token_versions
+from utils.revocation import revoked_tokens
+from utils.http_cache import resource_etag, collection_etag, last_modified
+from services.user_events import user_events
+from services.audit_service import audit_log
+from models.audit import AuditAction
+from exceptions import (
+    ConflictException,
+    NotFoundException,
+    UnauthorizedException,
+    ValidationException,
+)
+
+# Margen al sincronizar versiones de token: updated_at se sella antes de
+# confirmar la escritura y los relojes de los workers no coinciden del todo
+_TOKEN_VERSION_SYNC_OVERLAP = timedelta(seconds=60)
 
 
 class UserService:
@@ -12,15 +47,25 @@ class UserService:
     Servicio que contiene la lógica de negocio para usuarios.
     """
 
-    def __init__(self, user_repo: UserRepository):
+    def __init__(
+        self,
+        user_repo: UserRepository,
+        revocation_repo: Optional[RevocationRepository] = None,
+    ):
         self.user_repo = user_repo
+        self.revocation_repo = revocation_repo or RevocationRepository(
+            user_repo.collection.database[REVOKED_TOKENS_COLLECTION]
+        )
 
-    async def create_user(self, user_data: UserCreate) -> UserResponse:
+    async def create_user(
+        self, user_data: UserCreate, actor_id: Optional[str] = None
+    ) -> UserResponse:
         """
         Crea un nuevo usuario después de validar y hashear la contraseña.
 
         Args:
             user_data: Datos del usuario a crear
+            actor_id: Usuario que hace la acción (para auditoría)
 
         Returns:
             Usuario creado (sin contraseña)
@@ -39,6 +84,7 @@ class UserService:
             "is_active": True,
             "created_at": datetime.utcnow(),
             "updated_at": None,
+            "deleted_at": None,
         }
 
         # El repositorio solo guarda los datos y maneja duplicados
@@ -48,7 +94,7 @@ class UserService:
         user = User(**user_doc)
 
         # Convertimos a UserResponse (sin contraseña)
-        return UserResponse(
+        response = UserResponse(
             _id=user.id,
             email=user.email,
             username=user.username,
@@ -58,6 +104,14 @@ class UserService:
             created_at=user.created_at,
             updated_at=user.updated_at,
         )
+        audit_log.record(
+            AuditAction.USER_CREATED,
+            actor_id,
+            user.id,
+            {"username": user.username, "role": user.role.value},
+        )
+        await self._publish("user.created", response, user_doc.get("change_seq"))
+        return response
 
     async def authenticate_user(self, login_data: UserLogin) -> Token:
         """
@@ -80,6 +134,7 @@ class UserService:
 
         # Verificamos que exista el usuario
         if not user_doc:
+            self._audit_login_failed(login_data, None, "unknown_user")
             raise UnauthorizedException("Usuario/Email o contraseña incorrectos")
 
         # Construimos el modelo User desde el dict
@@ -87,18 +142,77 @@ class UserService:
 
         # Verificamos que esté activo
         if not user.is_active:
+            self._audit_login_failed(login_data, user.id, "inactive")
             raise UnauthorizedException("Usuario desactivado")
 
         # Verificamos la contraseña con await
         if not await verify_password(login_data.password, user.hashed_password):
+            self._audit_login_failed(login_data, user.id, "bad_password")
             raise UnauthorizedException("Usuario/Email o contraseña incorrectos")
 
-        # Creamos el token JWT con el ID y rol del usuario
+        audit_log.record(AuditAction.LOGIN, user.id, user.id)
+
+        return self._issue_tokens(user)
+
+    async def refresh_tokens(self, refresh_token: str) -> Token:
+        """
+        Cambia un refresh token válido por un par nuevo (rotación: el usado
+        queda revocado). El rol y la versión se leen de nuevo del usuario.
+
+        Raises:
+            UnauthorizedException: Si el usuario ya no existe o está desactivado
+        """
+        claims = verify_refresh_token(refresh_token)
+        user_doc = await self.user_repo.get_by_id(claims.user_id)
+        if not user_doc:
+            raise UnauthorizedException("Usuario no encontrado")
+        user = User(**user_doc)
+        if not user.is_active:
+            raise UnauthorizedException("Usuario desactivado")
+
+        await self._revoke(claims)
+        return self._issue_tokens(user)
+
+    async def logout(
+        self, principal: TokenData, refresh_token: Optional[str] = None
+    ) -> None:
+        """
+        Revoca el access token actual y, si se envía, el refresh token.
+        """
+        await self._revoke(principal)
+        if refresh_token:
+            claims = verify_refresh_token(refresh_token)
+            if claims.user_id != principal.user_id:
+                raise UnauthorizedException("El refresh token no pertenece a este usuario")
+            await self._revoke(claims)
+        audit_log.record(AuditAction.LOGOUT, principal.user_id, principal.user_id)
+
+    async def sync_revocations(self) -> int:
+        """
+        Recarga en memoria los tokens revocados vigentes (también los revocados
+        en otros workers). Devuelve cuántos hay.
+        """
+        jtis = await self.revocation_repo.list_active()
+        revoked_tokens.load(jtis)
+        return len(jtis)
+
+    async def _revoke(self, claims: TokenData):
+        if not claims.jti:
+            return  # token emitido antes de que existiera el jti
+        expires_at = claims.expires_at or datetime.utcnow()
+        await self.revocation_repo.revoke(claims.jti, claims.user_id, expires_at)
+        revoked_tokens.add(claims.jti, expires_at.replace(tzinfo=timezone.utc).timestamp())
+
+    def _issue_tokens(self, user: User) -> Token:
+        # Token JWT con el ID, rol y versión de token del usuario
         access_token = create_access_token(
-            data={"sub": user.id, "role": user.role.value}
+            data={"sub": user.id, "role": user.role.value, "ver": user.token_version}
+        )
+        return Token(
+            access_token=access_token,
+            token_type="bearer",
+            refresh_token=create_refresh_token(user.id),
         )
-
-        return Token(access_token=access_token, token_type="bearer")
 
     async def get_user_by_id(self, user_id: str) -> UserResponse:
         """
@@ -167,13 +281,166 @@ class UserService:
             for doc in users_docs
         ]
 
-    async def update_user(self, user_id: str, update_data: UserUpdate) -> UserResponse:
+    async def get_user_fields(self, user_id: str, fields: Sequence[str]) -> dict:
+        """
+        Usuario como dict con solo `fields` (más _id y campos de versión),
+        leído con proyección y sin construir modelos.
+        """
+        user_doc = await self.user_repo.get_by_id(user_id, fields=fields)
+        if not user_doc:
+            raise NotFoundException(f"Usuario con ID {user_id} no encontrado")
+        return user_doc
+
+    async def get_users_fields(
+        self, fields: Sequence[str], skip: int = 0, limit: int = 100
+    ) -> List[dict]:
+        """
+        Página de usuarios como dicts con solo `fields` (más _id y campos de versión).
+        """
+        return await self.user_repo.list(skip=skip, limit=limit, fields=fields)
+
+    async def get_users_by_ids(self, user_ids: List[str]) -> UserBatchGetResponse:
+        """
+        Obtiene varios usuarios en una sola consulta.
+        Mantiene el orden de entrada e informa los ids que no existen.
+        """
+        users_docs, missing = await self.user_repo.find_by_ids(user_ids)
+
+        return UserBatchGetResponse(
+            users=[
+                UserResponse(
+                    _id=doc["_id"],
+                    email=doc["email"],
+                    username=doc["username"],
+                    full_name=doc["full_name"],
+                    role=doc["role"],
+                    is_active=doc["is_active"],
+                    created_at=doc["created_at"],
+                    updated_at=doc.get("updated_at"),
+                )
+                for doc in users_docs
+            ],
+            missing=missing,
+        )
+
+    async def get_user_version(
+        self, user_id: str, *scope: object
+    ) -> Tuple[str, Optional[datetime]]:
+        """
+        ETag y fecha de última modificación de un usuario, leyendo solo esos campos.
+        """
+        doc = await self.user_repo.get_version(user_id)
+        return (
+            resource_etag(
+                doc["_id"], doc.get("updated_at"), doc.get("created_at"), *scope
+            ),
+            doc.get("updated_at") or doc.get("created_at"),
+        )
+
+    async def get_users_page_version(
+        self, skip: int = 0, limit: int = 100, *scope: object
+    ) -> Tuple[str, Optional[datetime]]:
+        """
+        ETag y última modificación de una página de usuarios (digest de sus versiones).
+        """
+        docs = await self.user_repo.list_versions(skip=skip, limit=limit)
+        versions = [
+            (doc["_id"], doc.get("updated_at"), doc.get("created_at")) for doc in docs
+        ]
+        return (
+            collection_etag(versions, skip, limit, *scope),
+            last_modified((u, c) for _, u, c in versions),
+        )
+
+    async def get_user_changes(
+        self, since: Optional[str] = None, limit: int = 100
+    ) -> UserChangesResponse:
+        """
+        Cambios de usuarios posteriores al cursor `since` (sync delta).
+
+        Sin `since` devuelve solo el cursor actual: el cliente hace un listado
+        completo y desde ahí pide únicamente los cambios.
+        """
+        if since is None:
+            cursor = await self.user_repo.current_sequence()
+            return UserChangesResponse(changes=[], cursor=str(cursor))
+
+        try:
+            since_seq = int(since)
+        except ValueError:
+            raise ValidationException("Cursor inválido")
+
+        docs, has_more = await self.user_repo.get_changes(since_seq, limit)
+
+        changes = []
+        for doc in docs:
+            if doc.get("deleted"):
+                changes.append(UserChange(id=doc["_id"], deleted=True))
+                continue
+            changes.append(
+                UserChange(
+                    id=doc["_id"],
+                    user=UserResponse(
+                        _id=doc["_id"],
+                        email=doc["email"],
+                        username=doc["username"],
+                        full_name=doc["full_name"],
+                        role=doc["role"],
+                        is_active=doc["is_active"],
+                        created_at=doc["created_at"],
+                        updated_at=doc.get("updated_at"),
+                    ),
+                )
+            )
+
+        cursor = docs[-1]["change_seq"] if docs else since_seq
+        return UserChangesResponse(
+            changes=changes, cursor=str(cursor), has_more=has_more
+        )
+
+    async def count_users(self) -> int:
+        """
+        Total de usuarios vivos para X-Total-Count. Sale de los contadores
+        materializados: el total de la colección incluiría las bajas lógicas.
+        """
+        return (await self.user_repo.get_stats())["total"]
+
+    async def get_user_stats(self) -> UserStats:
+        """
+        Conteos por rol y por estado desde los contadores materializados.
+        """
+        return UserStats(**await self.user_repo.get_stats())
+
+    async def reconcile_user_stats(self) -> UserStats:
+        """
+        Recalcula los contadores materializados desde la colección de usuarios.
+        """
+        return UserStats(**await self.user_repo.reconcile_stats())
+
+    async def sync_token_versions(self) -> int:
+        """
+        Carga en el registro del proceso las versiones de token cambiadas
+        (por ejemplo, en otro worker). Devuelve cuántas se leyeron.
+
+        Tras la primera lectura completa solo se leen los usuarios actualizados
+        desde la sincronización anterior (con un margen de solapamiento).
+        """
+        started = datetime.utcnow()
+        versions = await self.user_repo.get_token_versions(token_versions.synced_until)
+        token_versions.load(versions)
+        token_versions.synced_until = started - _TOKEN_VERSION_SYNC_OVERLAP
+        return len(versions)
+
+    async def update_user(
+        self, user_id: str, update_data: UserUpdate, actor_id: Optional[str] = None
+    ) -> UserResponse:
         """
         Actualiza un usuario existente.
 
         Args:
             user_id: ID del usuario a actualizar
             update_data: Datos a actualizar (todos opcionales)
+            actor_id: Usuario que hace la acción (para auditoría)
 
         Returns:
             Usuario actualizado
@@ -227,12 +494,27 @@ class UserService:
         if not update_dict:
             return await self.get_user_by_id(user_id)
 
+        # Un cambio de rol o estado invalida los tokens emitidos con los claims anteriores
+        authz_changed = (
+            "role" in update_dict and update_dict["role"] != existing_user.get("role")
+        ) or (
+            "is_active" in update_dict
+            and update_dict["is_active"] != existing_user.get("is_active", True)
+        )
+        if authz_changed:
+            update_dict["token_version"] = existing_user.get("token_version", 0) + 1
+
         # Actualizamos en el repositorio
         updated_doc = await self.user_repo.update_user(user_id, update_dict)
 
+        if authz_changed:
+            token_versions.bump(user_id, update_dict["token_version"])
+
+        self._audit_update(actor_id, user_id, existing_user, update_dict)
+
         # Convertimos a UserResponse
         user = User(**updated_doc)
-        return UserResponse(
+        response = UserResponse(
             _id=user.id,
             email=user.email,
             username=user.username,
@@ -242,13 +524,16 @@ class UserService:
             created_at=user.created_at,
             updated_at=user.updated_at,
         )
+        await self._publish("user.updated", response, updated_doc.get("change_seq"))
+        return response
 
-    async def delete_user(self, user_id: str) -> None:
+    async def delete_user(self, user_id: str, actor_id: Optional[str] = None) -> None:
         """
-        Elimina un usuario (hard delete).
+        Da de baja un usuario (soft delete; se purga pasado el periodo de retención).
 
         Args:
             user_id: ID del usuario a eliminar
+            actor_id: Usuario que hace la acción (para auditoría)
 
         Raises:
             NotFoundException: Si el usuario no existe
@@ -260,3 +545,50 @@ class UserService:
 
         # Eliminamos
         await self.user_repo.delete_user(user_id)
+        audit_log.record(
+            AuditAction.USER_DELETED,
+            actor_id,
+            user_id,
+            {"username": existing_user.get("username")},
+        )
+        await user_events.publish("user.deleted", {"_id": user_id})
+
+    def _audit_update(
+        self, actor_id: Optional[str], user_id: str, before: dict, changes: dict
+    ):
+        """
+        Registra la actualización y, aparte, los cambios de rol y las desactivaciones.
+        Nunca se guardan contraseñas ni hashes: solo el nombre del campo.
+        """
+        fields = sorted(k for k in changes if k != "token_version")
+        audit_log.record(AuditAction.USER_UPDATED, actor_id, user_id, {"fields": fields})
+
+        if "role" in changes and changes["role"] != before.get("role"):
+            audit_log.record(
+                AuditAction.USER_ROLE_CHANGED,
+                actor_id,
+                user_id,
+                {"from": before.get("role"), "to": changes["role"]},
+            )
+        if changes.get("is_active") is False and before.get("is_active", True):
+            audit_log.record(AuditAction.USER_DEACTIVATED, actor_id, user_id)
+
+    def _audit_login_failed(
+        self, login_data: UserLogin, user_id: Optional[str], reason: str
+    ):
+        audit_log.record(
+            AuditAction.LOGIN_FAILED,
+            None,
+            user_id,
+            {"username_or_email": login_data.username_or_email, "reason": reason},
+        )
+
+    async def _publish(
+        self, event_type: str, user: UserResponse, change_seq: Optional[int]
+    ):
+        """
+        Emite el evento a los consoles conectados por SSE.
+        """
+        await user_events.publish(
+            event_type, user.model_dump(mode="json", by_alias=True), change_seq
+        )
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from models.audit import AuditAction
+from services.audit_service import AuditLogger
+
+
+class FakeAuditRepository:
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+
+    async def insert_many(self, records):
+        if self.fail:
+            raise RuntimeError("mongo caído")
+        self.batches.append(list(records))
+        return len(records)
+
+
+@pytest.mark.asyncio
+async def test_records_are_written_in_batches_and_flushed_on_stop(tmp_path):
+    """Se agrupa por tamaño de lote y stop() escribe lo que quede en cola."""
+    repo = FakeAuditRepository()
+    logger = AuditLogger(100, 3, 60, str(tmp_path / "spill.jsonl"))
+    await logger.start(repo)
+
+    for i in range(5):
+        logger.record(AuditAction.LOGIN, f"u{i}", f"u{i}")
+    await asyncio.sleep(0.01)
+    assert [len(b) for b in repo.batches] == [3]
+
+    await logger.stop()
+    assert sum(len(b) for b in repo.batches) == 5
+    assert logger.stats["written"] == 5
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_are_spilled_and_replayed(tmp_path):
+    """Si la base de datos falla, el lote va al archivo y se reenvía después."""
+    spill = tmp_path / "spill.jsonl"
+    repo = FakeAuditRepository()
+    logger = AuditLogger(100, 10, 60, str(spill))
+    logger.repo = repo
+
+    repo.fail = True
+    await logger._write([{"action": "auth.login", "details": {}}])
+    assert spill.exists()
+
+    repo.fail = False
+    await logger._write([{"action": "user.created", "details": {}}])
+    actions = [r["action"] for b in repo.batches for r in b]
+    assert actions == ["user.created", "auth.login"]
+    assert not spill.exists()
+    assert logger.stats["replayed"] == 1
+
+
+def test_full_queue_spills_instead_of_blocking(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    logger = AuditLogger(1, 10, 60, str(spill))
+
+    logger.record(AuditAction.USER_CREATED, None, "a")
+    logger.record(AuditAction.USER_CREATED, None, "b")
+
+    assert logger.queue.qsize() == 1
+    assert logger.stats["spilled"] == 1
+    assert '"target_id": "b"' in spill.read_text()
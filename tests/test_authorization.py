@@ -0,0 +1,74 @@
+import pytest
+from fastapi import HTTPException
+from models.user import UserRole
+from utils.auth_manager import create_access_token, verify_token
+from utils.authorization import PERMISSION_MATRIX, Permission, has_permission
+from utils.token_versions import token_versions
+
+
+def test_permission_matrix_covers_every_role():
+    """Cada rol tiene entrada y solo admin puede gestionar/eliminar."""
+    assert set(PERMISSION_MATRIX) == set(UserRole)
+    assert has_permission("admin", Permission.USERS_DELETE)
+    assert not has_permission("quality", Permission.USERS_DELETE)
+    assert has_permission("viewer", Permission.USERS_READ)
+    assert not has_permission(None, Permission.USERS_READ)
+
+
+def test_token_with_superseded_version_is_rejected(monkeypatch):
+    """Tras un cambio de rol, los tokens con la versión anterior dejan de valer."""
+    monkeypatch.setattr(token_versions, "_versions", {})
+    token = create_access_token({"sub": "u-version", "role": "admin", "ver": 0})
+    assert verify_token(token).role == "admin"
+
+    token_versions.bump("u-version", 1)
+    with pytest.raises(HTTPException) as exc:
+        verify_token(token)
+    assert exc.value.status_code == 401
+
+    fresh = create_access_token({"sub": "u-version", "role": "viewer", "ver": 1})
+    assert verify_token(fresh).token_version == 1
+
+
+def test_revoked_jti_is_rejected_and_refresh_tokens_are_not_access_tokens():
+    """Un token revocado deja de valer; un refresh token no sirve como access token."""
+    from utils.auth_manager import create_refresh_token, verify_refresh_token
+    from utils.revocation import revoked_tokens
+
+    token = create_access_token({"sub": "u-logout", "role": "viewer"})
+    claims = verify_token(token)
+    assert claims.jti
+
+    revoked_tokens.add(claims.jti)
+    with pytest.raises(HTTPException):
+        verify_token(token)
+
+    refresh = create_refresh_token("u-logout")
+    assert verify_refresh_token(refresh).user_id == "u-logout"
+    with pytest.raises(HTTPException):
+        verify_token(refresh)
+
+
+@pytest.mark.asyncio
+async def test_token_version_sync_is_incremental_after_first_load(monkeypatch):
+    """Tras la primera carga completa solo se piden los usuarios actualizados después."""
+    from services.user_service import UserService
+
+    class Repo:
+        def __init__(self):
+            self.calls = []
+
+        async def get_token_versions(self, since=None):
+            self.calls.append(since)
+            return [("u-sync", len(self.calls))]
+
+    monkeypatch.setattr(token_versions, "_versions", {})
+    monkeypatch.setattr(token_versions, "synced_until", None)
+    repo = Repo()
+    service = UserService(repo, revocation_repo=object())
+    await service.sync_token_versions()
+    await service.sync_token_versions()
+
+    assert repo.calls[0] is None
+    assert repo.calls[1] is not None and repo.calls[1] <= token_versions.synced_until
+    assert not token_versions.is_current("u-sync", 1)
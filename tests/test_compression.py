@@ -0,0 +1,60 @@
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from utils.compression import CompressionMiddleware, negotiate
+
+BIG = b'{"usuarios": "' + b"x" * 5000 + b'"}'
+
+
+def make_client():
+    app = FastAPI()
+
+    @app.get("/big")
+    async def big():
+        return Response(BIG, media_type="application/json", headers={"ETag": '"v1"'})
+
+    @app.get("/small")
+    async def small():
+        return Response(b"{}", media_type="application/json")
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for _ in range(3):
+                yield BIG
+
+        return StreamingResponse(chunks(), media_type="application/json")
+
+    middleware = CompressionMiddleware(app, minimum_size=1024, cache_entries=8)
+    return TestClient(middleware), middleware
+
+
+def test_negotiation_respects_q_values():
+    encoders = {"zstd": None, "br": None, "gzip": None}
+    assert negotiate("gzip, br", encoders) == "br"
+    assert negotiate("br;q=0, gzip", encoders) == "gzip"
+    assert negotiate("identity", encoders) is None
+
+
+def test_large_responses_are_compressed_and_cached_by_etag():
+    client, middleware = make_client()
+    headers = {"Accept-Encoding": "gzip"}
+
+    r = client.get("/big", headers=headers)
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["etag"] == 'W/"v1"'
+    assert r.content == BIG  # httpx descomprime
+
+    client.get("/big", headers=headers)
+    assert middleware.stats["cache_hits"] == 1
+
+    r = client.get("/small", headers=headers)
+    assert "content-encoding" not in r.headers
+
+
+def test_streaming_responses_are_compressed_incrementally():
+    client, _ = make_client()
+    r = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "content-length" not in r.headers
+    assert r.content == BIG * 3
@@ -0,0 +1,58 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pymongo.errors import ExecutionTimeout
+from core import deadline
+from core.deadline import DeadlineMiddleware, database_exception_handler
+from exceptions import DatabaseException
+
+
+def make_client():
+    app = FastAPI()
+    app.state.finished = False
+    app.add_exception_handler(DatabaseException, database_exception_handler)
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(5)
+        app.state.finished = True
+        return {}
+
+    @app.get("/remaining")
+    async def remaining():
+        return {"remaining": deadline.remaining()}
+
+    @app.get("/mongo-timeout")
+    async def mongo_timeout():
+        try:
+            raise ExecutionTimeout("operation exceeded time limit", 50)
+        except Exception as e:
+            raise DatabaseException(f"Error de base de datos: {e}")
+
+    @app.get("/broken")
+    async def broken():
+        raise DatabaseException("fallo")
+
+    middleware = DeadlineMiddleware(
+        app, default_seconds=5, max_seconds=10, routes={"/stream": None}
+    )
+    return TestClient(middleware), app
+
+
+def test_expired_request_is_cancelled_with_504():
+    client, app = make_client()
+    r = client.get("/slow", headers={"X-Request-Timeout": "0.05"})
+    assert r.status_code == 504
+    assert app.state.finished is False
+
+
+def test_header_is_capped_and_visible_to_the_endpoint():
+    client, _ = make_client()
+    left = client.get("/remaining", headers={"X-Request-Timeout": "999"}).json()
+    assert 9 < left["remaining"] <= 10
+
+
+def test_database_timeouts_map_to_504_and_other_errors_stay_500():
+    client, _ = make_client()
+    assert client.get("/mongo-timeout").status_code == 504
+    assert client.get("/broken").status_code == 500
@@ -0,0 +1,65 @@
+import io
+from datetime import datetime
+import pytest
+from bson import ObjectId, encode
+from bson.raw_bson import RawBSONDocument
+from cli.dump_users import dump_collection, load_collection
+from utils.dump_format import CODECS, DumpFormatError
+
+
+def raw_users(n):
+    return [
+        RawBSONDocument(
+            encode(
+                {
+                    "_id": ObjectId(f"{i:024x}"),
+                    "username": f"u{i}",
+                    "created_at": datetime(2025, 1, 1),
+                    "deleted_at": None,
+                    "change_seq": i,
+                }
+            )
+        )
+        for i in range(n)
+    ]
+
+
+class DummyRepo:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.batches = []
+
+    async def iter_raw(self, batch_size=1000):
+        for doc in self.docs:
+            yield doc
+
+    async def insert_raw(self, docs):
+        self.batches.append(docs)
+        return len(docs)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("codec", sorted(CODECS))
+async def test_dump_and_restore_round_trip(codec):
+    source = DummyRepo(raw_users(25))
+    buffer = io.BytesIO()
+    writer = await dump_collection(source, buffer, codec=codec, frame_size=10)
+    assert writer.documents == 25
+
+    target = DummyRepo()
+    buffer.seek(0)
+    assert await load_collection(target, buffer, workers=2) == 25
+    assert sorted(len(b) for b in target.batches) == [5, 10, 10]
+    restored = sorted(doc.raw for batch in target.batches for doc in batch)
+    assert restored == sorted(doc.raw for doc in source.docs)
+
+
+@pytest.mark.asyncio
+async def test_truncated_dump_is_rejected():
+    buffer = io.BytesIO()
+    await dump_collection(DummyRepo(raw_users(25)), buffer, frame_size=10)
+    truncated = io.BytesIO(buffer.getvalue()[:-20])
+    with pytest.raises(DumpFormatError):
+        await load_collection(DummyRepo(), truncated)
+    with pytest.raises(DumpFormatError):
+        await load_collection(DummyRepo(), io.BytesIO(b"not a dump"))
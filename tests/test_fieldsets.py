@@ -0,0 +1,27 @@
+import json
+import pytest
+from datetime import datetime
+from fastapi import HTTPException
+from models.user import UserResponse
+from utils.fieldsets import parse_fields, projection, sparse_json_response
+
+
+def test_fields_are_validated_against_the_response_model():
+    """Se aceptan nombres y alias del modelo; campos privados se rechazan."""
+    assert parse_fields(None, UserResponse) is None
+    assert parse_fields("id, username,role,username", UserResponse) == [
+        "_id",
+        "username",
+        "role",
+    ]
+    with pytest.raises(HTTPException):
+        parse_fields("username,hashed_password", UserResponse)
+
+
+def test_sparse_response_serializes_only_requested_fields():
+    fields = ["_id", "created_at"]
+    assert projection(fields) == {"_id": 1, "created_at": 1, "updated_at": 1}
+
+    doc = {"_id": "1", "created_at": datetime(2025, 1, 1), "email": "a@b.co"}
+    body = json.loads(sparse_json_response([doc], fields).body)
+    assert body == [{"_id": "1", "created_at": "2025-01-01T00:00:00"}]
@@ -0,0 +1,37 @@
+from datetime import datetime
+from fastapi import Request
+from utils.http_cache import collection_etag, is_not_modified, resource_etag
+
+
+def make_request(headers: dict) -> Request:
+    raw = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "headers": raw})
+
+
+def test_etag_changes_with_updated_at():
+    created = datetime(2025, 1, 1, 10, 0, 0)
+    etag = resource_etag("abc", None, created)
+    assert etag == resource_etag("abc", None, created)
+    assert etag != resource_etag("abc", datetime(2025, 1, 2), created)
+    assert collection_etag([("abc", None, created)], 0, 100) != collection_etag(
+        [("abc", None, created)], 100, 100
+    )
+
+
+def test_conditional_headers():
+    """If-None-Match tiene prioridad; If-Modified-Since compara a nivel de segundos."""
+    modified = datetime(2025, 1, 1, 10, 0, 0, 500000)
+    etag = resource_etag("abc", modified, None)
+
+    assert is_not_modified(make_request({"If-None-Match": f'W/{etag}'}), etag, modified)
+    assert not is_not_modified(make_request({"If-None-Match": '"otro"'}), etag, modified)
+    assert is_not_modified(
+        make_request({"If-Modified-Since": "Wed, 01 Jan 2025 10:00:00 GMT"}),
+        etag,
+        modified,
+    )
+    assert not is_not_modified(
+        make_request({"If-Modified-Since": "Wed, 01 Jan 2025 09:59:59 GMT"}),
+        etag,
+        modified,
+    )
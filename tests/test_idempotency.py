@@ -0,0 +1,60 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from utils.idempotency import (
+    IdempotencyKeys,
+    IdempotencyMiddleware,
+    MemoryIdempotencyStore,
+)
+
+
+def make_app(delay: float = 0):
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/users", status_code=201)
+    async def create(payload: dict):
+        app.state.calls += 1
+        await asyncio.sleep(delay)
+        return {"n": app.state.calls, **payload}
+
+    keys = IdempotencyKeys(
+        MemoryIdempotencyStore(100), ttl_seconds=60, lease_seconds=60, wait_seconds=5
+    )
+    return app, IdempotencyMiddleware(app, keys=keys), keys
+
+
+def test_retry_replays_the_stored_response_without_running_the_endpoint():
+    app, middleware, keys = make_app()
+    client = TestClient(middleware)
+    headers = {"Idempotency-Key": "abc"}
+
+    first = client.post("/users", json={"u": "ana"}, headers=headers)
+    again = client.post("/users", json={"u": "ana"}, headers=headers)
+
+    assert first.status_code == again.status_code == 201
+    assert again.json() == first.json() == {"n": 1, "u": "ana"}
+    assert again.headers["idempotent-replayed"] == "true"
+    assert app.state.calls == 1
+
+    other = client.post("/users", json={"u": "beto"}, headers=headers)
+    assert other.status_code == 422
+    assert keys.stats["mismatches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_wait_for_the_first_request():
+    app, middleware, _ = make_app(delay=0.1)
+    transport = httpx.ASGITransport(app=middleware)
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+        responses = await asyncio.gather(
+            *[
+                client.post("/users", json={"u": "ana"}, headers={"Idempotency-Key": "k"})
+                for _ in range(3)
+            ]
+        )
+
+    assert app.state.calls == 1
+    assert {r.json()["n"] for r in responses} == {1}
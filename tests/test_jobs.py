@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+from models.job import JobKind, JobStatus
+from services.job_runner import JobRunner
+from utils.authorization import Permission
+
+
+class MemoryJobRepository:
+    def __init__(self):
+        self.jobs = {}
+
+    async def requeue_stale(self, stale_seconds):
+        return 0
+
+    async def count_queued(self):
+        return sum(job["status"] == "queued" for job in self.jobs.values())
+
+    async def create(self, job):
+        self.jobs[job["_id"]] = job
+        return {**job, "_id": str(job["_id"])}
+
+    async def claim(self, worker):
+        for job in self.jobs.values():
+            if job["status"] == "queued":
+                job.update(status="running", attempts=job["attempts"] + 1)
+                return dict(job)
+        return None
+
+    async def save_progress(self, job_id, progress, checkpoint=None):
+        job = self.jobs[job_id]
+        job["progress"] = progress
+        if checkpoint is not None:
+            job["checkpoint"] = checkpoint
+        return job["cancel_requested"]
+
+    async def finish(self, job_id, status, progress, result=None, error=None):
+        self.jobs[job_id].update(status=status.value, progress=progress, result=result, error=error)
+
+    async def requeue(self, job_id, progress, checkpoint=None):
+        self.jobs[job_id].update(status="queued", progress=progress, checkpoint=checkpoint)
+
+    async def request_cancel(self, job_id, tenant=None):
+        job = next(j for j in self.jobs.values() if str(j["_id"]) == job_id)
+        job["cancel_requested"] = True
+        return {**job, "_id": str(job["_id"])}
+
+    async def heartbeat(self, job_ids):
+        pass
+
+
+async def wait_for_status(repo, status):
+    for _ in range(200):
+        if any(job["status"] == status for job in repo.jobs.values()):
+            return next(iter(repo.jobs.values()))
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"ninguna tarea llegó a {status}")
+
+
+def make_runner(handler, grace=1.0):
+    runner = JobRunner(
+        workers=1, max_queued=10, poll_seconds=0.05, progress_seconds=0, shutdown_grace=grace
+    )
+    runner.register(JobKind.RECONCILE_USER_STATS, handler, Permission.USERS_MANAGE)
+    return runner
+
+
+@pytest.mark.asyncio
+async def test_job_runs_in_background_and_reports_progress():
+    async def handler(job):
+        for i in range(3):
+            await job.progress(i + 1, total=3)
+        return {"total": job.params["n"]}
+
+    runner, repo = make_runner(handler), MemoryJobRepository()
+    await runner.start(repo)
+    try:
+        await runner.submit(JobKind.RECONCILE_USER_STATS, {"n": 3}, "user-1")
+        job = await wait_for_status(repo, JobStatus.SUCCEEDED.value)
+    finally:
+        await runner.stop()
+    assert job["result"] == {"total": 3}
+    assert job["progress"]["done"] == 3
+    assert runner.stats["succeeded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_running_job_stops_at_next_progress_when_cancelled():
+    started = asyncio.Event()
+
+    async def handler(job):
+        started.set()
+        while True:
+            await job.progress(0)
+            await asyncio.sleep(0.01)
+
+    runner, repo = make_runner(handler), MemoryJobRepository()
+    await runner.start(repo)
+    try:
+        job = await runner.submit(JobKind.RECONCILE_USER_STATS, {}, "user-1")
+        await started.wait()
+        await runner.cancel(job["_id"])
+        await wait_for_status(repo, JobStatus.CANCELLED.value)
+    finally:
+        await runner.stop()
+    assert runner.stats["cancelled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_shutdown_requeues_unfinished_jobs_with_their_checkpoint():
+    async def handler(job):
+        start = (job.checkpoint or {}).get("next", 0)
+        await job.progress(start + 5, checkpoint={"next": start + 5})
+        await asyncio.sleep(10)
+
+    runner, repo = make_runner(handler, grace=0.05), MemoryJobRepository()
+    await runner.start(repo)
+    await runner.submit(JobKind.RECONCILE_USER_STATS, {}, "user-1")
+    await wait_for_status(repo, JobStatus.RUNNING.value)
+    await asyncio.sleep(0.02)
+    await runner.stop()
+
+    job = next(iter(repo.jobs.values()))
+    assert job["status"] == JobStatus.QUEUED.value
+    assert job["checkpoint"] == {"next": 5}
+    assert runner.stats["interrupted"] == 1
@@ -0,0 +1,69 @@
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from sqlalchemy.dialects import postgresql
+from cli.migrate_users import chunk_digests, compare_chunks
+from repositories.user_repository_pg import UserRepositoryPG, row_from_document
+
+
+def make_doc(i, **overrides):
+    doc = {
+        "_id": ObjectId(f"{i:024x}"),
+        "email": f"u{i}@lab.com",
+        "username": f"u{i}",
+        "full_name": f"Usuario {i}",
+        "role": "viewer",
+        "hashed_password": "hash",
+        "is_active": True,
+        "created_at": datetime(2025, 1, 1),
+        "deleted_at": None,
+        "change_seq": i,
+    }
+    doc.update(overrides)
+    return doc
+
+
+async def rows(docs):
+    for doc in docs:
+        yield row_from_document(doc)
+
+
+@pytest.mark.asyncio
+async def test_checksums_locate_the_chunk_that_differs():
+    source = [make_doc(i) for i in range(1, 8)]
+    target = list(source)
+    target[4] = make_doc(5, role="admin")
+
+    a = await chunk_digests(rows(source), chunk_size=3)
+    b = await chunk_digests(rows(target), chunk_size=3)
+
+    assert [c[2] for c in a] == [3, 3, 1]
+    assert compare_chunks(a, a) == []
+    assert compare_chunks(a, b) == [(f"{4:024x}", f"{6:024x}")]
+    assert compare_chunks(a, a[:2]) == [(f"{7:024x}", f"{7:024x}")]
+
+
+@pytest.mark.asyncio
+async def test_upsert_keeps_newer_rows_and_copy_never_overwrites():
+    class RecordingSession:
+        def __init__(self):
+            self.statements = []
+
+        async def execute(self, stmt):
+            self.statements.append(stmt)
+            return type("Result", (), {"rowcount": 1})
+
+        async def commit(self):
+            pass
+
+    session = RecordingSession()
+    repo = UserRepositoryPG(session)
+    await repo.upsert_many([make_doc(1)])
+    await repo.upsert_many([make_doc(1)], overwrite=False)
+
+    upsert, copy = (
+        str(s.compile(dialect=postgresql.dialect())) for s in session.statements
+    )
+    assert "ON CONFLICT (id) DO UPDATE" in upsert
+    assert "users.change_seq <= excluded.change_seq" in upsert
+    assert copy.endswith("ON CONFLICT DO NOTHING")
@@ -41,3 +41,54 @@ async def test_postgres_connect_and_disconnect(monkeypatch):
     await pg.disconnect()
     assert not pg.is_connected
     assert pg.engine.disposed
+
+
+@pytest.mark.asyncio
+async def test_find_by_id_reuses_the_prebuilt_statement():
+    from typing import Optional
+    from sqlmodel import Field, SQLModel
+    from repositories.base_repository_pg import BaseRepositoryPG
+
+    class StatementSample(SQLModel, table=True):
+        id: Optional[int] = Field(default=None, primary_key=True)
+        code: str
+
+    class Result:
+        def scalars(self):
+            return self
+
+        def first(self):
+            return StatementSample(id=7, code="M-7")
+
+    class RecordingSession:
+        def __init__(self):
+            self.calls = []
+
+        async def execute(self, stmt, params=None):
+            self.calls.append((stmt, params))
+            return Result()
+
+    session = RecordingSession()
+    repo = BaseRepositoryPG(StatementSample, session)
+    assert (await repo.find_by_id("7"))["code"] == "M-7"
+    await repo.find_by_id("8")
+
+    (first, first_params), (second, second_params) = session.calls
+    assert first is second
+    assert (first_params, second_params) == ({"pk": 7}, {"pk": 8})
+
+
+def test_model_serializer_matches_model_dump():
+    from typing import Optional
+    from sqlmodel import Field, SQLModel
+    from repositories.base_repository_pg import serializer_for
+
+    class SerializerSample(SQLModel, table=True):
+        id: Optional[int] = Field(default=None, primary_key=True)
+        code: str
+        value: float = 0.0
+
+    item = SerializerSample(id=1, code="M-1", value=7.5)
+    serialize = serializer_for(SerializerSample)
+    assert serialize is serializer_for(SerializerSample)
+    assert serialize(item) == item.model_dump()
@@ -0,0 +1,54 @@
+import pytest
+from api.endpoints.auth import _authenticate
+from exceptions import TooManyRequestsException
+from models.user import UserLogin
+from utils import rate_limiter as rl
+from utils.rate_limiter import LoginRateLimiter, MemoryRateLimitBackend
+
+
+@pytest.mark.asyncio
+async def test_bucket_rejects_after_burst_and_evicts_refilled_keys(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rl.time, "monotonic", lambda: clock[0])
+    backend = MemoryRateLimitBackend()
+
+    assert await backend.hit("ip:1", 2, 1.0) == 0
+    assert await backend.hit("ip:1", 2, 1.0) == 0
+    assert await backend.hit("ip:1", 2, 1.0) == pytest.approx(1.0)
+
+    clock[0] += 1
+    assert await backend.hit("ip:1", 2, 1.0) == 0
+
+    clock[0] += 10  # el bucket ya se recargó por completo
+    assert backend.evict() == 1
+    assert len(backend) == 0
+
+
+class ExplodingService:
+    async def authenticate_user(self, login_data):
+        raise AssertionError("no debería llegar a la base de datos ni a bcrypt")
+
+
+class FakeRequest:
+    class client:
+        host = "10.0.0.1"
+
+
+@pytest.mark.asyncio
+async def test_login_over_the_limit_is_rejected_before_the_service(monkeypatch):
+    limiter = LoginRateLimiter(MemoryRateLimitBackend(), 100, 60, 1, 1)
+    monkeypatch.setattr("api.endpoints.auth.login_rate_limiter", limiter)
+    login = UserLogin(username_or_email="Ana@lab.com", password="x")
+
+    with pytest.raises(AssertionError):
+        await _authenticate(login, FakeRequest(), ExplodingService())
+
+    with pytest.raises(TooManyRequestsException) as exc:
+        await _authenticate(
+            UserLogin(username_or_email="ana@lab.com", password="y"),
+            FakeRequest(),
+            ExplodingService(),
+        )
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "60"
+    assert limiter.stats["rejected_account"] == 1
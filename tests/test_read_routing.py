@@ -0,0 +1,29 @@
+import contextvars
+from core import read_routing
+from core.read_routing import ReadYourWrites, set_current_user
+
+
+def in_request(user_id, func):
+    """Ejecuta func en un contexto propio, como una petición con ese usuario."""
+
+    def run():
+        set_current_user(user_id)
+        return func()
+
+    return contextvars.copy_context().run(run)
+
+
+def test_writer_reads_from_primary_until_the_window_expires(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(read_routing.time, "monotonic", lambda: clock[0])
+    routing = ReadYourWrites(window_seconds=5)
+
+    in_request("ana", routing.mark_write)
+
+    assert in_request("ana", routing.use_replica) is False
+    assert in_request("beto", routing.use_replica) is True
+    assert in_request(None, routing.use_replica) is True
+
+    clock[0] += 6
+    assert in_request("ana", routing.use_replica) is True
+    assert routing.stats == {"primary_reads": 1, "replica_reads": 3}
@@ -0,0 +1,77 @@
+import pytest
+from pymongo.errors import AutoReconnect, DuplicateKeyError
+from core import resilience
+from core.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, resilient
+from exceptions import DatabaseException, ServiceUnavailableException
+
+
+class FlakyRepo:
+    def __init__(self, breaker, failures, error=AutoReconnect("primary stepped down")):
+        self.breaker = breaker
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    @resilient(retry=True)
+    async def read(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            try:
+                raise self.error
+            except Exception as e:
+                raise DatabaseException(f"Error de base de datos: {e}")
+        return "ok"
+
+    @resilient()
+    async def write(self):
+        self.calls += 1
+        raise AutoReconnect("connection reset")
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(resilience.settings, "DB_READ_RETRIES", 2)
+    monkeypatch.setattr(resilience, "_backoff", lambda attempt: 0)
+
+
+@pytest.mark.asyncio
+async def test_reads_retry_transient_errors_and_writes_do_not():
+    breaker = CircuitBreaker("test", failure_threshold=10, reset_seconds=5)
+    repo = FlakyRepo(breaker, failures=2)
+    assert await repo.read() == "ok"
+    assert repo.calls == 3
+    assert breaker.stats["retries"] == 2
+
+    repo = FlakyRepo(breaker, failures=0)
+    with pytest.raises(ServiceUnavailableException):
+        await repo.write()
+    assert repo.calls == 1
+
+    repo = FlakyRepo(breaker, failures=5, error=DuplicateKeyError("dup"))
+    with pytest.raises(DatabaseException):
+        await repo.read()
+    assert repo.calls == 1  # no es transitorio: no se reintenta
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_fails_fast_and_closes_after_probe(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=10)
+
+    repo = FlakyRepo(breaker, failures=100)
+    with pytest.raises(ServiceUnavailableException):
+        await repo.read()
+    assert breaker.state == OPEN
+
+    calls = repo.calls
+    with pytest.raises(ServiceUnavailableException) as exc:
+        await repo.read()
+    assert repo.calls == calls  # falla al momento, sin tocar la base de datos
+    assert exc.value.headers["Retry-After"] == "10"
+
+    clock[0] += 10
+    assert breaker.state == HALF_OPEN
+    repo.failures = 0
+    assert await repo.read() == "ok"
+    assert breaker.state == CLOSED
@@ -0,0 +1,29 @@
+import time
+from utils.revocation import BloomFilter, RevocationList
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f"jti-{i}")
+
+    assert all(f"jti-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"otro-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_load_keeps_local_revocations_not_yet_in_the_database():
+    revocations = RevocationList(capacity=100)
+    revocations.add("local", time.time() + 60)
+    revocations.add("caducado", time.time() - 1)
+
+    revocations.load(["db-1", "db-2"])
+
+    assert revocations.is_revoked("db-1")
+    assert revocations.is_revoked("local")
+    assert not revocations.is_revoked("caducado")
+    assert not revocations.is_revoked("nunca")
+
+    revocations.load(["db-1", "local"])  # la sincronización ya la incluye
+    assert revocations._pending == {}
+    assert not revocations.is_revoked("db-2")
@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from utils.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_reads_share_one_execution():
+    """Las llamadas concurrentes con la misma clave ejecutan una sola consulta."""
+    flight = SingleFlight("test")
+    executions = 0
+
+    async def fetch():
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.01)
+        return {"_id": "1"}
+
+    results = await asyncio.gather(
+        *(flight.do(("get_by_id", "1"), fetch) for _ in range(10)),
+        flight.do(("get_by_id", "2"), fetch),
+    )
+
+    assert executions == 2
+    assert all(r == {"_id": "1"} for r in results[:10])
+    assert flight.stats()["coalesced"] == 9
+    assert flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_forget_starts_a_fresh_read_after_a_write():
+    """Después de forget, una nueva lectura no se une a la consulta previa."""
+    flight = SingleFlight("test")
+    gate = asyncio.Event()
+
+    async def stale():
+        await gate.wait()
+        return "antes"
+
+    async def fresh():
+        return "después"
+
+    first = asyncio.create_task(flight.do(("get_by_id", "1"), stale))
+    await asyncio.sleep(0)
+    flight.forget("get_by_id")
+    assert await flight.do(("get_by_id", "1"), fresh) == "después"
+
+    gate.set()
+    assert await first == "antes"
+
+
+@pytest.mark.asyncio
+async def test_shared_read_ignores_first_caller_deadline_and_results_are_copies():
+    """La consulta compartida no hereda el deadline del primero y cada uno recibe su copia."""
+    import pymongo
+    from pymongo import _csot
+    from core import deadline
+    from core.tenancy import current_tenant, use_tenant
+
+    flight = SingleFlight("test")
+    seen = []
+
+    async def fetch():
+        seen.append((deadline.remaining(), _csot.get_timeout(), current_tenant()))
+        await asyncio.sleep(0.01)
+        return {"roles": ["admin"]}
+
+    async def with_deadline():
+        deadline._deadline.set(0.0)
+        with pymongo.timeout(0.001), use_tenant("lab-a"):
+            return await flight.do(("get_by_id", "1"), fetch)
+
+    first, second = await asyncio.gather(
+        with_deadline(), flight.do(("get_by_id", "1"), fetch)
+    )
+
+    assert seen == [(None, None, "lab-a")]
+    first["roles"].append("viewer")
+    assert second == {"roles": ["admin"]}
@@ -0,0 +1,94 @@
+import pytest
+from jose import jwt
+from core.config import settings
+from core.database import PostgresDB
+from core.tenancy import (
+    TenantError,
+    TenantRouter,
+    current_tenant,
+    resolve_tenant,
+    use_tenant,
+)
+
+
+def scope(host="api.lims.test", token_claims=None):
+    headers = [(b"host", host.encode())]
+    if token_claims is not None:
+        token = jwt.encode(token_claims, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    return {"type": "http", "path": "/api/v1/users", "headers": headers}
+
+
+@pytest.fixture
+def tenancy(monkeypatch):
+    monkeypatch.setattr(settings, "TENANCY_ENABLED", True)
+    monkeypatch.setattr(settings, "TENANT_HOST_SUFFIX", ".lims.test")
+    monkeypatch.setattr(settings, "TENANT_IDS", [])
+    monkeypatch.setattr(settings, "TENANT_DEFAULT", None)
+    monkeypatch.setattr(settings, "DB_ENGINE", "postgresql")
+
+
+def test_tenant_comes_from_token_or_host(tenancy, monkeypatch):
+    assert resolve_tenant(scope("lab-a.lims.test:8000")) == "lab-a"
+    assert resolve_tenant(scope("other.host", {"sub": "u", "lab": "lab-b"})) == "lab-b"
+    assert resolve_tenant(scope("other.host")) is None
+
+    with pytest.raises(TenantError) as exc:
+        resolve_tenant(scope("lab-a.lims.test", {"sub": "u", "lab": "lab-b"}))
+    assert exc.value.status_code == 403
+
+    monkeypatch.setattr(settings, "TENANT_IDS", ["lab-a"])
+    with pytest.raises(TenantError) as exc:
+        resolve_tenant(scope("lab-z.lims.test"))
+    assert exc.value.status_code == 404
+
+
+class FakeEngine:
+    def __init__(self, uri):
+        self.uri = uri
+        self.disposed = False
+
+    async def dispose(self):
+        self.disposed = True
+
+
+@pytest.mark.asyncio
+async def test_router_evicts_least_recently_used_idle_pools(tenancy):
+    router = TenantRouter(FakeEngine, max_pools=2, idle_seconds=0)
+    initialized = []
+    router.on_open(lambda: _record(initialized))
+
+    engines = {}
+    for tenant in ("a", "b", "a", "c"):
+        await router.prepare(tenant)
+        engines[tenant] = router.postgres_engine(tenant)
+
+    assert engines["a"].uri.endswith("/d_a")
+    assert engines["b"].disposed and not engines["a"].disposed
+    assert initialized == ["a", "b", "c"]
+
+    # Un laboratorio con peticiones en curso conserva su pool
+    router.stats_for("c").in_flight = 1
+    assert await router.evict_idle() == 1
+    assert engines["a"].disposed and not engines["c"].disposed
+    assert router.metrics()["open_pools"]["postgresql"] == 1
+
+
+async def _record(initialized):
+    initialized.append(current_tenant())
+
+
+def test_postgres_handles_follow_the_current_tenant(tenancy, monkeypatch):
+    import core.database
+
+    router = TenantRouter(FakeEngine, max_pools=2, idle_seconds=0)
+    monkeypatch.setattr(core.database, "tenant_router", router)
+    postgres = PostgresDB()
+    postgres.engine = default = FakeEngine("default")
+
+    assert postgres.engine is default
+    with use_tenant("lab-a"):
+        assert postgres.engine.uri.endswith("/d_lab-a")
+        assert postgres.async_session is router.postgres_session("lab-a")
+        assert postgres.replica_session is None
+    assert postgres.engine is default
@@ -0,0 +1,93 @@
+import pytest
+from core import database
+from core.unit_of_work import LazySession
+
+
+class FakeSession:
+    def __init__(self, log):
+        self.log = log
+        self.sync_session = object()
+        self.pending = False
+
+    async def execute(self, statement):
+        self.pending = True
+        self.log.append(("execute", statement))
+
+    async def flush(self):
+        self.log.append(("flush",))
+
+    async def commit(self):
+        self.pending = False
+        self.log.append(("commit",))
+
+    async def rollback(self):
+        self.pending = False
+        self.log.append(("rollback",))
+
+    async def close(self):
+        self.log.append(("close",))
+
+    def in_transaction(self):
+        return self.pending
+
+
+@pytest.fixture
+def factory(monkeypatch):
+    monkeypatch.setattr("core.unit_of_work.apply_statement_timeout", lambda s: None)
+    log = []
+    sessions = []
+
+    def make():
+        sessions.append(FakeSession(log))
+        return sessions[-1]
+
+    make.log = log
+    make.sessions = sessions
+    return make
+
+
+async def _run_dependency(monkeypatch, factory, endpoint):
+    monkeypatch.setattr(database.settings, "DB_ENGINE", "postgresql")
+    monkeypatch.setattr(database.db.postgres, "async_session", factory)
+    gen = database.get_sql_session()
+    session = await gen.__anext__()
+    await endpoint(session)
+    with pytest.raises(StopAsyncIteration):
+        await gen.__anext__()
+
+
+@pytest.mark.asyncio
+async def test_unused_session_never_opens(monkeypatch, factory):
+    async def endpoint(session):
+        assert not session.started
+
+    await _run_dependency(monkeypatch, factory, endpoint)
+    assert factory.sessions == []
+
+
+@pytest.mark.asyncio
+async def test_repository_commits_are_batched_into_one(monkeypatch, factory):
+    async def endpoint(session):
+        await session.execute("INSERT 1")
+        await session.commit()
+        await session.execute("UPDATE 2")
+        await session.commit()
+
+    await _run_dependency(monkeypatch, factory, endpoint)
+    assert len(factory.sessions) == 1
+    assert [entry[0] for entry in factory.log] == [
+        "execute",
+        "flush",
+        "execute",
+        "flush",
+        "commit",
+        "close",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_read_session_commits_immediately(factory):
+    session = LazySession(factory, deferred_commit=False)
+    await session.execute("SELECT 1")
+    await session.commit()
+    assert ("commit",) in factory.log
@@ -0,0 +1,37 @@
+import pytest
+from services.user_events import EventBroadcaster, LocalEventRelay, format_sse
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped_without_blocking_others():
+    """Un suscriptor con la cola llena se descarta; los demás siguen recibiendo."""
+    broadcaster = EventBroadcaster(queue_size=2)
+    slow = broadcaster.subscribe()
+    fast = broadcaster.subscribe()
+
+    for i in range(3):
+        await broadcaster.publish("user.updated", {"_id": str(i)}, i)
+        await fast.get(timeout=0.1)
+
+    assert slow.dropped
+    assert not fast.dropped
+    assert broadcaster.stats()["subscribers"] == 1
+    assert broadcaster.stats()["dropped_subscribers"] == 1
+
+
+@pytest.mark.asyncio
+async def test_relay_fans_out_to_other_workers_without_echo():
+    """Con un relay local, el evento llega una vez a cada worker."""
+    relay = LocalEventRelay()
+    worker_a = EventBroadcaster(queue_size=10, relay=relay)
+    worker_b = EventBroadcaster(queue_size=10, relay=relay)
+    await worker_a.start()
+    await worker_b.start()
+    sub_a, sub_b = worker_a.subscribe(), worker_b.subscribe()
+
+    await worker_a.publish("user.created", {"_id": "1"}, 7)
+
+    assert sub_a.queue.qsize() == 1
+    event = await sub_b.get(timeout=0.1)
+    assert event["type"] == "user.created"
+    assert format_sse(event).startswith("id: 7\nevent: user.created\ndata: ")
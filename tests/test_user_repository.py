@@ -0,0 +1,245 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from bson import ObjectId
+from repositories.user_repository import UserRepository
+from repositories.user_stats_repository import UserStatsRepository
+from repositories.change_feed import merge_changes
+
+
+class DummyCursor:
+    def __init__(self, docs):
+        self.docs = docs
+        self.batch = None
+        self.closed = False
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def sort(self, field, direction=1):
+        self.docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def batch_size(self, n):
+        self.batch = n
+        return self
+
+    async def close(self):
+        self.closed = True
+
+    async def to_list(self, length=None):
+        return [dict(d) for d in self.docs]
+
+    def __aiter__(self):
+        self._it = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return dict(next(self._it))
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class DummyDatabase(dict):
+    def __missing__(self, name):
+        collection = self[name] = DummyCollection()
+        return collection
+
+
+class DummyCollection:
+    """Colección en memoria con el subconjunto de la API de Motor que usamos."""
+
+    def __init__(self, docs=None):
+        self.docs = list(docs or [])
+        self.queries = []
+        self.database = DummyDatabase()
+
+    def with_options(self, **kwargs):
+        return self
+
+    def find(self, query=None, *args, **kwargs):
+        query = query or {}
+        self.queries.append(query)
+        hidden = [k for k, v in (kwargs.get("projection") or {}).items() if not v]
+        self.cursor = DummyCursor(
+            [
+                {k: v for k, v in d.items() if k not in hidden}
+                for d in self.docs
+                if self._matches(d, query)
+            ]
+        )
+        return self.cursor
+
+    @staticmethod
+    def _matches(doc, query):
+        wanted = query.get("_id", {}).get("$in")
+        if wanted is not None and doc["_id"] not in wanted:
+            return False
+        seq = query.get("change_seq", {})
+        if "$gt" in seq and not doc.get("change_seq", 0) > seq["$gt"]:
+            return False
+        if "$lte" in seq and not doc.get("change_seq", 0) <= seq["$lte"]:
+            return False
+        before = query.get("deleted_at", {}).get("$lt")
+        if before is not None and not (doc.get("deleted_at") and doc["deleted_at"] < before):
+            return False
+        return True
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(dict(d) for d in docs)
+
+    async def delete_many(self, query):
+        kept = [d for d in self.docs if not self._matches(d, query)]
+        result = type("Result", (), {"deleted_count": len(self.docs) - len(kept)})
+        self.docs = kept
+        return result
+
+
+class DummyCounters:
+    """Contador de change_seq: simula la reserva (pipeline) y su liberación ($pull)."""
+
+    def __init__(self):
+        self.doc = None
+
+    async def find_one_and_update(self, query, pipeline, upsert=False, return_document=None):
+        doc = self.doc or {"_id": query["_id"], "seq": 0, "pending": []}
+        doc["seq"] += 1
+        doc["pending"].append({"seq": doc["seq"], "at": datetime.utcnow()})
+        self.doc = doc
+        return dict(doc)
+
+    async def update_one(self, query, update):
+        seq = update["$pull"]["pending"]["$or"][0]["seq"]
+        self.doc["pending"] = [p for p in self.doc["pending"] if p["seq"] != seq]
+
+    async def find_one(self, query):
+        return self.doc
+
+
+@pytest.mark.asyncio
+async def test_find_by_ids_keeps_order_and_reports_missing():
+    """find_by_ids hace una sola consulta, respeta el orden y reporta faltantes."""
+    a, b, ghost = ObjectId(), ObjectId(), ObjectId()
+    collection = DummyCollection(
+        [{"_id": a, "username": "ana"}, {"_id": b, "username": "beto"}]
+    )
+    repo = UserRepository(collection)
+
+    docs, missing = await repo.find_by_ids(
+        [str(b), "no-es-un-id", str(a), str(ghost), str(b)]
+    )
+
+    assert [d["username"] for d in docs] == ["beto", "ana"]
+    assert docs[0]["_id"] == str(b)
+    assert missing == ["no-es-un-id", str(ghost)]
+    assert len(collection.queries) == 1
+
+
+def test_stats_deltas_for_role_and_status_changes():
+    """Los contadores se ajustan en ambos sentidos y se omiten los ceros."""
+    deltas = UserStatsRepository._deltas
+
+    assert deltas(None, {"role": "viewer", "is_active": True}) == {
+        "total": 1,
+        "active": 1,
+        "roles.viewer": 1,
+    }
+    assert deltas(
+        {"role": "viewer", "is_active": True}, {"role": "admin", "is_active": False}
+    ) == {"active": -1, "inactive": 1, "roles.viewer": -1, "roles.admin": 1}
+    assert deltas({"role": "auditor", "is_active": True}, None) == {
+        "total": -1,
+        "active": -1,
+        "roles.auditor": -1,
+    }
+
+
+def test_merge_changes_stops_at_the_safe_horizon():
+    """Si una fuente llena la página, el cursor no salta cambios de esa fuente."""
+    changed = [{"_id": "a", "change_seq": 1}, {"_id": "b", "change_seq": 5}]
+    deleted = [{"_id": "c", "change_seq": 3, "deleted": True}]
+
+    page, has_more = merge_changes(changed, deleted, limit=2)
+
+    assert [d["change_seq"] for d in page] == [1, 3]
+    assert has_more
+
+    page, has_more = merge_changes(changed[:1], deleted, limit=5)
+    assert [d["change_seq"] for d in page] == [1, 3]
+    assert not has_more
+
+
+@pytest.mark.asyncio
+async def test_purge_deleted_archives_old_soft_deletes_in_batches():
+    """Solo se purgan las bajas antiguas, por lotes, y se archivan sin el hash."""
+    now = datetime.utcnow()
+    old = now - timedelta(days=60)
+    docs = [
+        {"_id": ObjectId(), "deleted_at": old, "hashed_password": "x"} for _ in range(5)
+    ]
+    docs.append({"_id": ObjectId(), "deleted_at": now})  # baja reciente
+    docs.append({"_id": ObjectId(), "deleted_at": None})  # usuario vivo
+    collection = DummyCollection(docs)
+    archive = DummyCollection()
+    repo = UserRepository(collection)
+
+    purged = await repo.purge_deleted(
+        now - timedelta(days=30),
+        archive=archive,
+        batch_size=2,
+        exclude_fields=("hashed_password",),
+    )
+
+    assert purged == 5
+    assert len(collection.docs) == 2
+    assert len(archive.docs) == 5
+    assert not any("hashed_password" in d for d in archive.docs)
+    assert len(collection.queries) == 3  # lotes de 2, 2 y 1
+
+
+@pytest.mark.asyncio
+async def test_iter_all_streams_live_documents_in_batches():
+    docs = [{"_id": ObjectId(), "username": f"u{i}", "deleted_at": None} for i in range(5)]
+    collection = DummyCollection(docs)
+    repo = UserRepository(collection, stats_repo=UserStatsRepository(DummyCollection()))
+
+    seen = [doc["_id"] async for doc in repo.iter_all(batch_size=2)]
+
+    assert seen == [str(d["_id"]) for d in docs]
+    assert collection.queries[-1] == {"deleted_at": {"$type": "null"}}
+    assert collection.cursor.batch == 2
+    assert collection.cursor.closed
+
+
+@pytest.mark.asyncio
+async def test_change_feed_waits_for_writes_that_reserved_a_lower_seq():
+    """Si el cambio 2 se escribe antes que el 1, el feed no lo entrega hasta que llega el 1."""
+    collection = DummyCollection()
+    collection.database["counters"] = DummyCounters()
+    repo = UserRepository(collection, stats_repo=UserStatsRepository(DummyCollection()))
+    first_reserved, second_written = asyncio.Event(), asyncio.Event()
+
+    async def slow_writer():
+        async with repo._reserve_sequence() as seq:
+            first_reserved.set()
+            await second_written.wait()
+            collection.docs.append({"_id": "a", "change_seq": seq, "deleted_at": None})
+
+    async def fast_writer():
+        await first_reserved.wait()
+        async with repo._reserve_sequence() as seq:
+            collection.docs.append({"_id": "b", "change_seq": seq, "deleted_at": None})
+
+    slow = asyncio.create_task(slow_writer())
+    await fast_writer()
+    assert await repo.current_sequence() == 0
+    assert await repo.get_changes(0) == ([], False)
+
+    second_written.set()
+    await slow
+    changes, has_more = await repo.get_changes(0)
+    assert [c["_id"] for c in changes] == ["a", "b"]
+    assert not has_more
+    assert await repo.current_sequence() == 2
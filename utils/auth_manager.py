@@ -1,3 +1,4 @@
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -5,6 +6,10 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from core.config import settings
 from models.user import TokenData
+from utils.token_versions import token_versions
+from utils.revocation import revoked_tokens
+from core.read_routing import set_current_user
+from core.tenancy import current_tenant
 
 # OAuth2PasswordBearer: maneja el token en el header "Authorization: Bearer <token>"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_PREFIX}/auth/token")
@@ -28,13 +33,76 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    # Agregamos la fecha de expiración al token
-    to_encode.update({"exp": expire})
+    # Agregamos la fecha de expiración, la época de autorización y un id único
+    # (jti) para poder revocar este token concreto
+    to_encode.update({"exp": expire, "epoch": settings.AUTHZ_EPOCH})
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    to_encode.setdefault("type", "access")
+    # Multi-laboratorio: el token solo vale en el laboratorio que lo emitió
+    if current_tenant() is not None:
+        to_encode.setdefault(settings.TENANT_CLAIM, current_tenant())
     
     # Creamos el token usando nuestra clave secreta
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
 
+def create_refresh_token(user_id: str) -> str:
+    """
+    Crea un refresh token (válido REFRESH_TOKEN_EXPIRE_DAYS) que solo sirve
+    para pedir un nuevo access token en /auth/refresh.
+    """
+    return create_access_token(
+        data={"sub": user_id, "type": "refresh"},
+        expires_delta=timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="No se pudieron validar las credenciales",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _decode(token: str, token_type: str) -> dict:
+    """
+    Decodifica y valida lo común a ambos tipos de token (firma, expiración,
+    tipo, época y revocación). Lanza 401 si algo no cuadra.
+    """
+    credentials_exception = _credentials_exception()
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+
+    if payload.get("sub") is None or payload.get("type", "access") != token_type:
+        raise credentials_exception
+    # Tokens de otra época ya no reflejan los permisos del usuario
+    if payload.get("epoch", 0) != settings.AUTHZ_EPOCH:
+        raise credentials_exception
+    # Multi-laboratorio: token emitido en otro laboratorio (o antes de activarlo)
+    if settings.TENANCY_ENABLED and payload.get(settings.TENANT_CLAIM) != current_tenant():
+        raise credentials_exception
+    # Revocados (logout o rotación): comprobación en memoria, sin I/O
+    jti = payload.get("jti")
+    if jti and revoked_tokens.is_revoked(jti):
+        raise credentials_exception
+    return payload
+
+def _token_data(payload: dict) -> TokenData:
+    return TokenData(
+        user_id=payload["sub"],
+        role=payload.get("role"),
+        token_version=payload.get("ver", 0),
+        jti=payload.get("jti"),
+        expires_at=datetime.utcfromtimestamp(payload["exp"]) if "exp" in payload else None,
+    )
+
+def verify_refresh_token(token: str) -> TokenData:
+    """
+    Verifica un refresh token. Raises HTTPException 401 si es inválido.
+    """
+    return _token_data(_decode(token, "refresh"))
+
 def verify_token(token: str) -> TokenData:
     """
     Verifica y decodifica un token JWT.
@@ -48,24 +116,18 @@ def verify_token(token: str) -> TokenData:
     Raises:
         HTTPException si el token es inválido
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="No se pudieron validar las credenciales",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    try:
-        # Decodificamos el token
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        user_id: str = payload.get("sub")  # "sub" contiene el ID del usuario
-        role: str = payload.get("role")
-        
-        if user_id is None:
-            raise credentials_exception
-            
-        return TokenData(user_id=user_id, role=role)
-    except JWTError:
-        raise credentials_exception
+    # Firma, expiración, tipo, época y revocación
+    payload = _decode(token, "access")
+    token_data = _token_data(payload)
+
+    # Tokens con una versión superada (cambio de rol/estado) ya no reflejan
+    # los permisos del usuario
+    if not token_versions.is_current(token_data.user_id, token_data.token_version):
+        raise _credentials_exception()
+
+    # Para enrutar sus lecturas (réplica o primario si acaba de escribir)
+    set_current_user(token_data.user_id)
+    return token_data
 
 async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> str:
     """
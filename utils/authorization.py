@@ -0,0 +1,65 @@
+from enum import Enum
+from typing import Dict, FrozenSet, Optional
+from fastapi import Depends, HTTPException, status
+from models.user import TokenData, UserRole
+from utils.auth_manager import oauth2_scheme, verify_token
+
+
+class Permission(str, Enum):
+    USERS_READ = "users:read"
+    USERS_UPDATE_ANY = "users:update_any"  # editar a otros usuarios
+    USERS_MANAGE = "users:manage"  # cambiar rol o estado activo
+    USERS_DELETE = "users:delete"
+    METRICS_READ = "metrics:read"
+    AUDIT_READ = "audit:read"
+
+
+# Matriz de permisos por rol, calculada una sola vez al importar
+PERMISSION_MATRIX: Dict[UserRole, FrozenSet[Permission]] = {
+    UserRole.ADMIN: frozenset(Permission),
+    UserRole.QUALITY: frozenset({Permission.USERS_READ, Permission.AUDIT_READ}),
+    UserRole.TECHNICIAN: frozenset({Permission.USERS_READ}),
+    UserRole.AUDITOR: frozenset({Permission.USERS_READ, Permission.AUDIT_READ}),
+    UserRole.VIEWER: frozenset({Permission.USERS_READ}),
+}
+
+# Misma matriz indexada por el valor del claim "role" (evita convertir a Enum)
+_PERMISSIONS_BY_ROLE: Dict[str, FrozenSet[Permission]] = {
+    role.value: permissions for role, permissions in PERMISSION_MATRIX.items()
+}
+
+
+def has_permission(role: Optional[str], permission: Permission) -> bool:
+    """
+    Decide a partir del rol del token, sin consultar la base de datos.
+    """
+    return permission in _PERMISSIONS_BY_ROLE.get(role or "", frozenset())
+
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> TokenData:
+    """
+    Dependencia que devuelve los claims verificados del usuario actual
+    (id, rol y versión del token).
+    """
+    return verify_token(token)
+
+
+def require_permission(permission: Permission):
+    """
+    Dependencia para restringir acceso por permiso.
+
+    Uso:
+        @router.delete("/x", dependencies=[Depends(require_permission(Permission.USERS_DELETE))])
+    """
+
+    async def permission_checker(
+        principal: TokenData = Depends(get_current_principal),
+    ) -> TokenData:
+        if not has_permission(principal.role, permission):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Se requiere el permiso: {permission.value}",
+            )
+        return principal
+
+    return permission_checker
@@ -0,0 +1,273 @@
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from utils.metrics import register_metrics
+
+# Codificadores opcionales: si la librería no está instalada solo se ofrece gzip
+try:
+    import brotli  # pip install brotli
+except ImportError:  # pragma: no cover - depende del entorno
+    brotli = None
+
+try:
+    import zstandard  # pip install zstandard
+except ImportError:  # pragma: no cover - depende del entorno
+    zstandard = None
+
+# Tipos que no vale la pena comprimir o que necesitan entregarse sin buffer
+_SKIP_CONTENT_TYPES = ("text/event-stream", "image/", "video/", "audio/", "application/zip")
+
+
+class _Gzip:
+    def __init__(self):
+        self._c = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._c.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=4)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+class _Zstd:
+    def __init__(self):
+        self._c = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+def available_encoders() -> Dict[str, Callable[[], object]]:
+    """
+    Codificadores disponibles, en orden de preferencia del servidor.
+    """
+    encoders: Dict[str, Callable[[], object]] = {}
+    if zstandard is not None:
+        encoders["zstd"] = _Zstd
+    if brotli is not None:
+        encoders["br"] = _Brotli
+    encoders["gzip"] = _Gzip
+    return encoders
+
+
+def negotiate(accept_encoding: str, encoders: Dict[str, Callable]) -> Optional[str]:
+    """
+    Elige la codificación según Accept-Encoding (respeta q=0) y la preferencia
+    del servidor entre las aceptadas con el mismo peso.
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+
+    best, best_q = None, 0.0
+    for name in encoders:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI de compresión negociada (zstd / br / gzip).
+
+    - Respuestas de un solo bloque menores que `minimum_size` se envían tal cual.
+    - Respuestas en streaming se comprimen por bloques (con flush en cada uno),
+      salvo text/event-stream, que se deja sin tocar.
+    - Si la respuesta trae ETag, los bytes comprimidos se guardan en un LRU de
+      `cache_entries` elementos para no volver a comprimir la misma página.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, cache_entries: int = 256):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache_entries = cache_entries
+        self.encoders = available_encoders()
+        self._cache: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+        self.stats = {
+            "responses_compressed": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+        }
+        register_metrics("compression", self.metrics)
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "encoders": list(self.encoders),
+            "cache_size": len(self._cache),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for key, value in scope.get("headers", []):
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept, self.encoders) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingResponder(self, send, encoding, scope.get("path", ""))
+        await self.app(scope, receive, responder.send)
+
+    # --- caché de respuestas precomprimidas ---
+
+    def cache_get(self, key: Tuple[str, str, str]) -> Optional[bytes]:
+        body = self._cache.get(key)
+        if body is None:
+            self.stats["cache_misses"] += 1
+            return None
+        self._cache.move_to_end(key)
+        self.stats["cache_hits"] += 1
+        return body
+
+    def cache_put(self, key: Tuple[str, str, str], body: bytes):
+        if self.cache_entries <= 0:
+            return
+        self._cache[key] = body
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+
+
+class _CompressingResponder:
+    def __init__(self, middleware: CompressionMiddleware, send, encoding: str, path: str):
+        self.mw = middleware
+        self._send = send
+        self.encoding = encoding
+        self.path = path
+        self.start: Optional[dict] = None
+        self.compressor = None
+        self.passthrough = False
+
+    def _header(self, name: bytes) -> Optional[str]:
+        for key, value in self.start["headers"]:
+            if key.lower() == name:
+                return value.decode("latin-1")
+        return None
+
+    def _headers_for(self, body_length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        headers = []
+        for key, value in self.start["headers"]:
+            k = key.lower()
+            if k == b"content-length":
+                continue
+            if k == b"etag" and not value.startswith(b"W/"):
+                # Otra representación: el validador pasa a ser débil
+                value = b"W/" + value
+            if k == b"vary":
+                continue
+            headers.append((key, value))
+        vary = self._header(b"vary")
+        vary = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+        headers.append((b"vary", vary.encode("latin-1")))
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        if body_length is not None:
+            headers.append((b"content-length", str(body_length).encode("latin-1")))
+        return headers
+
+    def _should_skip(self) -> bool:
+        if self.start["status"] < 200 or self.start["status"] in (204, 304):
+            return True
+        if self._header(b"content-encoding"):
+            return True
+        content_type = (self._header(b"content-type") or "").lower()
+        return content_type.startswith(_SKIP_CONTENT_TYPES)
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.passthrough:
+            await self._send(message)
+            return
+
+        if self.compressor is None:
+            # Primer bloque del cuerpo: decidimos si comprimir
+            if self._should_skip() or (not more_body and len(body) < self.mw.minimum_size):
+                self.passthrough = True
+                await self._send(self.start)
+                await self._send(message)
+                return
+
+            if not more_body:
+                await self._send_whole(body)
+                return
+
+            # Streaming: comprimimos bloque a bloque
+            self.compressor = self.mw.encoders[self.encoding]()
+            await self._send({**self.start, "headers": self._headers_for(None)})
+
+        chunk = self.compressor.compress(body)
+        chunk += self.compressor.flush() if more_body else self.compressor.finish()
+        self.mw.stats["bytes_in"] += len(body)
+        self.mw.stats["bytes_out"] += len(chunk)
+        if not more_body:
+            self.mw.stats["responses_compressed"] += 1
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _send_whole(self, body: bytes):
+        etag = self._header(b"etag")
+        key = (self.path, etag, self.encoding) if etag else None
+        compressed = self.mw.cache_get(key) if key else None
+        if compressed is None:
+            compressor = self.mw.encoders[self.encoding]()
+            compressed = compressor.compress(body) + compressor.finish()
+            if key:
+                self.mw.cache_put(key, compressed)
+
+        self.mw.stats["responses_compressed"] += 1
+        self.mw.stats["bytes_in"] += len(body)
+        self.mw.stats["bytes_out"] += len(compressed)
+        await self._send({**self.start, "headers": self._headers_for(len(compressed))})
+        await self._send({"type": "http.response.body", "body": compressed})
@@ -0,0 +1,123 @@
+"""
+Formato de volcado de colecciones: flujo BSON por tramos comprimidos.
+
+    cabecera: MAGIC + 1 byte (largo del códec) + nombre del códec
+    tramo:    <II> (documentos, bytes comprimidos) + BSON concatenado comprimido
+    fin:      tramo vacío (0, 0)
+
+Cada tramo se comprime por separado, así la restauración puede descomprimir e
+insertar tramos en paralelo. El tramo vacío final permite detectar un volcado
+truncado.
+"""
+import struct
+import zlib
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from bson import decode_all
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+# Códec opcional: si no está instalado se usa zlib
+try:
+    import zstandard  # pip install zstandard
+except ImportError:  # pragma: no cover - depende del entorno
+    zstandard = None
+
+MAGIC = b"LQCDUMP\x01"
+_FRAME = struct.Struct("<II")
+_RAW = CodecOptions(document_class=RawBSONDocument)
+
+# nombre -> (comprimir, descomprimir)
+Codec = Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]
+
+
+def _codecs() -> Dict[str, Codec]:
+    codecs: Dict[str, Codec] = {
+        "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+        "none": (bytes, bytes),
+    }
+    if zstandard is not None:
+        codecs["zstd"] = (
+            lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+            lambda data: zstandard.ZstdDecompressor().decompress(data),
+        )
+    return codecs
+
+
+CODECS = _codecs()
+DEFAULT_CODEC = "zstd" if "zstd" in CODECS else "zlib"
+
+
+class DumpFormatError(Exception):
+    pass
+
+
+class DumpWriter:
+    """
+    Escribe documentos BSON crudos (RawBSONDocument) en tramos comprimidos.
+    """
+
+    def __init__(self, fileobj: BinaryIO, codec: str = DEFAULT_CODEC):
+        if codec not in CODECS:
+            raise DumpFormatError(f"Códec no disponible: {codec}")
+        self.fileobj = fileobj
+        self._compress = CODECS[codec][0]
+        self.documents = 0
+        self.bytes_written = 0
+        name = codec.encode()
+        self._write(MAGIC + bytes([len(name)]) + name)
+
+    def _write(self, data: bytes):
+        self.fileobj.write(data)
+        self.bytes_written += len(data)
+
+    def write_frame(self, docs: List[RawBSONDocument]):
+        if not docs:
+            return
+        payload = self._compress(b"".join(doc.raw for doc in docs))
+        self._write(_FRAME.pack(len(docs), len(payload)) + payload)
+        self.documents += len(docs)
+
+    def close(self):
+        self._write(_FRAME.pack(0, 0))
+
+
+def read_header(fileobj: BinaryIO) -> str:
+    """
+    Valida la cabecera y devuelve el códec del volcado.
+    """
+    if fileobj.read(len(MAGIC)) != MAGIC:
+        raise DumpFormatError("No es un volcado de usuarios (cabecera inválida)")
+    size = fileobj.read(1)
+    codec = fileobj.read(size[0]).decode() if size else ""
+    if codec not in CODECS:
+        raise DumpFormatError(f"Códec no disponible: {codec or '?'}")
+    return codec
+
+
+def iter_frames(fileobj: BinaryIO) -> Iterator[Tuple[int, bytes]]:
+    """
+    (documentos, bytes comprimidos) de cada tramo, sin descomprimir.
+    """
+    while True:
+        header = fileobj.read(_FRAME.size)
+        if len(header) < _FRAME.size:
+            raise DumpFormatError("Volcado truncado: falta el tramo final")
+        count, size = _FRAME.unpack(header)
+        if count == 0:
+            return
+        payload = fileobj.read(size)
+        if len(payload) < size:
+            raise DumpFormatError("Volcado truncado a mitad de un tramo")
+        yield count, payload
+
+
+def decode_frame(
+    codec: str, payload: bytes, count: Optional[int] = None
+) -> List[RawBSONDocument]:
+    """
+    Descomprime un tramo y lo separa en documentos sin decodificarlos.
+    """
+    docs = decode_all(CODECS[codec][1](payload), _RAW)
+    if count is not None and len(docs) != count:
+        raise DumpFormatError(f"Tramo corrupto: {len(docs)} documentos de {count}")
+    return docs
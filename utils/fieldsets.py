@@ -0,0 +1,79 @@
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Type
+from fastapi import Response
+from pydantic import BaseModel
+from exceptions import ValidationException
+
+# Campos de versión que siempre se leen para poder calcular ETag/Last-Modified
+VERSION_FIELDS = ("updated_at", "created_at")
+
+
+def _allowed_fields(model: Type[BaseModel]) -> Dict[str, str]:
+    """
+    Nombres aceptados en ?fields= -> clave en la base de datos (alias del modelo).
+    """
+    allowed: Dict[str, str] = {}
+    for name, field in model.model_fields.items():
+        key = field.alias or name
+        allowed[name] = key
+        allowed[key] = key
+    return allowed
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[List[str]]:
+    """
+    Valida `fields` (lista separada por comas) contra los campos del modelo de
+    respuesta. Devuelve las claves a proyectar, o None si se piden todos.
+    """
+    if not fields:
+        return None
+    allowed = _allowed_fields(model)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise ValidationException(
+            f"Campos no válidos: {', '.join(unknown)}. "
+            f"Permitidos: {', '.join(sorted(set(allowed.values())))}"
+        )
+    # Sin duplicados y en el orden pedido
+    return list(dict.fromkeys(allowed[f] for f in requested))
+
+
+def projection(fields: Iterable[str]) -> Dict[str, int]:
+    """
+    Proyección de Mongo con los campos pedidos más los de versión.
+    """
+    return {f: 1 for f in (*fields, *VERSION_FIELDS)}
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def sparse_json_response(
+    data: Any, fields: List[str], response: Optional[Response] = None
+) -> Response:
+    """
+    Serializa directamente los dicts de la base de datos con solo `fields`,
+    sin construir modelos Pydantic. Copia los headers ya fijados en `response`.
+    """
+
+    def pick(doc: dict) -> dict:
+        return {f: doc.get(f) for f in fields}
+
+    content = [pick(d) for d in data] if isinstance(data, list) else pick(data)
+    sparse = Response(
+        content=json.dumps(content, default=_json_default, separators=(",", ":")),
+        media_type="application/json",
+    )
+    if response is not None:
+        for key, value in response.headers.items():
+            if key.lower() != "content-length":
+                sparse.headers[key] = value
+    return sparse
@@ -0,0 +1,103 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional, Tuple
+from fastapi import Request, Response, status
+
+# Los clientes pueden guardar la respuesta, pero deben revalidarla siempre
+CACHE_CONTROL = "private, no-cache"
+
+
+def _digest(parts: Iterable[str]) -> str:
+    h = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return f'"{h.hexdigest()}"'
+
+
+def _version(updated_at: Optional[datetime], created_at: Optional[datetime]) -> str:
+    ts = updated_at or created_at
+    return ts.isoformat() if ts else ""
+
+
+def resource_etag(
+    id: str,
+    updated_at: Optional[datetime],
+    created_at: Optional[datetime],
+    *scope: object,
+) -> str:
+    """
+    ETag de un documento a partir de su _id y su última modificación.
+    `scope` distingue representaciones parciales (p. ej. ?fields=).
+    """
+    return _digest((id, _version(updated_at, created_at), *(str(s) for s in scope)))
+
+
+def collection_etag(
+    versions: Iterable[Tuple[str, Optional[datetime], Optional[datetime]]], *scope: object
+) -> str:
+    """
+    ETag de una página: digest de (id, versión) de cada elemento más los
+    parámetros que definen la página (skip, limit, ...).
+    """
+    parts = [str(s) for s in scope]
+    for id, updated_at, created_at in versions:
+        parts.append(id)
+        parts.append(_version(updated_at, created_at))
+    return _digest(parts)
+
+
+def last_modified(
+    versions: Iterable[Tuple[Optional[datetime], Optional[datetime]]],
+) -> Optional[datetime]:
+    stamps = [u or c for u, c in versions if (u or c)]
+    return max(stamps) if stamps else None
+
+
+def has_conditional_headers(request: Request) -> bool:
+    return (
+        "if-none-match" in request.headers or "if-modified-since" in request.headers
+    )
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # Mongo devuelve datetimes naive en UTC
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def is_not_modified(
+    request: Request, etag: str, modified: Optional[datetime]
+) -> bool:
+    """
+    Evalúa If-None-Match (prioritario) o If-Modified-Since según RFC 9110.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # Last-Modified tiene resolución de segundos
+        return _as_utc(modified).replace(microsecond=0) <= _as_utc(since)
+    return False
+
+
+def set_validators(response: Response, etag: str, modified: Optional[datetime]):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if modified is not None:
+        response.headers["Last-Modified"] = format_datetime(
+            _as_utc(modified), usegmt=True
+        )
+
+
+def not_modified(etag: str, modified: Optional[datetime]) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, modified)
+    return response
@@ -0,0 +1,332 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Optional, Protocol, Tuple
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+from core.config import settings
+from utils.metrics import register_metrics
+
+REPLAYED_HEADER = b"idempotent-replayed"
+_MAX_KEY_LENGTH = 255
+
+# Cabeceras que no se guardan con la respuesta (dependen de cada envío)
+_SKIP_HEADERS = {b"content-length", b"date", b"server"}
+
+
+class IdempotencyStore(Protocol):
+    """
+    Almacén con TTL de claves de idempotencia.
+
+    Cada clave pasa por dos estados: "pending" (reservada mientras se ejecuta la
+    primera petición; la reserva caduca tras `lease_seconds` por si el worker
+    muere) y "done" (con la respuesta guardada durante `ttl_seconds`).
+    """
+
+    async def reserve(
+        self, key: str, fingerprint: str, lease_seconds: float
+    ) -> Optional[dict]:
+        """
+        Reserva la clave. Devuelve None si la reserva es nuestra, o el registro
+        existente ({"state", "fingerprint", "response"?}) si ya la tiene otro.
+        """
+        ...
+
+    async def complete(self, key: str, record: dict, ttl_seconds: float) -> None: ...
+
+    async def release(self, key: str) -> None: ...
+
+
+class MemoryIdempotencyStore:
+    """
+    Almacén en memoria (LRU acotado a `max_entries`). Es el de por defecto con
+    un solo worker y el sustituto local del almacén compartido en tests.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+
+    def _get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _put(self, key: str, record: dict, ttl_seconds: float):
+        self._entries[key] = (record, time.monotonic() + ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def reserve(
+        self, key: str, fingerprint: str, lease_seconds: float
+    ) -> Optional[dict]:
+        existing = self._get(key)
+        if existing is not None:
+            return existing
+        self._put(key, {"state": "pending", "fingerprint": fingerprint}, lease_seconds)
+        return None
+
+    async def complete(self, key: str, record: dict, ttl_seconds: float) -> None:
+        self._put(key, {**record, "state": "done"}, ttl_seconds)
+
+    async def release(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MongoIdempotencyStore:
+    """
+    Almacén compartido entre workers sobre una colección de Mongo con índice TTL.
+    La reserva es un insert_one: el índice de _id garantiza un único ganador.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def reserve(
+        self, key: str, fingerprint: str, lease_seconds: float
+    ) -> Optional[dict]:
+        now = datetime.utcnow()
+        pending = {
+            "state": "pending",
+            "fingerprint": fingerprint,
+            "expires_at": now + timedelta(seconds=lease_seconds),
+        }
+        try:
+            await self.collection.insert_one({"_id": key, **pending})
+            return None
+        except DuplicateKeyError:
+            pass
+        # El monitor TTL borra con retraso: una entrada caducada se puede tomar
+        taken = await self.collection.find_one_and_update(
+            {"_id": key, "expires_at": {"$lte": now}}, {"$set": pending}
+        )
+        if taken is not None:
+            return None
+        return await self.collection.find_one({"_id": key})
+
+    async def complete(self, key: str, record: dict, ttl_seconds: float) -> None:
+        await self.collection.replace_one(
+            {"_id": key},
+            {
+                **record,
+                "state": "done",
+                "expires_at": datetime.utcnow() + timedelta(seconds=ttl_seconds),
+            },
+            upsert=True,
+        )
+
+    async def release(self, key: str) -> None:
+        await self.collection.delete_one({"_id": key, "state": "pending"})
+
+
+class IdempotencyKeys:
+    """
+    Configuración compartida por el proceso. El almacén se puede sustituir en
+    el lifespan (p. ej. por MongoIdempotencyStore con varios workers).
+    """
+
+    def __init__(
+        self,
+        store: IdempotencyStore,
+        ttl_seconds: float,
+        lease_seconds: float,
+        wait_seconds: float,
+    ):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.wait_seconds = wait_seconds
+        self.stats = {"stored": 0, "replayed": 0, "conflicts": 0, "mismatches": 0}
+
+    def metrics(self) -> dict:
+        return {**self.stats, "store": type(self.store).__name__}
+
+
+def _error(status_code: int, detail: str) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=status_code)
+
+
+class IdempotencyMiddleware:
+    """
+    Middleware ASGI para la cabecera Idempotency-Key en métodos que modifican.
+
+    - La primera petición con una clave se ejecuta y su respuesta (2xx/4xx) se
+      guarda; los reintentos reciben esa misma respuesta sin volver a ejecutar
+      el endpoint (ni bcrypt ni escrituras), con `Idempotent-Replayed: true`.
+    - Un duplicado concurrente espera a que termine la primera hasta
+      `wait_seconds`; si no termina, 409.
+    - Reutilizar la clave con otro cuerpo, 422.
+    - Las respuestas 5xx no se guardan: el cliente puede reintentar.
+
+    La clave se asocia al método, la ruta y la cabecera Authorization, de modo
+    que dos usuarios no comparten respuestas aunque repitan la clave.
+    """
+
+    def __init__(
+        self,
+        app,
+        keys: Optional[IdempotencyKeys] = None,
+        methods: Tuple[str, ...] = ("POST", "PUT", "PATCH", "DELETE"),
+    ):
+        self.app = app
+        self.keys = keys or idempotency_keys
+        self.methods = methods
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            await self.app(scope, receive, send)
+            return
+
+        client_key = auth = None
+        for name, value in scope.get("headers", []):
+            if name == b"idempotency-key":
+                client_key = value.decode("latin-1").strip()
+            elif name == b"authorization":
+                auth = value
+        if client_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not client_key or len(client_key) > _MAX_KEY_LENGTH:
+            await _error(400, "Idempotency-Key inválida")(scope, receive, send)
+            return
+
+        body, receive = await _buffer_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        key = hashlib.sha256(
+            b"|".join(
+                [
+                    scope["method"].encode(),
+                    scope["path"].encode(),
+                    auth or b"",
+                    client_key.encode("latin-1"),
+                ]
+            )
+        ).hexdigest()
+
+        store = self.keys.store
+        deadline = time.monotonic() + self.keys.wait_seconds
+        while True:
+            existing = await store.reserve(key, fingerprint, self.keys.lease_seconds)
+            if existing is None:
+                break
+            if existing.get("fingerprint") != fingerprint:
+                self.keys.stats["mismatches"] += 1
+                await _error(
+                    422, "Idempotency-Key ya usada con otro contenido"
+                )(scope, receive, send)
+                return
+            if existing.get("state") == "done":
+                self.keys.stats["replayed"] += 1
+                await _replay(existing, send)
+                return
+            if time.monotonic() >= deadline:
+                self.keys.stats["conflicts"] += 1
+                await _error(
+                    409, "Hay una petición en curso con esta Idempotency-Key"
+                )(scope, receive, send)
+                return
+            await asyncio.sleep(0.05)
+
+        recorder = _ResponseRecorder(send)
+        try:
+            await self.app(scope, receive, recorder.send)
+        except BaseException:
+            await store.release(key)
+            raise
+
+        if recorder.status is not None and recorder.status < 500:
+            await store.complete(
+                key,
+                {
+                    "fingerprint": fingerprint,
+                    "status": recorder.status,
+                    "headers": recorder.headers,
+                    "body": b"".join(recorder.body),
+                },
+                self.keys.ttl_seconds,
+            )
+            self.keys.stats["stored"] += 1
+        else:
+            await store.release(key)
+
+
+async def _buffer_body(receive):
+    """
+    Lee el cuerpo completo y devuelve (cuerpo, receive que lo vuelve a entregar).
+    """
+    chunks: List[bytes] = []
+    more = True
+    while more:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        more = message.get("more_body", False)
+    body = b"".join(chunks)
+    delivered = False
+
+    async def replay_receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return body, replay_receive
+
+
+async def _replay(record: dict, send):
+    body = bytes(record["body"])
+    headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in record["headers"]]
+    headers.append((b"content-length", str(len(body)).encode("latin-1")))
+    headers.append((REPLAYED_HEADER, b"true"))
+    await send({"type": "http.response.start", "status": record["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class _ResponseRecorder:
+    """
+    Reenvía la respuesta al cliente y guarda una copia para los reintentos.
+    """
+
+    def __init__(self, send):
+        self._send = send
+        self.status: Optional[int] = None
+        self.headers: List[List[str]] = []
+        self.body: List[bytes] = []
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            self.headers = [
+                [k.decode("latin-1"), v.decode("latin-1")]
+                for k, v in message.get("headers", [])
+                if k.lower() not in _SKIP_HEADERS
+            ]
+        elif message["type"] == "http.response.body":
+            self.body.append(message.get("body", b""))
+        await self._send(message)
+
+
+# Claves de idempotencia del proceso (el almacén se puede cambiar en el lifespan)
+idempotency_keys = IdempotencyKeys(
+    MemoryIdempotencyStore(settings.IDEMPOTENCY_MAX_ENTRIES),
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+    lease_seconds=settings.IDEMPOTENCY_LEASE_SECONDS,
+    wait_seconds=settings.IDEMPOTENCY_WAIT_SECONDS,
+)
+register_metrics("idempotency", idempotency_keys.metrics)
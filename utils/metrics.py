@@ -0,0 +1,15 @@
+from typing import Callable, Dict
+
+# Proveedores de métricas del proceso: nombre -> función que devuelve un dict
+_providers: Dict[str, Callable[[], dict]] = {}
+
+
+def register_metrics(name: str, provider: Callable[[], dict]):
+    """
+    Registra una fuente de métricas que se expone en GET /metrics.
+    """
+    _providers[name] = provider
+
+
+def collect_metrics() -> Dict[str, dict]:
+    return {name: provider() for name, provider in _providers.items()}
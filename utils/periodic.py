@@ -0,0 +1,29 @@
+import asyncio
+from typing import Awaitable, Callable
+
+
+def run_periodically(
+    func: Callable[[], Awaitable[object]],
+    interval: float,
+    name: str,
+    run_immediately: bool = False,
+) -> asyncio.Task:
+    """
+    Lanza una tarea de fondo que ejecuta `func` cada `interval` segundos.
+    Los errores se registran y no detienen el ciclo; se cancela con task.cancel().
+    """
+
+    async def _loop():
+        first = True
+        while True:
+            if not (first and run_immediately):
+                await asyncio.sleep(interval)
+            first = False
+            try:
+                await func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Tarea periódica '{name}' falló: {e}")
+
+    return asyncio.create_task(_loop(), name=name)
@@ -0,0 +1,180 @@
+import math
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Protocol, Tuple
+from pymongo import ReturnDocument
+from core.config import settings
+from exceptions import TooManyRequestsException
+from utils.metrics import register_metrics
+
+
+class RateLimitBackend(Protocol):
+    """
+    Almacén de buckets. hit() consume una ficha del bucket `key` (capacidad
+    `capacity`, recarga `refill_per_second`) y devuelve 0 si se permitió o los
+    segundos que faltan para la próxima ficha.
+    """
+
+    async def hit(self, key: str, capacity: float, refill_per_second: float) -> float: ...
+
+    async def reset(self, key: str) -> None: ...
+
+
+class MemoryRateLimitBackend:
+    """
+    Token buckets en memoria: una tupla (fichas, último_uso, lleno_en) por clave.
+    Un bucket lleno equivale a no tener bucket, así que evict() los elimina;
+    `max_keys` acota la memoria ante ráfagas con muchas IPs distintas.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+
+    async def hit(self, key: str, capacity: float, refill_per_second: float) -> float:
+        now = time.monotonic()
+        tokens, last, _ = self._buckets.get(key, (capacity, now, now))
+        tokens = min(capacity, tokens + (now - last) * refill_per_second)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        full_at = now + (capacity - tokens) / refill_per_second
+        self._buckets[key] = (tokens, now, full_at)
+
+        if len(self._buckets) > self.max_keys:
+            self.evict()
+        return 0.0 if allowed else (1 - tokens) / refill_per_second
+
+    async def reset(self, key: str) -> None:
+        self._buckets.pop(key, None)
+
+    def evict(self) -> int:
+        """
+        Elimina los buckets que ya se recargaron. Si aún hay demasiados, descarta
+        los más antiguos (orden de inserción) hasta dejar un 10% libre, para no
+        repetir el barrido en cada petición. Devuelve cuántos se eliminaron.
+        """
+        now = time.monotonic()
+        before = len(self._buckets)
+        self._buckets = {k: b for k, b in self._buckets.items() if b[2] > now}
+        overflow = len(self._buckets) - self.max_keys * 9 // 10
+        if overflow > 0:
+            for key in list(self._buckets)[:overflow]:
+                del self._buckets[key]
+        return before - len(self._buckets)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class MongoRateLimitBackend:
+    """
+    Backend compartido entre workers: ventana fija de capacity/refill segundos
+    con un contador por clave y ventana ($inc atómico, expiración por TTL).
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def hit(self, key: str, capacity: float, refill_per_second: float) -> float:
+        window = capacity / refill_per_second
+        now = time.time()
+        slot = int(now // window)
+        doc = await self.collection.find_one_and_update(
+            {"_id": f"{key}:{slot}"},
+            {
+                "$inc": {"n": 1},
+                "$setOnInsert": {
+                    "expires_at": datetime.utcnow() + timedelta(seconds=2 * window)
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["n"] <= capacity:
+            return 0.0
+        return (slot + 1) * window - now
+
+    async def reset(self, key: str) -> None:
+        await self.collection.delete_many({"_id": {"$regex": f"^{re.escape(key)}:"}})
+
+
+class LoginRateLimiter:
+    """
+    Límite de intentos de login por IP y por cuenta, que se comprueba antes de
+    buscar al usuario y de verificar la contraseña con bcrypt.
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        ip_burst: float,
+        ip_per_minute: float,
+        account_burst: float,
+        account_per_minute: float,
+    ):
+        self.backend = backend
+        self.ip_limit = (ip_burst, ip_per_minute / 60)
+        self.account_limit = (account_burst, account_per_minute / 60)
+        self.stats = {"allowed": 0, "rejected_ip": 0, "rejected_account": 0}
+
+    @staticmethod
+    def _account_key(username_or_email: str) -> str:
+        return f"login:account:{username_or_email.strip().lower()}"
+
+    async def check(self, ip: Optional[str], username_or_email: str):
+        """
+        Consume un intento de la IP y de la cuenta.
+
+        Raises:
+            TooManyRequestsException: Si alguno de los dos límites se superó
+        """
+        wait = await self.backend.hit(f"login:ip:{ip or 'unknown'}", *self.ip_limit)
+        if wait:
+            self.stats["rejected_ip"] += 1
+            self._reject(wait)
+
+        wait = await self.backend.hit(
+            self._account_key(username_or_email), *self.account_limit
+        )
+        if wait:
+            self.stats["rejected_account"] += 1
+            self._reject(wait)
+        self.stats["allowed"] += 1
+
+    async def reset_account(self, username_or_email: str):
+        """
+        Tras un login correcto, la cuenta recupera todos sus intentos.
+        """
+        await self.backend.reset(self._account_key(username_or_email))
+
+    async def evict(self):
+        if isinstance(self.backend, MemoryRateLimitBackend):
+            self.backend.evict()
+
+    def _reject(self, wait: float):
+        raise TooManyRequestsException(
+            "Demasiados intentos de inicio de sesión, inténtalo más tarde",
+            retry_after=math.ceil(wait),
+        )
+
+    def metrics(self) -> dict:
+        buckets = (
+            len(self.backend) if isinstance(self.backend, MemoryRateLimitBackend) else None
+        )
+        return {**self.stats, "backend": type(self.backend).__name__, "buckets": buckets}
+
+
+# Limitador de login del proceso (el backend se puede cambiar en el lifespan)
+login_rate_limiter = LoginRateLimiter(
+    MemoryRateLimitBackend(settings.RATE_LIMIT_MAX_KEYS),
+    ip_burst=settings.LOGIN_IP_BURST,
+    ip_per_minute=settings.LOGIN_IP_PER_MINUTE,
+    account_burst=settings.LOGIN_ACCOUNT_BURST,
+    account_per_minute=settings.LOGIN_ACCOUNT_PER_MINUTE,
+)
+register_metrics("login_rate_limit", login_rate_limiter.metrics)
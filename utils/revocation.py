@@ -0,0 +1,108 @@
+import hashlib
+import math
+import time
+from typing import Dict, Iterable, Optional, Set
+from core.config import settings
+from utils.metrics import register_metrics
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom sobre un bytearray. Responde "seguro que no está" o
+    "quizá está" (con una tasa de falsos positivos de aprox. `error_rate`
+    hasta `capacity` elementos).
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Doble hashing: k posiciones a partir de un solo digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationList:
+    """
+    Tokens revocados (por jti) en memoria, para que verify_token no haga I/O.
+
+    Casi ningún token está revocado: el Bloom descarta ese caso sin tocar el
+    conjunto exacto, y el conjunto exacto elimina los falsos positivos del
+    Bloom. Como el Bloom no admite borrados, load() lo reconstruye con las
+    revocaciones vigentes leídas de la base de datos.
+    """
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._exact: Set[str] = set()
+        # Revocaciones locales que aún no se vieron en una sincronización: jti -> expira
+        self._pending: Dict[str, float] = {}
+        self.stats = {"checks": 0, "bloom_hits": 0, "revoked_hits": 0, "syncs": 0}
+
+    def add(self, jti: str, expires_at: Optional[float] = None):
+        """
+        Revoca localmente (ya escrito en la base de datos por quien llama).
+        `expires_at` es el timestamp de expiración del token.
+        """
+        self._bloom.add(jti)
+        self._exact.add(jti)
+        self._pending[jti] = expires_at or time.time() + 86400
+
+    def load(self, jtis: Iterable[str]):
+        """
+        Reemplaza el contenido por las revocaciones vigentes de la base de datos,
+        conservando las locales que la lectura aún no incluía.
+        """
+        exact = set(jtis)
+        now = time.time()
+        self._pending = {
+            jti: exp for jti, exp in self._pending.items() if jti not in exact and exp > now
+        }
+        exact.update(self._pending)
+
+        bloom = BloomFilter(max(self.capacity, 2 * len(exact)), self.error_rate)
+        for jti in exact:
+            bloom.add(jti)
+        self._bloom, self._exact = bloom, exact
+        self.stats["syncs"] += 1
+
+    def is_revoked(self, jti: str) -> bool:
+        self.stats["checks"] += 1
+        if jti not in self._bloom:
+            return False
+        self.stats["bloom_hits"] += 1
+        revoked = jti in self._exact
+        if revoked:
+            self.stats["revoked_hits"] += 1
+        return revoked
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "revoked": len(self._exact),
+            "bloom_bytes": len(self._bloom.bits),
+        }
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+
+# Revocaciones compartidas por el proceso (se sincronizan en el lifespan)
+revoked_tokens = RevocationList(
+    settings.REVOCATION_BLOOM_CAPACITY, settings.REVOCATION_BLOOM_ERROR_RATE
+)
+register_metrics("revoked_tokens", revoked_tokens.metrics)
@@ -0,0 +1,82 @@
+import asyncio
+import contextvars
+import copy
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set, Tuple
+
+# Contextvars que sí pasan a la consulta compartida (laboratorio, guarda de
+# reintentos); el resto, como el deadline de la petición, se queda fuera
+_carried: Set[ContextVar] = set()
+
+
+def carry_context(var: ContextVar) -> ContextVar:
+    """
+    Registra un contextvar que debe propagarse a las consultas compartidas.
+    """
+    _carried.add(var)
+    return var
+
+
+def _detached_context() -> contextvars.Context:
+    context = contextvars.Context()
+    for var, value in contextvars.copy_context().items():
+        if var in _carried:
+            context.run(var.set, value)
+    return context
+
+
+class SingleFlight:
+    """
+    Agrupa lecturas concurrentes idénticas: mientras una consulta con la misma
+    clave está en curso, las demás esperan su resultado en lugar de repetirla.
+
+    La consulta compartida corre en un contexto nuevo: no hereda el deadline
+    del primer llamador (ni el de pymongo.timeout), que podría tener mucho menos
+    tiempo que los demás; solo los contextvars registrados con carry_context.
+    Cada llamador recibe su propia copia del resultado.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Tuple[Hashable, ...], asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+
+    async def do(self, key: Tuple[Hashable, ...], func: Callable[[], Awaitable[Any]]):
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.get_running_loop().create_task(
+                func(), context=_detached_context()
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        # shield: si un llamador se cancela, la consulta sigue para los demás
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _done(self, key, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Marcamos la excepción como leída aunque todos los llamadores se hayan ido
+        if not task.cancelled():
+            task.exception()
+
+    def forget(self, *prefix: Hashable):
+        """
+        Desvincula las consultas en curso cuya clave empieza por `prefix`,
+        para que las lecturas posteriores a una escritura no reciban datos previos.
+        """
+        n = len(prefix)
+        for key in [k for k in self._inflight if k[:n] == prefix]:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        shared = self.calls - self.executions
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": shared,
+            "coalesced_ratio": round(shared / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._inflight),
+        }
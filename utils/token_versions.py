@@ -0,0 +1,36 @@
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class TokenVersionRegistry:
+    """
+    Versión mínima de token aceptada por usuario.
+
+    Cada usuario tiene un `token_version` que se incrementa cuando cambian su rol
+    o su estado; el token lleva la versión con la que fue emitido (claim "ver").
+    Un token con versión menor a la registrada ya no refleja los permisos reales
+    y se rechaza, sin tener que leer la base de datos en cada petición.
+    """
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        # Hasta dónde se sincronizó con la base (None = nunca: lectura completa)
+        self.synced_until: Optional[datetime] = None
+
+    def bump(self, user_id: str, version: int):
+        if version > self._versions.get(user_id, 0):
+            self._versions[user_id] = version
+
+    def load(self, versions: Iterable[Tuple[str, int]]):
+        for user_id, version in versions:
+            self.bump(user_id, version)
+
+    def is_current(self, user_id: str, version: int) -> bool:
+        return version >= self._versions.get(user_id, 0)
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+
+# Registro compartido por el proceso
+token_versions = TokenVersionRegistry()